@@ -4,9 +4,11 @@ from pkg_resources import load_entry_point
 
 from ..base_options import BaseOptions, OptionsHolder
 from ..freezedried import FreezeDried
+from ..objutils import memoize
 from ..types import FieldValueError, wrap_field_error
 
 
+@memoize
 def _get_builder_type(type, field='type'):
     try:
         return load_entry_point('mopack', 'mopack.builders', type)
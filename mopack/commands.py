@@ -4,13 +4,12 @@ import shutil
 from . import log
 from .config import PlaceholderPackage
 from .exceptions import ConfigurationError
+from .lockfile import Lockfile
 from .metadata import Metadata
-
-mopack_dirname = 'mopack'
-
-
-def get_package_dir(builddir):
-    return os.path.abspath(os.path.join(builddir, mopack_dirname))
+from .path import get_package_dir  # noqa: F401
+from .snapshot import export_snapshot  # noqa: F401
+from .snapshot import import_snapshot as _import_snapshot
+from .usage_cache import UsageCache
 
 
 class PackageTreeItem:
@@ -64,10 +63,11 @@ def _fill_metadata(config, pkgdir):
     return metadata
 
 
-def fetch(config, pkgdir):
+def fetch(config, pkgdir, lockfile=None):
     log.LogFile.clean_logs(pkgdir)
 
     old_metadata = Metadata.try_load(pkgdir)
+    old_metadata.lockfile = lockfile
     try:
         _do_fetch(config, old_metadata, pkgdir)
     except ConfigurationError:
@@ -91,12 +91,43 @@ def fetch(config, pkgdir):
     return metadata
 
 
-def resolve(config, pkgdir):
+def _indexed_submodules(package):
+    if not package.submodules:
+        return [None]
+
+    result = [] if package.submodules['required'] else [None]
+    if package.submodules['names'] != '*':
+        result.extend([i] for i in package.submodules['names'])
+    return result
+
+
+def _index_usage(metadata):
+    # Get the usage of every package (and each of its declared submodules) so
+    # that the .pc files are generated now and `mopack usage` can generally be
+    # answered directly from the usage cache.
+    cache = UsageCache(metadata.pkgdir, metadata.path)
+    for pkg in metadata.packages.values():
+        for submodules in _indexed_submodules(pkg):
+            try:
+                usage = metadata.get_usage(pkg.name, submodules)
+            except Exception as e:
+                # Some usages can only be determined with information passed
+                # in during `mopack usage`, so just skip them here.
+                log.debug('unable to index usage for {!r}: {}'.format(
+                    pkg.name, e
+                ))
+                continue
+            cache.put(pkg.name, submodules, None, usage, metadata)
+    cache.save()
+
+
+def resolve(config, pkgdir, update_lock=False):
     if not config:
         log.info('no inputs')
         return
 
-    metadata = fetch(config, pkgdir)
+    lockfile = Lockfile.for_config(config, update_lock)
+    metadata = fetch(config, pkgdir, lockfile)
 
     packages, batch_packages = [], {}
     for pkg in metadata.packages.values():
@@ -126,6 +157,9 @@ def resolve(config, pkgdir):
             raise
 
     metadata.save()
+    # Only update the lockfile once everything has resolved successfully.
+    lockfile.save(metadata.packages)
+    _index_usage(metadata)
 
 
 def deploy(pkgdir):
@@ -148,21 +182,66 @@ def deploy(pkgdir):
         pkg.deploy(metadata)
 
 
-def usage(pkgdir, name, submodules=None, strict=False):
-    metadata = Metadata.try_load(pkgdir, strict)
-    package = metadata.get_package(name)
-    return package.get_usage(metadata, submodules)
+def import_snapshot(pkgdir, filename):
+    metadata = _import_snapshot(pkgdir, filename)
+    _index_usage(metadata)
+
+
+def iter_usage(pkgdir, dependencies, strict=False, load_metadata=None):
+    # Get the usage for each (name, submodules) pair in `dependencies`,
+    # yielding each result as soon as it's available. If getting the usage for
+    # an entry fails, its result is the exception that was raised. The metadata
+    # is only loaded (via `load_metadata`, if supplied) when the usage cache
+    # can't answer, and is then shared by the remaining entries.
+    if load_metadata is None:
+        def load_metadata():
+            return Metadata.try_load(pkgdir, strict)
 
+    metadata = None
+    metadata_path = os.path.join(pkgdir, Metadata.metadata_filename)
+    cache = UsageCache(pkgdir, metadata_path)
 
-def list_files(pkgdir, implicit=False, strict=False):
-    metadata = Metadata.try_load(pkgdir, strict)
+    try:
+        for name, submodules in dependencies:
+            try:
+                result = cache.get(name, submodules, strict)
+                if result is None:
+                    if metadata is None:
+                        metadata = load_metadata()
+                    result = metadata.get_usage(name, submodules)
+                    cache.put(name, submodules,
+                              None if name in metadata.packages else strict,
+                              result, metadata)
+            except Exception as e:
+                result = e
+            yield result
+    finally:
+        cache.save()
+
+
+def usage_all(pkgdir, dependencies, strict=False, load_metadata=None):
+    # Like `iter_usage`, but return a list of all the results.
+    return list(iter_usage(pkgdir, dependencies, strict, load_metadata))
+
+
+def usage(pkgdir, name, submodules=None, strict=False, load_metadata=None):
+    result, = usage_all(pkgdir, [(name, submodules)], strict, load_metadata)
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def list_files(pkgdir, implicit=False, strict=False, metadata=None):
+    if metadata is None:
+        metadata = Metadata.try_load(pkgdir, strict)
     if implicit:
         return metadata.files + metadata.implicit_files
     return metadata.files
 
 
-def list_packages(pkgdir, flat=False):
-    metadata = Metadata.load(pkgdir)
+def list_packages(pkgdir, flat=False, metadata=None):
+    if metadata is None:
+        metadata = Metadata.load(pkgdir)
 
     if flat:
         return [PackageTreeItem(pkg, pkg.version(metadata)) for pkg in
@@ -1,12 +1,13 @@
 import os
 import functools
-import json
 import sys
+from contextlib import closing, contextmanager
 
-from . import arguments, commands, config, log, yaml_tools
+from . import (arguments, commands, config, json_tools, log, server,
+               yaml_tools)
 from .app_version import version
 from .environment import nested_invoke
-from .types import dependency
+from .types import dependency, dependency_string
 
 logger = log.getLogger(__name__)
 
@@ -24,6 +25,8 @@ project (e.g. by building them).
 usage_desc = """
 Retrieve information about how to use a dependency. This returns metadata in
 YAML format (or JSON if `--json` is passed) pointing to a pkg-config .pc file.
+When querying multiple dependencies (or reading them from standard input with
+`--stdin`), the results are keyed by dependency.
 """
 
 deploy_desc = """
@@ -35,6 +38,17 @@ clean_desc = """
 Clean the `mopack` package directory of all files.
 """
 
+export_desc = """
+Pack the resolved package directory into a snapshot archive that can be
+restored elsewhere via `mopack import`. Absolute paths under the root directory
+are stored relative to the package directory.
+"""
+
+import_desc = """
+Restore a snapshot archive created by `mopack export` into the package
+directory, replacing its current contents.
+"""
+
 list_files_desc = """
 List all the input files used by the current configuration.
 """
@@ -43,6 +57,13 @@ list_packages_desc = """
 List all the package dependencies.
 """
 
+serve_desc = """
+Start a server answering `usage`, `list-files`, and `list-packages` queries for
+the package directory over a Unix domain socket. While the server is running,
+these commands forward their queries to it, avoiding the cost of loading the
+package metadata each time. The metadata is reloaded whenever it changes.
+"""
+
 generate_completion_desc = """
 Generate shell-completion functions for mopack and write them to standard
 output. This requires the Python package `shtab`.
@@ -54,28 +75,95 @@ def dependency_type(s):
     return dependency(None, s)
 
 
+class _LocalQueries:
+    def __init__(self, pkgdir):
+        self.pkgdir = pkgdir
+
+    def __getattr__(self, attr):
+        return functools.partial(getattr(commands, attr), self.pkgdir)
+
+
+@contextmanager
+def _queries(directory):
+    # Forward queries to the server for this package directory if one is
+    # running; otherwise, handle them ourselves.
+    pkgdir = commands.get_package_dir(directory)
+    client = server.connect(pkgdir)
+    if client:
+        with client:
+            yield client
+    else:
+        yield _LocalQueries(pkgdir)
+
+
 def resolve(parser, args):
     if os.environ.get(nested_invoke):
         return 3
 
     config_data = config.Config(args.file, args.options, args.deploy_paths)
     os.environ[nested_invoke] = args.directory
-    commands.resolve(config_data, commands.get_package_dir(args.directory))
+    commands.resolve(config_data, commands.get_package_dir(args.directory),
+                     args.update_lock)
+
+
+def _usage_dependencies(args):
+    # Yield (key, dependency) pairs for each dependency to query. If a
+    # dependency read from stdin is invalid, yield the error instead.
+    for name, submodules in args.dependency:
+        yield dependency_string(name, submodules), (name, submodules)
+    if args.stdin:
+        for i in sys.stdin.read().split():
+            try:
+                dep = dependency(None, i)
+            except Exception as e:
+                yield i, e
+            else:
+                yield dependency_string(*dep), dep
+
+
+def _usage_batch(args, directory):
+    deps = list(_usage_dependencies(args))
+    valid = [v for k, v in deps if not isinstance(v, Exception)]
+    failed = False
+    output = {}
+    with _queries(directory) as q:
+        with closing(q.iter_usage(valid, strict=args.strict)) as results:
+            for key, dep in deps:
+                result = dep if isinstance(dep, Exception) else next(results)
+                if isinstance(result, Exception):
+                    failed = True
+                    result = {'error': str(result)}
+
+                if args.ndjson:
+                    print(json_tools.dumps({key: result}), flush=True)
+                else:
+                    output[key] = result
+
+    if args.json:
+        print(json_tools.dumps(output))
+    elif not args.ndjson:
+        print(yaml_tools.dump(output))
+    return 1 if failed else None
 
 
 def usage(parser, args):
     directory = os.environ.get(nested_invoke, args.directory)
+    if args.stdin or args.ndjson or len(args.dependency) != 1:
+        if not args.stdin and not args.dependency:
+            parser.error('at least one dependency is required')
+        return _usage_batch(args, directory)
+
     try:
-        usage = commands.usage(commands.get_package_dir(directory),
-                               *args.dependency, strict=args.strict)
+        with _queries(directory) as q:
+            usage = q.usage(*args.dependency[0], strict=args.strict)
     except Exception as e:
         if not args.json:
             raise
-        print(json.dumps({'error': str(e)}))
+        print(json_tools.dumps({'error': str(e)}))
         return 1
 
     if args.json:
-        print(json.dumps(usage))
+        print(json_tools.dumps(usage))
     else:
         print(yaml_tools.dump(usage))
 
@@ -90,13 +178,25 @@ def clean(parser, args):
     commands.clean(commands.get_package_dir(args.directory))
 
 
+def export_snapshot(parser, args):
+    assert nested_invoke not in os.environ
+    commands.export_snapshot(commands.get_package_dir(args.directory),
+                             args.file, args.root)
+
+
+def import_snapshot(parser, args):
+    assert nested_invoke not in os.environ
+    commands.import_snapshot(commands.get_package_dir(args.directory),
+                             args.file)
+
+
 def list_files(parser, args):
     assert nested_invoke not in os.environ
-    files = commands.list_files(commands.get_package_dir(args.directory),
-                                args.include_implicit, args.strict)
+    with _queries(args.directory) as q:
+        files = q.list_files(args.include_implicit, args.strict)
 
     if args.json:
-        print(json.dumps(files))
+        print(json_tools.dumps(files))
     else:
         for i in files:
             print(i)
@@ -127,8 +227,8 @@ def list_packages(parser, args):
 
             list_level(p.children, prefix + next_prefix)
 
-    packages = commands.list_packages(commands.get_package_dir(args.directory),
-                                      args.flat)
+    with _queries(args.directory) as q:
+        packages = q.list_packages(args.flat)
     if args.flat:
         for p in packages:
             print(pkg_fmt.format(package=p.package, version=get_version(p)))
@@ -136,6 +236,11 @@ def list_packages(parser, args):
         list_level(packages)
 
 
+def serve(parser, args):
+    assert nested_invoke not in os.environ
+    server.serve(commands.get_package_dir(args.directory))
+
+
 def help(parser, args):
     parser.parse_args(args.subcommand + ['--help'])
 
@@ -201,6 +306,9 @@ def main():
                            key=['strict'], const=True, dest='options',
                            help=('return an error during usage if package ' +
                                  'is not defined'))
+    resolve_p.add_argument('--update-lock', action='store_true',
+                           help=('fetch the latest revisions of packages ' +
+                                 'and update the lockfile'))
     resolve_p.add_argument('file', nargs='+', metavar='FILE', complete='file',
                            help='the mopack configuration files')
 
@@ -212,13 +320,20 @@ def main():
     usage_p.add_argument('--directory', default='.', type=os.path.abspath,
                          metavar='PATH', complete='directory',
                          help='directory storing local package data')
-    usage_p.add_argument('--json', action='store_true',
-                         help='display results as JSON')
+    usage_format = usage_p.add_mutually_exclusive_group()
+    usage_format.add_argument('--json', action='store_true',
+                              help='display results as JSON')
+    usage_format.add_argument('--ndjson', action='store_true',
+                              help=('display results as newline-delimited ' +
+                                    'JSON, one dependency per line'))
     usage_p.add_argument('--strict', action='store_true',
                          help='return an error if package is not defined')
-    usage_p.add_argument('dependency', type=dependency_type,
+    usage_p.add_argument('--stdin', action='store_true',
+                         help=('read additional dependencies from standard ' +
+                               'input, separated by whitespace'))
+    usage_p.add_argument('dependency', type=dependency_type, nargs='*',
                          metavar='DEPENDENCY',
-                         help='the name of the dependency to query')
+                         help='the names of the dependencies to query')
 
     deploy_p = subparsers.add_parser(
         'deploy', description=deploy_desc, help='deploy packages'
@@ -236,6 +351,31 @@ def main():
                          metavar='PATH', complete='directory',
                          help='directory storing local package data')
 
+    export_p = subparsers.add_parser(
+        'export', description=export_desc, help='export package directory'
+    )
+    export_p.set_defaults(func=export_snapshot)
+    export_p.add_argument('--directory', default='.', type=os.path.abspath,
+                          metavar='PATH', complete='directory',
+                          help='directory storing local package data')
+    export_p.add_argument('--root', type=os.path.abspath, metavar='PATH',
+                          complete='directory',
+                          help=('root directory for relocatable paths ' +
+                                '(default: common parent of the package ' +
+                                'directory and configuration files)'))
+    export_p.add_argument('file', metavar='FILE', complete='file',
+                          help='the snapshot file to write')
+
+    import_p = subparsers.add_parser(
+        'import', description=import_desc, help='import package directory'
+    )
+    import_p.set_defaults(func=import_snapshot)
+    import_p.add_argument('--directory', default='.', type=os.path.abspath,
+                          metavar='PATH', complete='directory',
+                          help='directory to store local package data in')
+    import_p.add_argument('file', metavar='FILE', complete='file',
+                          help='the snapshot file to read')
+
     list_files_p = subparsers.add_parser(
         'list-files', description=list_files_desc, help='list input files'
     )
@@ -263,6 +403,14 @@ def main():
     list_packages_p.add_argument('--flat', action='store_true',
                                  help='list packages without hierarchy')
 
+    serve_p = subparsers.add_parser(
+        'serve', description=serve_desc, help='serve package queries'
+    )
+    serve_p.set_defaults(func=serve)
+    serve_p.add_argument('--directory', default='.', type=os.path.abspath,
+                         metavar='PATH', complete='directory',
+                         help='directory storing local package data')
+
     help_p = subparsers.add_parser(
         'help', help='show this help message and exit', add_help=False
     )
@@ -19,7 +19,57 @@ def auto_dehydrate(value, freezedryer=None):
     return freezedryer.dehydrate(value)
 
 
+class _Codec:
+    # The encoder and decoder for a particular FreezeDried class. This works
+    # out how to handle each field once per class (or for fields that aren't
+    # known ahead of time, the first time they're seen), rather than on every
+    # call to `dehydrate()` or `rehydrate()`.
+
+    def __init__(self, cls):
+        self.cls = cls
+        self.encoders = {}
+        self.decoders = {k: v.rehydrate
+                         for k, v in cls._rehydrate_fields.items()}
+
+    @classmethod
+    def get(cls, type):
+        # Look in the class's own dict, since subclasses need their own codec.
+        try:
+            return type.__dict__['_codec']
+        except KeyError:
+            codec = type._codec = cls(type)
+            return codec
+
+    def add_encoder(self, field):
+        # Make a function to dehydrate `field`, or None if it's skipped.
+        if self.cls._skipped_field(self.cls, field):
+            encode = None
+        else:
+            freezedryer = self.cls._rehydrate_fields.get(field)
+            if freezedryer is None:
+                def encode(value):
+                    if hasattr(value, 'dehydrate'):
+                        return value.dehydrate()
+                    return value
+            elif isinstance(freezedryer, type):
+                def encode(value):
+                    if value is None:
+                        return None
+                    elif isinstance(value, freezedryer):
+                        return value.dehydrate()
+                    return freezedryer.dehydrate(value)
+            else:
+                def encode(value):
+                    if value is None:
+                        return None
+                    return freezedryer.dehydrate(value)
+
+        self.encoders[field] = encode
+        return encode
+
+
 class FreezeDried:
+    __slots__ = ()
     _type_field = None
     _rehydrate_fields = {}
     _skip_fields = set()
@@ -62,10 +112,15 @@ class FreezeDried:
         if hasattr(self, '_version'):
             result['_version'] = self._version
 
+        codec = _Codec.get(type(self))
+        encoders = codec.encoders
         for k, v in vars(self).items():
-            if self._skipped_field(k):
-                continue
-            result[k] = auto_dehydrate(v, self._rehydrate_fields.get(k))
+            try:
+                encode = encoders[k]
+            except KeyError:
+                encode = codec.add_encoder(k)
+            if encode is not None:
+                result[k] = encode(v)
         return result
 
     @classmethod
@@ -87,9 +142,10 @@ class FreezeDried:
 
         result = this_type.__new__(this_type)
 
+        decoders = _Codec.get(this_type).decoders
         for k, v in config.items():
-            if k in this_type._rehydrate_fields and v is not None:
-                v = this_type._rehydrate_fields[k].rehydrate(v, **kwargs)
+            if v is not None and k in decoders:
+                v = decoders[k](v, **kwargs)
             setattr(result, k, v)
 
         return result
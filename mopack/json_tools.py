@@ -0,0 +1,49 @@
+import json
+from collections.abc import Mapping, Sequence
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+__all__ = ['decode', 'dumps', 'encode']
+
+# JSON serialization for mopack's own files (metadata, caches) and for its
+# machine-readable output. If orjson is installed, we use that; otherwise, we
+# fall back to the standard `json` module. Either way, the output is compact
+# and UTF-8 encoded, so that the same data always produces the same bytes (the
+# metadata shards are named after their hashes).
+
+
+def _default(thing):
+    # Convert other kinds of collections (e.g. `MarkedDict`s and `MarkedList`s
+    # from our YAML parser) into ones the encoder knows about. Both backends
+    # only call this for values they can't encode themselves, so the common
+    # case stays in C.
+    if isinstance(thing, Mapping):
+        return dict(thing)
+    elif isinstance(thing, Sequence) and not isinstance(thing, str):
+        return list(thing)
+    raise TypeError('Object of type {} is not JSON serializable'
+                    .format(type(thing).__name__))
+
+
+_encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False,
+                            default=_default)
+
+
+def encode(thing):
+    if orjson:
+        return orjson.dumps(thing, default=_default,
+                            option=orjson.OPT_NON_STR_KEYS)
+    return _encoder.encode(thing).encode('utf-8')
+
+
+def dumps(thing):
+    return encode(thing).decode('utf-8')
+
+
+def decode(data):
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
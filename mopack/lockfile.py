@@ -0,0 +1,78 @@
+import json
+import os
+
+from .path import atomic_write
+
+__all__ = ['Lockfile', 'LockfileVersionError']
+
+
+class LockfileVersionError(RuntimeError):
+    pass
+
+
+# A record of the exact revisions of the packages fetched during `mopack
+# resolve` (e.g. the commit of a git package tracking a branch, or the hash of
+# a tarball), stored alongside the configuration so that it can be checked in.
+# Each entry records the source it came from, and is only honored if the
+# package is still fetched from the same source; otherwise (or if we're
+# updating the lockfile), packages fetch their latest revision and record that
+# instead.
+class Lockfile:
+    extension = '.lock'
+    version = 1
+
+    def __init__(self, path, update=False):
+        self.path = path
+        self.update = update
+        self._entries = self._load()
+
+    @classmethod
+    def for_config(cls, config, update=False):
+        # Name the lockfile after the first config file (e.g. `mopack.yml`
+        # gets `mopack.lock`), so that projects with several configs in the
+        # same directory get separate lockfiles.
+        return cls(os.path.splitext(config.files[0])[0] + cls.extension,
+                   update)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return {}
+
+        if state['version'] > self.version:
+            raise LockfileVersionError(
+                'lockfile version {} exceeds expected version {}'
+                .format(state['version'], self.version)
+            )
+        return state['packages']
+
+    def get(self, name, source):
+        # Get the locked revision for the package `name`, so long as it's
+        # still fetched from `source`.
+        if self.update:
+            return None
+        entry = self._entries.get(name)
+        if entry is None or entry['source'] != source:
+            return None
+        return entry['revision']
+
+    def put(self, name, source, revision):
+        self._entries[name] = {'source': source, 'revision': revision}
+
+    def save(self, names):
+        # Only keep entries for the packages in `names`, since any others were
+        # removed from the configuration.
+        entries = {k: v for k, v in self._entries.items() if k in names}
+        if not entries:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+
+        # Write the lockfile in a diff-friendly format, since it's meant to be
+        # checked in.
+        with atomic_write(self.path) as f:
+            json.dump({'version': self.version, 'packages': entries}, f,
+                      indent=2, sort_keys=True)
+            f.write('\n')
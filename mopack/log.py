@@ -148,21 +148,29 @@ class LogFile:
         self.file.close()
 
     def check_call(self, args, *, env, **kwargs):
+        self.check_output(args, env=env, **kwargs)
+
+    def check_output(self, args, *, env, stderr=subprocess.STDOUT, **kwargs):
+        # By default, stderr is merged into the returned output. Pass
+        # `stderr=subprocess.PIPE` to return only stdout; stderr is still
+        # logged.
         command = ' '.join(shlex.quote(i) for i in args)
         self._print_verbose('$ ' + command, flush=True)
         try:
             result = subprocess_run(
-                args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                args, stdout=subprocess.PIPE, stderr=stderr,
                 universal_newlines=True, check=True, env=env, **kwargs
             )
-            self._print_verbose(result.stdout)
+            self._print_verbose(result.stdout + (result.stderr or ''))
+            return result.stdout
         except subprocess.CalledProcessError as e:
-            print(e.stdout, file=self.file)
+            output = (e.stdout or '') + (e.stderr or '')
+            print(output, file=self.file)
             msg = "Command '{}' returned non-zero exit status {}".format(
                 command, e.returncode
             )
-            if e.stdout:
-                msg += ':\n' + textwrap.indent(e.stdout.rstrip(), '  ')
+            if output:
+                msg += ':\n' + textwrap.indent(output.rstrip(), '  ')
             raise subprocess.SubprocessError(msg)
         except Exception as e:
             print(str(e), file=self.file)
@@ -0,0 +1,92 @@
+import os
+import sys
+
+from . import json_tools
+from .environment import nested_invoke
+from .path import get_package_dir
+from .usage_cache import UsageCache
+
+# This is the entry point for the `mopack` command. Since most queries from
+# build systems are simple `mopack usage` calls whose answers are already in
+# the usage cache (see `commands.resolve`), we try to answer those here first,
+# without importing the rest of mopack or its dependencies (e.g. YAML parsing
+# or plugin loading), which would otherwise dominate the cost of the query.
+
+
+def _split_dependency(s):
+    # This is a looser parse than `types.dependency`, but malformed
+    # dependencies will never be found in the usage cache anyway, so we'll
+    # fall back to the full implementation and report the error there.
+    if s.endswith(']') and '[' in s:
+        name, submodules = s[:-1].split('[', 1)
+        return name, submodules.split(',')
+    return s, None
+
+
+def _parse_usage_args(argv):
+    # Parse the arguments for `mopack usage`, returning None for anything we
+    # don't handle in the fast path.
+    if not argv or argv[0] != 'usage':
+        return None
+
+    args = {'directory': '.', 'json': False, 'ndjson': False,
+            'strict': False, 'dependencies': []}
+    argv = iter(argv[1:])
+    for i in argv:
+        if i in ('--json', '--ndjson', '--strict'):
+            args[i[2:]] = True
+        elif i == '--directory':
+            args['directory'] = next(argv, None)
+            if args['directory'] is None:
+                return None
+        elif i.startswith('--directory='):
+            args['directory'] = i[len('--directory='):]
+        elif i.startswith('-'):
+            return None
+        else:
+            args['dependencies'].append(i)
+
+    # Only handle JSON output, since YAML output would require importing a
+    # YAML library. Conflicting formats are an error, which we leave to the
+    # full implementation to report.
+    if ( not (args['json'] or args['ndjson']) or
+         (args['json'] and args['ndjson']) or not args['dependencies'] ):
+        return None
+    return args
+
+
+def fast_usage(argv):
+    # Try to answer a `mopack usage` query directly from the usage cache. If
+    # we can, print the results (in the same format as `driver.usage`) and
+    # return True; otherwise, return False.
+    args = _parse_usage_args(argv)
+    if args is None:
+        return False
+
+    directory = os.environ.get(nested_invoke, args['directory'])
+    pkgdir = get_package_dir(directory)
+    cache = UsageCache(pkgdir, os.path.join(pkgdir, 'mopack.json'))
+
+    results = []
+    for i in args['dependencies']:
+        result = cache.get(*_split_dependency(i), args['strict'])
+        if result is None:
+            return False
+        results.append((i, result))
+
+    if args['ndjson']:
+        for k, v in results:
+            print(json_tools.dumps({k: v}), flush=True)
+    elif len(results) == 1:
+        print(json_tools.dumps(results[0][1]))
+    else:
+        print(json_tools.dumps(dict(results)))
+    return True
+
+
+def main():
+    if fast_usage(sys.argv[1:]):
+        return 0
+
+    from .driver import main
+    return main()
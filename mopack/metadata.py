@@ -1,21 +1,77 @@
-import json
+import collections.abc
+import hashlib
 import os
+from functools import partial
 
 from .config import Options
-from .freezedried import DictToListFreezeDryer
+from . import json_tools
+from .objutils import hashify, memoize_method
+from .path import atomic_write, FileIndex
+from .probe_cache import ProbeCache
 from .sources import Package
 from .sources.system import fallback_system_package
-from .yaml_tools import MarkedJSONEncoder
+from .types import dependency_string
 
 
 class MetadataVersionError(RuntimeError):
     pass
 
 
+# A marker for usages that are currently being computed, used to detect cycles.
+_in_progress = object()
+
+
+# A mapping of package names to packages that only loads and rehydrates each
+# package when it's first accessed, so that querying one package doesn't
+# require processing every package in the metadata.
+class _LazyPackages(collections.abc.MutableMapping):
+    class _Unloaded:
+        def __init__(self, data):
+            self.data = data
+
+    def __init__(self, packages, load, options):
+        # `packages` maps each package name to the data to pass to `load` to
+        # get its dehydrated form.
+        self._load = load
+        self._options = options
+        self._packages = {k: self._Unloaded(v) for k, v in packages.items()}
+
+    def __getitem__(self, key):
+        package = self._packages[key]
+        if isinstance(package, self._Unloaded):
+            package = self._packages[key] = Package.rehydrate(
+                self._load(package.data), _options=self._options
+            )
+        return package
+
+    def __setitem__(self, key, value):
+        self._packages[key] = value
+
+    def unloaded_data(self, key):
+        # Get the data to pass to `load` for `key` if it hasn't been loaded
+        # yet, or None otherwise.
+        package = self._packages[key]
+        if isinstance(package, self._Unloaded):
+            return package.data
+        return None
+
+    def __delitem__(self, key):
+        del self._packages[key]
+
+    def __contains__(self, key):
+        return key in self._packages
+
+    def __iter__(self):
+        return iter(self._packages)
+
+    def __len__(self):
+        return len(self._packages)
+
+
 class Metadata:
-    _PackagesFD = DictToListFreezeDryer(Package, lambda x: x.name)
     metadata_filename = 'mopack.json'
-    version = 1
+    shard_dirname = 'metadata'
+    version = 2
 
     def __init__(self, pkgdir, options=None, files=None, implicit_files=None):
         self.pkgdir = pkgdir
@@ -23,11 +79,35 @@ class Metadata:
         self.files = files or []
         self.implicit_files = implicit_files or []
         self.packages = {}
+        self._usages = {}
+        self._usage_inputs = {}
+
+        # The lockfile to use when fetching packages (if any). This is only
+        # set during `mopack resolve`.
+        self.lockfile = None
 
     @property
     def path(self):
         return os.path.join(self.pkgdir, self.metadata_filename)
 
+    @memoize_method
+    def probe_cache(self, **kwargs):
+        # Share the probe cache among all the packages that use it during this
+        # invocation of mopack.
+        return ProbeCache(self.pkgdir, **kwargs)
+
+    @memoize_method
+    def file_index(self):
+        return FileIndex()
+
+    def reset_caches(self):
+        # Reset any state cached for a single invocation of mopack so that this
+        # object can be reused (e.g. by `mopack serve`).
+        Metadata.probe_cache._reset(self)
+        Metadata.file_index._reset(self)
+        self._usages = {}
+        self._usage_inputs = {}
+
     def add_package(self, package):
         self.packages[package.name] = package
 
@@ -44,25 +124,118 @@ class Metadata:
                              .format(name))
         return package
 
+    def get_usage(self, name, submodules=None):
+        # Get the usage for a package, remembering it for the rest of this
+        # invocation of mopack so that each package in a dependency graph only
+        # needs to be processed once.
+        key = (name, hashify(submodules))
+        usage = self._usages.get(key)
+        if usage is _in_progress:
+            raise ValueError('dependency cycle detected for {!r}'.format(
+                dependency_string(name, submodules)
+            ))
+        elif usage is not None:
+            # Make sure anyone depending on this usage depends on its inputs
+            # too.
+            self.file_index().add_inputs(self._usage_inputs[key])
+            return usage
+
+        self._usages[key] = _in_progress
+        try:
+            with self.file_index().record() as inputs:
+                usage = self.get_package(name).get_usage(self, submodules)
+        except BaseException:
+            del self._usages[key]
+            raise
+        self._usages[key] = usage
+        self._usage_inputs[key] = inputs
+        return usage
+
+    def usage_inputs(self, name, submodules=None):
+        # Get the files and directories whose contents the usage for this
+        # package depended on when it was computed (e.g. the directories
+        # searched for headers).
+        return sorted(self._usage_inputs.get((name, hashify(submodules)), ()))
+
+    # The metadata is stored as a small index file (`mopack.json`) that refers
+    # to "shards" holding the options and each package. Shards are named after
+    # the hash of their contents, so saving only needs to write the shards that
+    # have changed, and since the index is written last (and atomically), it
+    # never refers to a partially-written shard. The shards referred to by the
+    # previous index are kept until the next save, since other processes (e.g.
+    # `mopack serve`) may still be lazily loading packages from it.
+
+    def _save_shard(self, data):
+        text = json_tools.encode(data)
+        name = hashlib.sha256(text).hexdigest() + '.json'
+        path = os.path.join(self.pkgdir, self.shard_dirname, name)
+        if not os.path.exists(path):
+            with atomic_write(path, 'wb') as f:
+                f.write(text)
+        return name
+
+    def _save_package(self, name):
+        data = None
+        if isinstance(self.packages, _LazyPackages):
+            data = self.packages.unloaded_data(name)
+
+        # If the package was never loaded, we can save it without rehydrating
+        # it: version 2 metadata already has a shard for it, and version 1
+        # metadata stores it in dehydrated form.
+        if isinstance(data, str):
+            return data
+        elif data is None:
+            data = self.packages[name].dehydrate()
+        return self._save_shard(data)
+
+    def _index_shards(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = json_tools.decode(f.read())['metadata']
+            return ({data['options']} |
+                    {i['shard'] for i in data['packages']})
+        except (OSError, ValueError, KeyError, TypeError):
+            return set()
+
+    def _clean_shards(self, used):
+        sharddir = os.path.join(self.pkgdir, self.shard_dirname)
+        for i in os.listdir(sharddir):
+            if i.endswith('.json') and i not in used:
+                os.remove(os.path.join(sharddir, i))
+
+    @classmethod
+    def _load_shard(cls, pkgdir, name):
+        with open(os.path.join(pkgdir, cls.shard_dirname, name), 'rb') as f:
+            return json_tools.decode(f.read())
+
     def save(self):
-        os.makedirs(self.pkgdir, exist_ok=True)
-        with open(os.path.join(self.path), 'w') as f:
-            json.dump({
+        os.makedirs(os.path.join(self.pkgdir, self.shard_dirname),
+                    exist_ok=True)
+
+        previous = self._index_shards()
+        options = self._save_shard(self.options.dehydrate())
+        packages = [{'name': i, 'shard': self._save_package(i)}
+                    for i in self.packages]
+        with atomic_write(self.path, 'wb') as f:
+            f.write(json_tools.encode({
                 'version': self.version,
                 'config_files': {
                     'explicit': self.files,
                     'implicit': self.implicit_files,
                 },
                 'metadata': {
-                    'options': self.options.dehydrate(),
-                    'packages': self._PackagesFD.dehydrate(self.packages),
+                    'options': options,
+                    'packages': packages,
                 }
-            }, f, cls=MarkedJSONEncoder)
+            }))
+
+        self._clean_shards({options} | {i['shard'] for i in packages} |
+                           previous)
 
     @classmethod
     def load(cls, pkgdir, strict=False):
-        with open(os.path.join(pkgdir, cls.metadata_filename)) as f:
-            state = json.load(f)
+        with open(os.path.join(pkgdir, cls.metadata_filename), 'rb') as f:
+            state = json_tools.decode(f.read())
             version, data = state['version'], state['metadata']
         if version > cls.version:
             raise MetadataVersionError(
@@ -70,18 +243,30 @@ class Metadata:
                 .format(version, cls.version)
             )
 
+        if version > 1:
+            options = cls._load_shard(pkgdir, data['options'])
+            packages = {i['name']: i['shard'] for i in data['packages']}
+            load = partial(cls._load_shard, pkgdir)
+        else:
+            options = data['options']
+            packages = {i['name']: i for i in data['packages']}
+
+            def load(data):
+                return data
+
         metadata = Metadata.__new__(Metadata)
         metadata.pkgdir = pkgdir
+        metadata._usages = {}
+        metadata._usage_inputs = {}
+        metadata.lockfile = None
         metadata.files = state['config_files']['explicit']
         metadata.implicit_files = state['config_files']['implicit']
 
-        metadata.options = Options.rehydrate(data['options'])
+        metadata.options = Options.rehydrate(options)
         if strict:
             metadata.options.common.strict = True
 
-        metadata.packages = cls._PackagesFD.rehydrate(
-            data['packages'], _options=metadata.options
-        )
+        metadata.packages = _LazyPackages(packages, load, metadata.options)
 
         return metadata
 
@@ -1,4 +1,5 @@
 import os
+from collections import ChainMap
 
 from . import types
 from .base_options import BaseOptions
@@ -22,6 +23,41 @@ class ExprSymbols(dict):
         )
 
 
+# The environment variables to save from `os.environ` when finalizing the
+# options. These are the ones that can affect later queries (e.g. finding
+# pkg-config during `mopack usage`); other variables are looked up from the
+# current environment when needed.
+_saved_env_vars = ('PATH', 'PATHEXT', 'CC', 'CXX', 'OBJC', 'OBJCXX',
+                   'PKG_CONFIG', 'PKG_CONFIG_PATH', 'PKG_CONFIG_LIBDIR',
+                   'PKG_CONFIG_DISABLE_UNINSTALLED')
+
+
+# The environment used by mopack. Only the first map (the variables set in the
+# config plus those in `_saved_env_vars`) is saved; everything else comes from
+# `os.environ`.
+class Environment(ChainMap):
+    def __init__(self, saved=None):
+        super().__init__(saved if saved is not None else {}, os.environ)
+
+    @property
+    def saved(self):
+        return self.maps[0]
+
+
+class _EnvironmentFreezeDryer:
+    @staticmethod
+    def dehydrate(value):
+        # Options that haven't been finalized yet just hold a dict.
+        if isinstance(value, Environment):
+            value = value.saved
+        return dict(value)
+
+    @staticmethod
+    def rehydrate(value, **kwargs):
+        return Environment(value)
+
+
+@FreezeDried.fields(rehydrate={'env': _EnvironmentFreezeDryer})
 class CommonOptions(FreezeDried, BaseOptions):
     _context = 'while adding common options'
     type = 'common'
@@ -59,7 +95,10 @@ class CommonOptions(FreezeDried, BaseOptions):
             self.strict = False
         if not self.target_platform:
             self.target_platform = platform_name()
-        self._fill_env(self.env, os.environ)
+        if not isinstance(self.env, Environment):
+            self.env = Environment(self._fill_env(self.env, {
+                k: os.environ[k] for k in _saved_env_vars if k in os.environ
+            }))
 
     @property
     @memoize_method
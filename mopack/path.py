@@ -1,5 +1,6 @@
 import functools
 import os
+import weakref
 from contextlib import contextmanager
 from enum import Enum
 
@@ -7,7 +8,14 @@ from .freezedried import FreezeDried
 from .iterutils import ismapping
 from .placeholder import PlaceholderString
 
-__all__ = ['file_outdated', 'Path', 'pushd']
+__all__ = ['atomic_write', 'file_mtime', 'file_outdated', 'FileIndex',
+           'get_package_dir', 'mopack_dirname', 'Path', 'pushd']
+
+mopack_dirname = 'mopack'
+
+
+def get_package_dir(builddir):
+    return os.path.abspath(os.path.join(builddir, mopack_dirname))
 
 
 @contextmanager
@@ -36,6 +44,75 @@ def file_outdated(path, compare_path, default=True):
         return True
 
 
+def file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    # Write to a temporary file and then move it into place so that other
+    # processes never see a partially-written file.
+    tmppath = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmppath, mode) as f:
+            yield f
+        os.replace(tmppath, path)
+    except BaseException:
+        try:
+            os.remove(tmppath)
+        except OSError:
+            pass
+        raise
+
+
+# An index of the files in each directory we've looked in. This lets us check
+# for many files in the same set of directories (e.g. when searching for
+# headers and libraries) while only listing each directory once.
+class FileIndex:
+    def __init__(self):
+        self._listings = {}
+        self._recorders = []
+
+    @contextmanager
+    def record(self):
+        # Record the paths that our results depend on (each directory we list,
+        # plus any extra inputs added via `add_inputs`) while in this context.
+        inputs = set()
+        self._recorders.append(inputs)
+        try:
+            yield inputs
+        finally:
+            self._recorders.pop()
+
+    def add_inputs(self, paths):
+        for i in self._recorders:
+            i.update(paths)
+
+    def listdir(self, path):
+        path = os.path.normcase(path or os.path.curdir)
+        self.add_inputs([path])
+        try:
+            return self._listings[path]
+        except KeyError:
+            pass
+
+        try:
+            with os.scandir(path) as it:
+                files = frozenset(os.path.normcase(i.name) for i in it
+                                  if i.is_file())
+        except OSError:
+            files = frozenset()
+        self._listings[path] = files
+        return files
+
+    def isfile(self, path):
+        dirname, basename = os.path.split(path)
+        return os.path.normcase(basename) in self.listdir(dirname)
+
+
 def _wrap_ospath(fn):
     @functools.wraps(fn)
     def wrapper(path, variables={}):
@@ -72,22 +149,46 @@ class Path(FreezeDried):
             filter_bases = {cls.ensure_base(i) for i in filter_bases}
             return [i for i in bases if i in filter_bases]
 
-    def __init__(self, path, base=Base.absolute):
-        base = self.Base.ensure_base(base)
+    # Paths are immutable and interned, since there can be a great many of
+    # them (e.g. when rehydrating large metadata), and most are duplicates.
+    __slots__ = ('path', 'base', '__weakref__')
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, path, base=Base.absolute):
+        base = cls.Base.ensure_base(base)
         if not isinstance(path, str):
             raise TypeError('expected a string')
-        self.path = os.path.normpath(path)
-        if self.path == os.path.curdir:
-            self.path = ''
+        path = os.path.normpath(path)
+        if path == os.path.curdir:
+            path = ''
 
-        if os.path.isabs(self.path):
-            self.base = self.Base.absolute
-        elif os.path.splitdrive(self.path)[0]:
+        if os.path.isabs(path):
+            base = cls.Base.absolute
+        elif os.path.splitdrive(path)[0]:
             raise ValueError('relative paths with drives not supported')
-        elif base == self.Base.absolute:
+        elif base == cls.Base.absolute:
             raise ValueError('base is absolute, but path is relative')
-        else:
-            self.base = self.Base.ensure_base(base)
+
+        key = (cls, path, base)
+        try:
+            return cls._interned[key]
+        except KeyError:
+            pass
+
+        self = super().__new__(cls)
+        object.__setattr__(self, 'path', path)
+        object.__setattr__(self, 'base', base)
+        cls._interned[key] = self
+        return self
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is immutable'.format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError('{} is immutable'.format(type(self).__name__))
+
+    def __reduce__(self):
+        return (type(self), (self.path, self.base))
 
     def dehydrate(self):
         return {'base': self.base.name, 'path': self.path}
@@ -1,9 +1,37 @@
 import os
+import re
+import subprocess
+import sysconfig
+from io import StringIO
 
-from .iterutils import issequence
-from .path import Path
+from .environment import split_paths, subprocess_run, which
+from .iterutils import issequence, listify, uniques
+from .objutils import memoize, memoize_method
+from .path import atomic_write, Path
+from .platforms import platform_name
 from .shell import quote_native, ShellArguments
 
+_variable_ex = re.compile(r'^([A-Za-z0-9_.]+)\s*=\s*(.*)$')
+_field_ex = re.compile(r'^([A-Za-z0-9_.]+)\s*:\s*(.*)$')
+_expand_ex = re.compile(r'\$\$|\$\{([^}]*)\}')
+_requires_ex = re.compile(r'([^\s,<>=!]+)(?:\s*(<=|>=|!=|=|<|>)\s*([^\s,]+))?')
+_version_part_ex = re.compile(r'[0-9]+|[A-Za-z]+')
+
+_inputs_prefix = '# Inputs: '
+
+_version_ops = {
+    '=': lambda x: x == 0,
+    '!=': lambda x: x != 0,
+    '<': lambda x: x < 0,
+    '<=': lambda x: x <= 0,
+    '>': lambda x: x > 0,
+    '>=': lambda x: x >= 0,
+}
+
+
+class PkgConfigError(Exception):
+    pass
+
 
 def _write_variable(out, name, value):
     if value is None:
@@ -40,9 +68,12 @@ def generated_pkg_config_dir(pkgdir):
 
 def write_pkg_config(out, name, *, desc='mopack-generated package',
                      version=None, requires=None, cflags=None, libs=None,
-                     variables={}):
+                     variables={}, inputs_hash=None):
     out.write('# Do not edit this file! It was automatically generated by ' +
-              'mopack.\n\n')
+              'mopack.\n')
+    if inputs_hash:
+        out.write(_inputs_prefix + inputs_hash + '\n')
+    out.write('\n')
 
     wrote_var = False
     for k, v in variables.items():
@@ -58,3 +89,313 @@ def write_pkg_config(out, name, *, desc='mopack-generated package',
     _write_field(out, 'Requires', requires, var_symbols)
     _write_field(out, 'Cflags', cflags, var_symbols)
     _write_field(out, 'Libs', libs, var_symbols)
+
+
+def _strip_inputs(data):
+    return ''.join(i for i in data.splitlines(True)
+                   if not i.startswith(_inputs_prefix))
+
+
+def update_pkg_config(path, name, **kwargs):
+    # Write a .pc file, but only replace the existing file if the contents
+    # have actually changed, so that build systems depending on it don't
+    # see spurious updates. If only the recorded inputs hash has changed,
+    # update the file but keep its original timestamps. Return True if the
+    # file's meaningful contents changed.
+    out = StringIO()
+    write_pkg_config(out, name, **kwargs)
+    data = out.getvalue()
+
+    try:
+        stat = os.stat(path)
+        with open(path) as f:
+            old_data = f.read()
+    except FileNotFoundError:
+        stat = old_data = None
+
+    if data == old_data:
+        return False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write(path) as f:
+        f.write(data)
+
+    if old_data is not None and _strip_inputs(old_data) == _strip_inputs(data):
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        return False
+    return True
+
+
+def pkg_config_outdated(path, inputs_hash):
+    # Check if the generated .pc file at `path` is missing or was generated
+    # from different inputs than `inputs_hash`.
+    try:
+        with open(path) as f:
+            for line in f:
+                if not line.startswith('#'):
+                    break
+                if line.startswith(_inputs_prefix):
+                    return line[len(_inputs_prefix):].rstrip() != inputs_hash
+    except FileNotFoundError:
+        pass
+    return True
+
+
+@memoize
+def default_pkg_config_path():
+    # This mirrors the default search path that pkg-config (and pkgconf) use
+    # on Linux. On other platforms, the defaults vary too much to guess, so
+    # we only search the paths set in the environment.
+    if platform_name() != 'linux':
+        return []
+
+    multiarch = sysconfig.get_config_var('MULTIARCH')
+    result = []
+    for prefix in ('/usr/local', '/usr'):
+        if multiarch:
+            result.append(os.path.join(prefix, 'lib', multiarch, 'pkgconfig'))
+        else:
+            result.append(os.path.join(prefix, 'lib64', 'pkgconfig'))
+        result.extend([os.path.join(prefix, 'lib', 'pkgconfig'),
+                       os.path.join(prefix, 'share', 'pkgconfig')])
+    return result
+
+
+def pkg_config_path(env=os.environ):
+    libdir = env.get('PKG_CONFIG_LIBDIR')
+    return (split_paths(env.get('PKG_CONFIG_PATH')) +
+            (split_paths(libdir) if libdir is not None
+             else default_pkg_config_path()))
+
+
+@memoize
+def _builtin_pkg_config_path(pkg_config, env):
+    # Ask pkg-config for its compiled-in search path, since it can differ from
+    # our guess in `default_pkg_config_path()`.
+    try:
+        return split_paths(subprocess_run(
+            list(pkg_config) + ['--variable', 'pc_path', 'pkg-config'],
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True, env=env
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _cached_builtin_pkg_config_path(pkg_config, env, cache):
+    # pkg-config's compiled-in search path only changes when pkg-config itself
+    # does, so store it in `cache`, stamped with the resolved executable and
+    # its modification time.
+    try:
+        exe = os.path.realpath(which([pkg_config], env, resolve=True)[0])
+        mtime = os.stat(exe).st_mtime_ns
+    except OSError:
+        return _builtin_pkg_config_path(pkg_config, env)
+    return cache.probe('pc_path', pkg_config,
+                       lambda: _builtin_pkg_config_path(pkg_config, env),
+                       stamp=[exe, mtime])
+
+
+def pkg_config_search_path(pkg_config, env=os.environ, cache=None):
+    # Get all the directories that `pkg_config` might search for .pc files, or
+    # None if we can't tell. If `cache` is a ProbeCache, pkg-config's
+    # compiled-in search path is saved there across invocations.
+    if env.get('PKG_CONFIG_LIBDIR') is not None:
+        return pkg_config_path(env)
+    if cache is None:
+        builtin = _builtin_pkg_config_path(pkg_config, env)
+    else:
+        builtin = _cached_builtin_pkg_config_path(pkg_config, env, cache)
+    if builtin is None:
+        return None
+    return uniques(pkg_config_path(env) + builtin)
+
+
+def compare_versions(a, b):
+    # This follows the version comparison from pkg-config (which is in turn
+    # based on RPM's): compare runs of digits numerically and runs of letters
+    # lexically; numeric runs are newer than alphabetic ones, and if all the
+    # common runs are equal, the version with more runs is newer.
+    if a == b:
+        return 0
+
+    a_parts = _version_part_ex.findall(a)
+    b_parts = _version_part_ex.findall(b)
+    for i, j in zip(a_parts, b_parts):
+        i_num, j_num = i.isdigit(), j.isdigit()
+        if i_num != j_num:
+            return 1 if i_num else -1
+        if i_num:
+            i, j = int(i), int(j)
+        if i != j:
+            return 1 if i > j else -1
+    return (len(a_parts) > len(b_parts)) - (len(a_parts) < len(b_parts))
+
+
+def parse_requires(value):
+    return [(m.group(1), m.group(2), m.group(3))
+            for m in _requires_ex.finditer(value)]
+
+
+class PkgConfigFile:
+    def __init__(self, name, path, variables, fields):
+        self.name = name
+        self.path = path
+        self.variables = variables
+        self.fields = fields
+
+    @classmethod
+    def load(cls, name, path):
+        with open(path) as f:
+            return cls.parse(name, path, f)
+
+    @classmethod
+    def parse(cls, name, path, f):
+        variables = {'pcfiledir': os.path.dirname(path)}
+        fields = {}
+
+        def expand(value):
+            def sub(m):
+                if m.group(1) is None:
+                    return '$'
+                try:
+                    return variables[m.group(1)]
+                except KeyError:
+                    raise PkgConfigError(
+                        'undefined variable {!r} in {!r}'
+                        .format(m.group(1), path)
+                    )
+            return _expand_ex.sub(sub, value)
+
+        line = ''
+        for raw in f:
+            line += raw.rstrip('\n')
+            if line.endswith('\\'):
+                line = line[:-1]
+                continue
+
+            line, _, _ = line.partition('#')
+            line = line.strip()
+            if not line:
+                continue
+
+            m = _field_ex.match(line)
+            if m:
+                fields[m.group(1)] = expand(m.group(2).strip())
+            else:
+                m = _variable_ex.match(line)
+                if not m:
+                    raise PkgConfigError('invalid line {!r} in {!r}'
+                                         .format(line, path))
+                variables[m.group(1)] = expand(m.group(2).strip())
+            line = ''
+
+        if 'Version' not in fields:
+            raise PkgConfigError('package {!r} has no Version field'
+                                 .format(name))
+        return cls(name, path, variables, fields)
+
+    @property
+    def version(self):
+        return self.fields['Version']
+
+    @property
+    def requires(self):
+        return (parse_requires(self.fields.get('Requires', '')) +
+                parse_requires(self.fields.get('Requires.private', '')))
+
+
+class PkgConfigResolver:
+    def __init__(self, search_path, *, uninstalled=True):
+        self.search_path = search_path
+        self.uninstalled = uninstalled
+
+    @classmethod
+    def from_env(cls, env=os.environ):
+        return cls(pkg_config_path(env),
+                   uninstalled='PKG_CONFIG_DISABLE_UNINSTALLED' not in env)
+
+    @memoize_method
+    def find(self, name):
+        filenames = [name + '.pc']
+        if self.uninstalled:
+            filenames.insert(0, name + '-uninstalled.pc')
+
+        for path in self.search_path:
+            for filename in filenames:
+                pcfile = os.path.join(path, filename)
+                if os.path.isfile(pcfile):
+                    return pcfile
+        return None
+
+    @memoize_method
+    def load(self, name):
+        pcfile = self.find(name)
+        if pcfile is None:
+            raise PkgConfigError('package {!r} not found'.format(name))
+        return PkgConfigFile.load(name, pcfile)
+
+    def check(self, names):
+        # Check that all the named packages (and their requirements) can be
+        # loaded, raising a PkgConfigError if not.
+        seen = set()
+        pending = [(i, None, None) for i in listify(names)]
+        while pending:
+            name, op, version = pending.pop()
+            pc = self.load(name)
+            if op and not _version_ops[op](compare_versions(pc.version,
+                                                            version)):
+                raise PkgConfigError(
+                    'package {!r} has version {!r}; required {} {}'
+                    .format(name, pc.version, op, version)
+                )
+
+            if name not in seen:
+                seen.add(name)
+                pending.extend(pc.requires)
+
+    def exists(self, names):
+        try:
+            self.check(names)
+            return True
+        except (OSError, PkgConfigError):
+            return False
+
+    def modversion(self, name):
+        self.check(name)
+        return self.load(name).version
+
+
+def _can_resolve_natively(pkg_config):
+    return (len(pkg_config) == 1 and
+            os.path.basename(pkg_config[0]) in ('pkg-config', 'pkgconf'))
+
+
+def pkg_config_exists(pkg_config, names, *, env):
+    # Look up the packages in-process if we can. If this fails, fall back to
+    # asking pkg-config, since it might know something we don't.
+    names = listify(names)
+    if names and _can_resolve_natively(pkg_config):
+        if PkgConfigResolver.from_env(env).exists(names):
+            return True
+
+    try:
+        subprocess_run(pkg_config + names, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                       env=env)
+        return True
+    except (OSError, subprocess.CalledProcessError):
+        return False
+
+
+def pkg_config_version(pkg_config, name, *, env, **kwargs):
+    if _can_resolve_natively(pkg_config):
+        try:
+            return PkgConfigResolver.from_env(env).modversion(name)
+        except (OSError, PkgConfigError):
+            pass
+
+    return subprocess_run(
+        pkg_config + [name, '--modversion'], check=True,
+        stdout=subprocess.PIPE, universal_newlines=True, env=env, **kwargs
+    ).stdout.strip()
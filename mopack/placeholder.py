@@ -4,6 +4,8 @@ from . import iterutils
 
 
 class PlaceholderValue:
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
@@ -21,6 +23,8 @@ class PlaceholderValue:
 
 
 class PlaceholderString:
+    __slots__ = ('__bits',)
+
     def __init__(self, *args):
         self.__bits = tuple(self.__canonicalize(args))
 
@@ -0,0 +1,58 @@
+import json
+import os
+
+from . import json_tools
+from .path import atomic_write, file_mtime
+
+
+# A persistent cache of the results of probing the system for packages (e.g.
+# whether pkg-config can find a package). The entire cache is invalidated
+# whenever any of the relevant environment variables or the modification times
+# of any of the searched directories change. Caches with different sets of
+# inputs should be stored under different filenames. Individual entries can
+# also have their own stamp (e.g. the modification time of the file they were
+# read from); when it changes, the entry is replaced.
+class ProbeCache:
+    cache_filename = 'probe-cache.json'
+    version = 2
+
+    def __init__(self, pkgdir, *, filename=None, env, env_vars=(), dirs=()):
+        self.path = os.path.join(pkgdir, filename or self.cache_filename)
+        self.stamp = {
+            'env': {i: env.get(i) for i in env_vars},
+            'dirs': [[i, file_mtime(i)] for i in dirs],
+        }
+        self._entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                state = json_tools.decode(f.read())
+            if ( state['version'] == self.version and
+                 state['stamp'] == self.stamp ):
+                return state['entries']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return {}
+
+    def _save(self):
+        try:
+            with atomic_write(self.path, 'wb') as f:
+                f.write(json_tools.encode({
+                    'version': self.version,
+                    'stamp': self.stamp,
+                    'entries': self._entries,
+                }))
+        except OSError:
+            pass
+
+    def probe(self, kind, key, fn, *, stamp=None):
+        entry = json.dumps([kind, key])
+        cached = self._entries.get(entry)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        result = fn()
+        self._entries[entry] = [stamp, result]
+        self._save()
+        return result
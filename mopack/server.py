@@ -0,0 +1,255 @@
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from types import SimpleNamespace
+
+from . import commands, log
+from .metadata import Metadata
+from .path import file_mtime
+from .usage_cache import usage_env
+
+__all__ = ['Client', 'connect', 'serve', 'ServerError', 'socket_path']
+
+socket_filename = 'mopack.sock'
+
+
+def socket_path(pkgdir):
+    return os.path.join(pkgdir, socket_filename)
+
+
+class ServerError(RuntimeError):
+    pass
+
+
+def _encode_tree(items):
+    return [{'name': i.package.name, 'source': i.package.source,
+             'version': i.version, 'children': _encode_tree(i.children)}
+            for i in items]
+
+
+def _decode_tree(items):
+    return [commands.PackageTreeItem(
+        SimpleNamespace(name=i['name'], source=i['source']), i['version'],
+        _decode_tree(i['children'])
+    ) for i in items]
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # Each request and response is a single line of JSON.
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                response = {'result': self.server.dispatch(
+                    request['command'], **request.get('args', {})
+                )}
+            except Exception as e:
+                response = {'error': str(e)}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+# A server answering queries about the packages in a package directory. The
+# metadata is loaded once and kept in memory, and reloaded whenever the
+# metadata file changes. Each client is handled in its own thread so that a
+# client holding its connection open doesn't block the others, but requests
+# are answered one at a time, since they share the metadata and its caches.
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    timeout = 1
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self, pkgdir):
+        self.pkgdir = pkgdir
+        self.metadata_path = os.path.join(pkgdir, Metadata.metadata_filename)
+        self._metadata_mtime = None
+        self._metadata = {}
+        self._lock = threading.Lock()
+        super().__init__(socket_path(pkgdir), _RequestHandler)
+
+    def get_metadata(self, strict=False):
+        mtime = file_mtime(self.metadata_path)
+        if mtime != self._metadata_mtime:
+            if self._metadata_mtime is not None:
+                log.info('reloading {}'.format(self.metadata_path))
+            self._metadata_mtime = mtime
+            self._metadata = {}
+
+        if strict not in self._metadata:
+            self._metadata[strict] = Metadata.try_load(self.pkgdir, strict)
+        metadata = self._metadata[strict]
+        metadata.reset_caches()
+        return metadata
+
+    def dispatch(self, command, **kwargs):
+        with self._lock:
+            return self._dispatch(command, **kwargs)
+
+    def _dispatch(self, command, **kwargs):
+        if command == 'usage_all':
+            # Usage depends on some environment variables that we read from
+            # our own environment, so if the client's values differ, we can't
+            # answer for it.
+            if kwargs.get('env') != usage_env():
+                return None
+
+            strict = kwargs.get('strict', False)
+            results = commands.usage_all(
+                self.pkgdir, kwargs['dependencies'], strict,
+                lambda: self.get_metadata(strict)
+            )
+            return [{'error': str(i)} if isinstance(i, Exception) else
+                    {'usage': i} for i in results]
+        elif command == 'list_files':
+            strict = kwargs.get('strict', False)
+            return commands.list_files(
+                self.pkgdir, kwargs.get('implicit', False), strict,
+                self.get_metadata(strict)
+            )
+        elif command == 'list_packages':
+            # Like `Metadata.load`, require the metadata file to exist. (Strict
+            # mode only affects looking up undefined packages, so it doesn't
+            # matter here.)
+            return _encode_tree(commands.list_packages(
+                self.pkgdir, kwargs.get('flat', False),
+                self.get_metadata(strict=True)
+            ))
+        raise ValueError('unknown command {!r}'.format(command))
+
+    def running(self):
+        # Keep serving only as long as our socket is still in place; if it's
+        # removed (e.g. by `mopack clean`) or replaced by another server, we
+        # should stop.
+        try:
+            return os.stat(self.server_address).st_ino == self._socket_ino
+        except OSError:
+            return False
+
+    def server_activate(self):
+        super().server_activate()
+        self._socket_ino = os.stat(self.server_address).st_ino
+
+
+# A client for a running `mopack serve`. This provides the same interface as
+# the query functions in `mopack.commands`, minus the `pkgdir` argument.
+class Client:
+    def __init__(self, sock, pkgdir):
+        self._sock = sock
+        self._file = sock.makefile('rwb')
+        self.pkgdir = pkgdir
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _request(self, command, **kwargs):
+        self._file.write(json.dumps({
+            'command': command, 'args': kwargs
+        }).encode('utf-8') + b'\n')
+        self._file.flush()
+
+        line = self._file.readline()
+        if not line:
+            raise ServerError('server closed the connection')
+        response = json.loads(line)
+        if 'error' in response:
+            raise ServerError(response['error'])
+        return response['result']
+
+    def usage_all(self, dependencies, strict=False):
+        results = self._request('usage_all', dependencies=dependencies,
+                                strict=strict, env=usage_env())
+        if results is None:
+            # The server's environment differs from ours, so answer the query
+            # ourselves.
+            return commands.usage_all(self.pkgdir, dependencies, strict)
+        return [ServerError(i['error']) if 'error' in i else i['usage']
+                for i in results]
+
+    def iter_usage(self, dependencies, strict=False):
+        # The server answers all the queries in a single response, so there's
+        # nothing to stream.
+        yield from self.usage_all(dependencies, strict)
+
+    def usage(self, name, submodules=None, strict=False):
+        result, = self.usage_all([(name, submodules)], strict)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def list_files(self, implicit=False, strict=False):
+        return self._request('list_files', implicit=implicit, strict=strict)
+
+    def list_packages(self, flat=False):
+        return _decode_tree(self._request('list_packages', flat=flat))
+
+
+def connect(pkgdir):
+    # Connect to the server for `pkgdir`, returning None if there isn't one
+    # running.
+    path = socket_path(pkgdir)
+    if not os.path.exists(path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        # Either there's no server listening, or the socket's path is too long
+        # to connect to (in which case no server could be listening on it).
+        sock.close()
+        return None
+    return Client(sock, pkgdir)
+
+
+def serve(pkgdir):
+    path = socket_path(pkgdir)
+    client = connect(pkgdir)
+    if client:
+        client.close()
+        raise RuntimeError('a server is already running for {!r}'
+                           .format(pkgdir))
+
+    # Remove any socket left behind by a server that didn't exit cleanly.
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(pkgdir, exist_ok=True)
+
+    # Make sure we clean up our socket if we're terminated.
+    def terminate(signum, frame):
+        sys.exit(0)
+
+    try:
+        server = Server(pkgdir)
+    except OSError as e:
+        # This can happen if the socket's path is too long for a Unix domain
+        # socket; in that case, clients will just answer queries themselves.
+        raise RuntimeError('unable to listen on {!r}: {}'.format(path, e))
+
+    old_handler = signal.signal(signal.SIGTERM, terminate)
+    try:
+        with server:
+            log.info('listening on {}'.format(path))
+            try:
+                while server.running():
+                    server.handle_request()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                if server.running():
+                    os.remove(path)
+    finally:
+        signal.signal(signal.SIGTERM, old_handler)
@@ -1,5 +1,6 @@
 import os
 import re
+import sys
 from collections.abc import MutableSequence
 from enum import Enum
 from itertools import chain
@@ -156,6 +157,8 @@ def split_native_str(s, type=list):
 
 
 class ShellArguments(MutableSequence):
+    __slots__ = ('_args',)
+
     def __init__(self, args=[]):
         self._args = list(args)
 
@@ -211,7 +214,8 @@ class ShellArguments(MutableSequence):
                 return Path.rehydrate(value, **kwargs)
             elif isiterable(value):
                 return tuple(rehydrate_each(i) for i in value)
-            return value
+            # Arguments are often repeated across packages, so intern them.
+            return sys.intern(value)
 
         return ShellArguments(rehydrate_each(i) for i in value)
 
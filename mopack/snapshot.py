@@ -0,0 +1,161 @@
+import io
+import os
+import re
+import shutil
+import tarfile
+
+from . import json_tools
+from .metadata import Metadata
+
+__all__ = ['export_snapshot', 'import_snapshot', 'SnapshotError']
+
+# A snapshot is a tarball of a resolved package directory that can be restored
+# somewhere else without resolving again (e.g. to resolve once and then share
+# the results among several CI jobs). Absolute paths under the "root"
+# directory (by default, the directory containing both the package directory
+# and the configuration files) are replaced with a placeholder in the metadata
+# and in any .pc files, and the location of the root relative to the package
+# directory is recorded in the snapshot's manifest. Importing the snapshot then
+# fills in the placeholder based on the new package directory.
+#
+# Other files (e.g. those generated by build systems) are copied as-is, so
+# rebuilding an imported package may require resolving it again.
+
+manifest_filename = 'mopack-snapshot.json'
+version = 1
+
+_root_placeholder = '@MOPACK_SNAPSHOT_ROOT@'
+
+
+class SnapshotError(RuntimeError):
+    pass
+
+
+def _is_cache(name):
+    # Our caches depend on the modification times of files and directories, so
+    # they aren't valid in the new location anyway.
+    return name.endswith('-cache.json') or name.endswith('.tmp')
+
+
+def _is_rewritable(relpath):
+    return (relpath == Metadata.metadata_filename or
+            os.path.dirname(relpath) == Metadata.shard_dirname or
+            relpath.endswith('.pc'))
+
+
+def _escape(relpath, path):
+    # Paths in JSON files may be escaped (e.g. backslashes on Windows).
+    if relpath.endswith('.json'):
+        return json_tools.dumps(path)[1:-1]
+    return path
+
+
+def _replace_root(data, old, new):
+    # Only replace `old` when it's a whole path component.
+    regex = re.escape(old) + r'(?![^\\/\s"\':;,)])'
+    text = data.decode('utf-8', 'surrogateescape')
+    return re.sub(regex, lambda m: new, text).encode(
+        'utf-8', 'surrogateescape'
+    )
+
+
+def _default_root(pkgdir):
+    metadata = Metadata.load(pkgdir)
+    return os.path.commonpath(
+        [pkgdir] + [os.path.dirname(i) for i in metadata.files]
+    )
+
+
+def export_snapshot(pkgdir, filename, root=None):
+    if not os.path.exists(os.path.join(pkgdir, Metadata.metadata_filename)):
+        raise SnapshotError('package directory {!r} has not been resolved'
+                            .format(pkgdir))
+
+    pkgdir = os.path.abspath(pkgdir)
+    root = os.path.abspath(root) if root else _default_root(pkgdir)
+    if os.path.dirname(root) == root:
+        raise SnapshotError('snapshot root cannot be the filesystem root')
+    if os.path.relpath(pkgdir, root).startswith(os.path.pardir):
+        raise SnapshotError('package directory {!r} is not inside {!r}'
+                            .format(pkgdir, root))
+
+    def addbytes(tar, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+
+    with tarfile.open(filename, 'w:gz') as tar:
+        addbytes(tar, manifest_filename, json_tools.encode({
+            'version': version,
+            'root': os.path.relpath(root, pkgdir),
+        }))
+
+        for dirpath, dirnames, filenames in os.walk(pkgdir):
+            dirnames.sort()
+            for i in sorted(filenames):
+                path = os.path.join(dirpath, i)
+                relpath = os.path.relpath(path, pkgdir)
+                if dirpath == pkgdir and _is_cache(i):
+                    continue
+
+                if _is_rewritable(relpath) and not os.path.islink(path):
+                    with open(path, 'rb') as f:
+                        data = _replace_root(
+                            f.read(), _escape(relpath, root),
+                            _escape(relpath, _root_placeholder)
+                        )
+                    addbytes(tar, relpath, data)
+                else:
+                    tar.add(path, relpath, recursive=False)
+
+
+def _extractall(tar, path):
+    # Use the "data" filter if available to reject unsafe archive members.
+    if hasattr(tarfile, 'data_filter'):
+        tar.extractall(path, filter='data')
+    else:  # pragma: no cover
+        tar.extractall(path)
+
+
+def import_snapshot(pkgdir, filename):
+    pkgdir = os.path.abspath(pkgdir)
+    with tarfile.open(filename, 'r:*') as tar:
+        try:
+            manifest = json_tools.decode(
+                tar.extractfile(manifest_filename).read()
+            )
+        except (KeyError, ValueError):
+            raise SnapshotError('{!r} is not a mopack snapshot'
+                                .format(filename))
+        if manifest['version'] > version:
+            raise SnapshotError(
+                'snapshot version {} exceeds expected version {}'
+                .format(manifest['version'], version)
+            )
+
+        if os.path.exists(pkgdir):
+            shutil.rmtree(pkgdir)
+        _extractall(tar, pkgdir)
+
+    os.remove(os.path.join(pkgdir, manifest_filename))
+    root = os.path.normpath(os.path.join(pkgdir, manifest['root']))
+
+    for dirpath, dirnames, filenames in os.walk(pkgdir):
+        for i in filenames:
+            path = os.path.join(dirpath, i)
+            relpath = os.path.relpath(path, pkgdir)
+            if _is_rewritable(relpath) and not os.path.islink(path):
+                with open(path, 'rb') as f:
+                    data = _replace_root(
+                        f.read(), _escape(relpath, _root_placeholder),
+                        _escape(relpath, root)
+                    )
+                with open(path, 'wb') as f:
+                    f.write(data)
+
+    # Metadata shards are named after their contents, which we just changed,
+    # so load every package and save the metadata again to rename them.
+    metadata = Metadata.load(pkgdir)
+    metadata.packages = dict(metadata.packages)
+    metadata.save()
+    return metadata
@@ -5,11 +5,13 @@ from .. import types
 from ..base_options import BaseOptions, OptionsHolder
 from ..freezedried import FreezeDried
 from ..iterutils import ismapping, listify
+from ..objutils import memoize
 from ..package_defaults import DefaultResolver
 from ..types import FieldKeyError, FieldValueError, try_load_config
 from ..usage import Usage, make_usage
 
 
+@memoize
 def _get_source_type(source, field='source'):
     try:
         return load_entry_point('mopack', 'mopack.sources', source)
@@ -1,16 +1,210 @@
+import os
+import re
 import subprocess
+import time
 from itertools import chain
 
-from . import BinaryPackage
+from . import BinaryPackage, PackageOptions
 from .. import log, types
 from ..environment import get_cmd, subprocess_run
 from ..iterutils import uniques
 
+_dpkg_admindir = '/var/lib/dpkg'
+_apt_sources = '/etc/apt/sources.list'
+_apt_sourceparts = '/etc/apt/sources.list.d'
+_apt_lists = '/var/lib/apt/lists'
+
+_installed_cache = {}
+_ppa_ex = re.compile(r'^ppa:([^/]+)/(.+)$')
+_ppa_hosts = ('ppa.launchpad.net', 'ppa.launchpadcontent.net')
+
+
+def _dpkg_status_file(env):
+    return os.path.join(env.get('DPKG_ADMINDIR', _dpkg_admindir), 'status')
+
+
+def _add_installed(result, name, arch, version):
+    result.setdefault(name, version)
+    if arch:
+        result['{}:{}'.format(name, arch)] = version
+
+
+def _parse_dpkg_status(f):
+    # The status database is a series of RFC 822-style stanzas separated by
+    # blank lines. We only care about a handful of fields, so skip everything
+    # else (including multi-line continuations) as quickly as possible.
+    result = {}
+    fields = {}
+    for line in chain(f, ['\n']):
+        if line == '\n':
+            if ( 'Package' in fields and
+                 fields.get('Status', '').endswith(' installed') ):
+                _add_installed(result, fields['Package'],
+                               fields.get('Architecture'),
+                               fields.get('Version'))
+            fields = {}
+        elif line.startswith(('Package:', 'Status:', 'Version:',
+                              'Architecture:')):
+            key, value = line.split(':', 1)
+            fields[key] = value.strip()
+    return result
+
+
+def _query_installed(dpkgq, env):
+    output = subprocess_run(
+        dpkgq + ['-W', '-f${Package}\t${Architecture}\t${db:Status-Abbrev}\t' +
+                 '${Version}\n'],
+        check=True, stdout=subprocess.PIPE, universal_newlines=True, env=env
+    ).stdout
+
+    result = {}
+    for line in output.splitlines():
+        name, arch, status, version = line.split('\t', 3)
+        if status.startswith('ii'):
+            _add_installed(result, name, arch, version)
+    return result
+
+
+def _installed_packages(env):
+    # Get a mapping of all installed packages to their versions. Normally, we
+    # read dpkg's status database directly; however, if `DPKG_QUERY` is set
+    # (or we can't find the database), defer to that command instead. In
+    # either case, only re-query this when the status database has changed.
+    status_file = _dpkg_status_file(env)
+    use_dpkgq = 'DPKG_QUERY' in env
+    try:
+        stat = os.stat(status_file)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        use_dpkgq = True
+        stamp = None
+
+    dpkgq = get_cmd(env, 'DPKG_QUERY', 'dpkg-query') if use_dpkgq else None
+    key = (status_file, tuple(dpkgq or ()))
+    cached = _installed_cache.get(key)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    if dpkgq:
+        result = _query_installed(dpkgq, env)
+    else:
+        with open(status_file) as f:
+            result = _parse_dpkg_status(f)
+    _installed_cache[key] = (stamp, result)
+    return result
+
+
+def _parse_sources_list(f):
+    # Parse a one-line-style sources list, e.g. `/etc/apt/sources.list`.
+    for line in f:
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        # Remove any options, like `[arch=amd64]`.
+        line = re.sub(r'\[[^\]]*\]', '', line)
+        bits = line.split()
+        if len(bits) >= 3:
+            yield (bits[0], bits[1].rstrip('/'), bits[2], frozenset(bits[3:]))
+
+
+def _parse_deb822_sources(f):
+    # Parse a deb822-style sources list, e.g.
+    # `/etc/apt/sources.list.d/foo.sources`.
+    def each_entry(fields):
+        if fields.get('enabled', 'yes') == 'no':
+            return
+        components = frozenset(fields.get('components', '').split())
+        for kind in fields.get('types', '').split():
+            for uri in fields.get('uris', '').split():
+                for suite in fields.get('suites', '').split():
+                    yield (kind, uri.rstrip('/'), suite, components)
+
+    fields = {}
+    for line in chain(f, ['\n']):
+        if line.startswith('#'):
+            continue
+        elif not line.strip():
+            yield from each_entry(fields)
+            fields = {}
+        elif line[0] not in ' \t' and ':' in line:
+            key, value = line.split(':', 1)
+            fields[key.lower()] = value.strip()
+
+
+def _configured_repositories():
+    files = [(_apt_sources, _parse_sources_list)]
+    try:
+        for i in sorted(os.listdir(_apt_sourceparts)):
+            if i.endswith('.list'):
+                files.append((os.path.join(_apt_sourceparts, i),
+                              _parse_sources_list))
+            elif i.endswith('.sources'):
+                files.append((os.path.join(_apt_sourceparts, i),
+                              _parse_deb822_sources))
+    except OSError:
+        pass
+
+    result = []
+    for filename, parse in files:
+        try:
+            with open(filename) as f:
+                result.extend(parse(f))
+        except OSError:
+            pass
+    return result
+
+
+def _has_repository(configured, repository):
+    m = _ppa_ex.match(repository)
+    if m:
+        suffix = '/{}/{}/ubuntu'.format(*m.groups())
+        return any(uri.split('://', 1)[-1].split('/', 1)[0] in _ppa_hosts and
+                   uri.endswith(suffix) for kind, uri, suite, comps in
+                   configured)
+
+    wanted = list(_parse_sources_list([repository]))
+    if wanted:
+        kind, uri, suite, components = wanted[0]
+        return any(kind == i[0] and uri == i[1] and suite == i[2] and
+                   components <= i[3] for i in configured)
+
+    # We don't know how to interpret this repository, so just assume it's
+    # missing and let `add-apt-repository` figure it out.
+    return False
+
+
+def _lists_age():
+    # Get the age (in seconds) of apt's package lists, based on the newest
+    # file in the lists directory.
+    try:
+        newest = max(i.stat().st_mtime for i in os.scandir(_apt_lists)
+                     if i.is_file() and i.name != 'lock')
+    except (OSError, ValueError):
+        return None
+    return time.time() - newest
+
 
 class AptPackage(BinaryPackage):
     source = 'apt'
     _version = 1
 
+    class Options(PackageOptions):
+        source = 'apt'
+        _version = 1
+
+        @staticmethod
+        def upgrade(config, version):
+            return config
+
+        def __init__(self):
+            self.update_max_age = types.Unset
+
+        def __call__(self, *, update_max_age=types.Unset, config_file,
+                     _symbols, _child_config=False):
+            if not _child_config and self.update_max_age is types.Unset:
+                T = types.TypeCheck(locals(), _symbols)
+                T.update_max_age(types.maybe_raw(types.integer))
+
     @staticmethod
     def upgrade(config, version):
         return config
@@ -29,31 +223,52 @@ class AptPackage(BinaryPackage):
     def guessed_version(self, metadata):
         # XXX: Maybe try to de-munge the version into something not
         # apt-specific?
-        env = self._common_options.env
-        dpkgq = get_cmd(env, 'DPKG_QUERY', 'dpkg-query')
-        return subprocess_run(
-            dpkgq + ['-W', '-f${Version}', self.remote[0]],
-            check=True, stdout=subprocess.PIPE, universal_newlines=True,
-            env=env
-        ).stdout
+        installed = _installed_packages(self._common_options.env)
+        try:
+            return installed[self.remote[0]]
+        except KeyError:
+            raise ValueError('package {!r} is not installed'
+                             .format(self.remote[0]))
+
+    @staticmethod
+    def _needs_update(options, added_repositories):
+        if added_repositories or not options or not options.update_max_age:
+            return True
+        age = _lists_age()
+        return age is None or age > options.update_max_age
 
     @classmethod
     def resolve_all(cls, metadata, packages):
         for i in packages:
             log.pkg_resolve(i.name, 'from {}'.format(cls.source))
 
+        options = packages[0]._this_options
         env = packages[0]._common_options.env
         apt = get_cmd(env, 'APT_GET', 'sudo apt-get')
         aptrepo = get_cmd(env, 'ADD_APT_REPOSITORY', 'sudo add-apt-repository')
 
-        remotes = list(chain.from_iterable(i.remote for i in packages))
-        repositories = uniques(i.repository for i in packages if i.repository)
+        # Only touch apt for the things that are actually missing.
+        try:
+            installed = _installed_packages(env)
+        except (OSError, subprocess.CalledProcessError):
+            installed = {}
+        remotes = [i for i in uniques(chain.from_iterable(
+            i.remote for i in packages
+        )) if i not in installed]
+
+        configured = _configured_repositories()
+        repositories = [i for i in uniques(
+            i.repository for i in packages if i.repository
+        ) if not _has_repository(configured, i)]
 
         with log.LogFile.open(metadata.pkgdir, 'apt') as logfile:
             for i in repositories:
                 logfile.check_call(aptrepo + ['-y', i], env=env)
-            logfile.check_call(apt + ['update'], env=env)
-            logfile.check_call(apt + ['install', '-y'] + remotes, env=env)
+            if remotes:
+                if cls._needs_update(options, repositories):
+                    logfile.check_call(apt + ['update'], env=env)
+                logfile.check_call(apt + ['install', '-y'] + remotes,
+                                   env=env)
 
         for i in packages:
             i.resolved = True
@@ -1,19 +1,26 @@
+import hashlib
+import json
 import os
+import re
 import subprocess
 import warnings
+from io import StringIO
 from itertools import chain
 
 from . import BinaryPackage, PackageOptions
 from .. import log, types
 from ..environment import get_cmd
 from ..freezedried import FreezeDried
-from ..iterutils import uniques
+from ..iterutils import listify, uniques
 from ..shell import ShellArguments
 
+_reference_ex = re.compile(r'^[^/@#\[\]]+/([^/@#\[\]]+)(?:[@#]|$)')
 
+
+@FreezeDried.fields(skip_compare={'resolved_version'})
 class ConanPackage(BinaryPackage):
     source = 'conan'
-    _version = 1
+    _version = 2
 
     @FreezeDried.fields(rehydrate={'extra_args': ShellArguments})
     class Options(PackageOptions):
@@ -39,6 +46,9 @@ class ConanPackage(BinaryPackage):
 
     @staticmethod
     def upgrade(config, version):
+        # v2 adds `resolved_version`.
+        if version < 2:
+            config['resolved_version'] = None
         return config
 
     def __init__(self, name, remote, build=False, options=None, usage=None,
@@ -52,11 +62,16 @@ class ConanPackage(BinaryPackage):
 
         value_type = types.one_of(types.string, types.boolean, desc='a value')
         T.options(types.maybe(types.dict_of(types.string, value_type), {}))
+        self.resolved_version = None
 
     @staticmethod
     def _installdir(metadata):
         return os.path.join(metadata.pkgdir, 'conan')
 
+    @classmethod
+    def _stampfile(cls, metadata):
+        return os.path.join(cls._installdir(metadata), 'mopack-install.hash')
+
     @staticmethod
     def _build_opts(value):
         if not value:
@@ -76,13 +91,35 @@ class ConanPackage(BinaryPackage):
     def path_values(self, metadata, *, builder=None):
         return {'builddir': self._installdir(metadata)} if builder else {}
 
+    def _find_version(self, metadata):
+        # If the reference names an exact version, just use that. Otherwise,
+        # (e.g. for version ranges), look at the generated pkg-config file.
+        m = _reference_ex.match(self.remote)
+        if m:
+            return m.group(1)
+
+        installdir = self._installdir(metadata)
+        for i in self._pcnames():
+            try:
+                with open(os.path.join(installdir, i + '.pc')) as f:
+                    for line in f:
+                        if line.startswith('Version:'):
+                            return line[len('Version:'):].strip() or None
+            except FileNotFoundError:
+                pass
+        return None
+
     def version(self, metadata):
+        if self.resolved_version is not None:
+            return self.resolved_version
+
         # Inspect the local conan cache to get the package's version.
-        # XXX: There might be a better way to do this...
-        conan = get_cmd(self._common_options.env, 'CONAN', 'conan')
+        env = self._common_options.env
+        conan = get_cmd(env, 'CONAN', 'conan')
         return subprocess.run(
             conan + ['inspect', '--raw=version', self.remote],
-            check=True, stdout=subprocess.PIPE, universal_newlines=True
+            check=True, stdout=subprocess.PIPE, universal_newlines=True,
+            env=env
         ).stdout
 
     def clean_post(self, metadata, new_package, quiet=False):
@@ -100,42 +137,74 @@ class ConanPackage(BinaryPackage):
             pass
         return True
 
+    def _pcnames(self):
+        # Get the names of the .pc files we expect conan to generate for this
+        # package. If submodules are required, this is usually empty, since
+        # their .pc files are named after the submodules.
+        return listify(getattr(self.usage, 'pcname', None))
+
+    @classmethod
+    def _install_outdated(cls, metadata, packages, install_hash):
+        installdir = cls._installdir(metadata)
+        if not all(os.path.exists(os.path.join(installdir, j + '.pc'))
+                   for i in packages for j in i._pcnames()):
+            return True
+
+        try:
+            with open(cls._stampfile(metadata)) as f:
+                return f.read() != install_hash
+        except FileNotFoundError:
+            return True
+
     @classmethod
     def resolve_all(cls, metadata, packages):
         for i in packages:
             log.pkg_resolve(i.name, 'from {}'.format(cls.source))
 
         options = packages[0]._this_options
-        os.makedirs(metadata.pkgdir, exist_ok=True)
-        with open(os.path.join(metadata.pkgdir, 'conanfile.txt'),
-                  'w') as conan:
-            print('[requires]', file=conan)
-            for i in packages:
-                print(i.remote, file=conan)
-            print('', file=conan)
-
-            print('[options]', file=conan)
-            for i in packages:
-                for k, v in i.options.items():
-                    print('{}:{}={}'.format(i.remote_name, k, v), file=conan)
-            print('', file=conan)
-
-            print('[generators]', file=conan)
-            print('pkg_config', file=conan)
+        conanfile = StringIO()
+        print('[requires]', file=conanfile)
+        for i in packages:
+            print(i.remote, file=conanfile)
+        print('', file=conanfile)
+
+        print('[options]', file=conanfile)
+        for i in packages:
+            for k, v in i.options.items():
+                print('{}:{}={}'.format(i.remote_name, k, v), file=conanfile)
+        print('', file=conanfile)
+
+        print('[generators]', file=conanfile)
+        print('pkg_config', file=conanfile)
+        conanfile = conanfile.getvalue()
 
         build = [i.remote_name for i in packages if i.build]
 
         env = packages[0]._common_options.env
         conan = get_cmd(env, 'CONAN', 'conan')
-        with log.LogFile.open(metadata.pkgdir, 'conan') as logfile:
-            logfile.check_call(
-                conan + ['install', '-if', cls._installdir(metadata)] +
+        args = (conan + ['install', '-if', cls._installdir(metadata)] +
                 cls._build_opts(uniques(options.build + build)) +
-                options.extra_args.fill() + ['--', metadata.pkgdir],
-                env=env
-            )
+                options.extra_args.fill() + ['--', metadata.pkgdir])
+
+        # If nothing that affects `conan install` has changed since the last
+        # successful run and its outputs are still around, skip it.
+        install_hash = hashlib.sha256(json.dumps(
+            [conanfile, args], separators=(',', ':')
+        ).encode('utf-8')).hexdigest()
+        if cls._install_outdated(metadata, packages, install_hash):
+            os.makedirs(metadata.pkgdir, exist_ok=True)
+            with open(os.path.join(metadata.pkgdir, 'conanfile.txt'),
+                      'w') as f:
+                f.write(conanfile)
+
+            with log.LogFile.open(metadata.pkgdir, 'conan') as logfile:
+                logfile.check_call(args, env=env)
+
+            with open(cls._stampfile(metadata), 'w') as f:
+                f.write(install_hash)
 
         for i in packages:
+            i.resolved_version = i._find_version(metadata)
             i.resolved = True
 
     @staticmethod
@@ -1,6 +1,8 @@
+import hashlib
 import os
 import shutil
 from io import BytesIO
+from subprocess import PIPE, SubprocessError
 from urllib.request import urlopen
 
 from . import Package, submodules_type
@@ -8,7 +10,7 @@ from .. import archive, log, types
 from ..builders import Builder, make_builder
 from ..config import ChildConfig
 from ..environment import get_cmd
-from ..freezedried import FreezeDried
+from ..freezedried import auto_dehydrate, FreezeDried
 from ..glob import filter_glob
 from ..log import LogFile
 from ..package_defaults import DefaultResolver
@@ -189,6 +191,29 @@ class TarballPackage(SDistPackage):
         with urlopen(url) as f:
             return BytesIO(f.read())
 
+    def _check_lock(self, metadata, source, f):
+        # Make sure the tarball is the same one recorded in the lockfile (if
+        # any), and record its hash.
+        lockfile = metadata.lockfile
+        if lockfile is None:
+            return
+
+        sha256 = hashlib.sha256()
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha256.update(chunk)
+        f.seek(0)
+        digest = sha256.hexdigest()
+
+        locked = lockfile.get(self.name, source)
+        if locked is not None and locked != digest:
+            raise ValueError(
+                ('sha256 of {} is {}, but {} expected {}; pass ' +
+                 '`--update-lock` to accept it').format(
+                    source, digest, os.path.basename(lockfile.path), locked
+                )
+            )
+        lockfile.put(self.name, source, digest)
+
     def clean_pre(self, metadata, new_package, quiet=False):
         if self.equal(new_package, skip_fields={'builder'}):
             # Since both package objects have the same configuration, pass the
@@ -212,6 +237,7 @@ class TarballPackage(SDistPackage):
 
             with (self._urlopen(self.url) if self.url else
                   open(self.path.string(cfgdir=self.config_dir), 'rb')) as f:
+                self._check_lock(metadata, where, f)
                 with archive.open(f) as arc:
                     names = arc.getnames()
                     self.guessed_srcdir = (names[0].split('/', 1)[0] if names
@@ -283,14 +309,36 @@ class GitPackage(SDistPackage):
         shutil.rmtree(self._base_srcdir(metadata), ignore_errors=True)
         return True
 
+    def _lock_commit(self, logfile, git, env, lockfile, source, locked):
+        # Only read stdout so that any warnings from git don't end up in the
+        # lockfile.
+        head = logfile.check_output(git + ['rev-parse', 'HEAD'], env=env,
+                                    stderr=PIPE).strip()
+        if locked and head != locked:
+            try:
+                logfile.check_call(git + ['reset', '--hard', locked], env=env)
+            except SubprocessError:
+                # We don't have the locked commit yet, so fetch it first.
+                logfile.check_call(git + ['fetch', 'origin'], env=env)
+                logfile.check_call(git + ['reset', '--hard', locked], env=env)
+            head = locked
+        lockfile.put(self.name, source, head)
+
     def fetch(self, metadata, parent_config):
         base_srcdir = self._base_srcdir(metadata)
         env = self._common_options.env
         git = get_cmd(env, 'GIT', 'git')
 
+        lockfile = metadata.lockfile
+        source = {'repository': auto_dehydrate(self.repository),
+                  'rev': self.rev}
+        locked = lockfile.get(self.name, source) if lockfile else None
+
         with LogFile.open(metadata.pkgdir, self.name) as logfile:
             if os.path.exists(base_srcdir):
-                if self.rev[0] == 'branch':
+                # If we have a locked commit, there's no need to pull; we'll
+                # check out the locked commit below if needed.
+                if self.rev[0] == 'branch' and not locked:
                     with pushd(base_srcdir):
                         logfile.check_call(git + ['pull'], env=env)
             else:
@@ -308,4 +356,9 @@ class GitPackage(SDistPackage):
                     raise ValueError('unknown revision type {!r}'
                                      .format(self.rev[0]))
 
+            if lockfile:
+                with pushd(base_srcdir):
+                    self._lock_commit(logfile, git, env, lockfile, source,
+                                      locked)
+
         return self._find_mopack(parent_config, self._srcdir(metadata))
@@ -324,6 +324,12 @@ def boolean(field, value):
     return value
 
 
+def integer(field, value):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise FieldValueError('expected an integer', field)
+    return value
+
+
 def path_fragment(field, value):
     value = string(field, value)
     if os.path.isabs(value) or os.path.splitdrive(value)[0]:
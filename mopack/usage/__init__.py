@@ -1,9 +1,11 @@
 from pkg_resources import load_entry_point
 
 from ..base_options import OptionsHolder
+from ..objutils import memoize
 from ..types import FieldValueError, dependency_string, wrap_field_error
 
 
+@memoize
 def _get_usage_type(type, field='type'):
     try:
         return load_entry_point('mopack', 'mopack.usage', type)
@@ -1,3 +1,5 @@
+import hashlib
+import json
 import os
 import re
 import subprocess
@@ -6,18 +8,41 @@ from itertools import chain
 from . import preferred_path_base, Usage
 from . import submodules as submod
 from .. import types
-from ..environment import get_pkg_config, subprocess_run
+from ..environment import get_pkg_config
 from ..freezedried import DictFreezeDryer, FreezeDried, ListFreezeDryer
 from ..iterutils import ismapping, listify, uniques
+from ..objutils import memoize, memoize_method
 from ..package_defaults import DefaultResolver
-from ..path import file_outdated, isfile, Path
-from ..pkg_config import generated_pkg_config_dir, write_pkg_config
+from ..path import Path
+from ..pkg_config import (generated_pkg_config_dir, pkg_config_exists,
+                          pkg_config_outdated, pkg_config_search_path,
+                          pkg_config_version, update_pkg_config)
 from ..shell import ShellArguments, split_paths
 from ..types import dependency_string, Unset
+from ..yaml_tools import MarkedJSONEncoder
+
+
+# Environment variables that can affect whether pkg-config finds a package.
+_pkg_config_env_vars = ('PKG_CONFIG', 'PKG_CONFIG_PATH', 'PKG_CONFIG_LIBDIR',
+                        'PKG_CONFIG_DISABLE_UNINSTALLED')
+
+
+# The file caching the versions found in headers. Each entry is keyed on the
+# header's path and the version regex, and stamped with the header's
+# modification time and size, so it doesn't depend on any other inputs.
+_version_cache_filename = 'version-cache.json'
+
+
+# The file caching pkg-config's compiled-in search path. Each entry is stamped
+# with the resolved pkg-config executable and its modification time.
+_pc_path_cache_filename = 'pc-path-cache.json'
 
 
 # XXX: Getting build configuration like this from the environment is a bit
 # hacky. Maybe there's a better way?
+_system_env_vars = ('MOPACK_INCLUDE_PATH', 'MOPACK_LIB_PATH',
+                    'MOPACK_LIB_NAMES')
+
 
 def _system_include_path(env=os.environ):
     return [Path(i) for i in split_paths(env.get('MOPACK_INCLUDE_PATH'))]
@@ -64,6 +89,25 @@ _version_def = types.one_of(
     desc='version definition'
 )
 
+
+class _InputsEncoder(MarkedJSONEncoder):
+    def default(self, thing):
+        if hasattr(thing, 'dehydrate'):
+            return thing.dehydrate()
+        return super().default(thing)
+
+
+def _hash_inputs(inputs):
+    data = json.dumps(inputs, sort_keys=True, cls=_InputsEncoder)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+@memoize
+def _compile_version_regex(regex):
+    return [re.compile(i) if isinstance(i, str) else (re.compile(i[0]), i[1])
+            for i in regex]
+
+
 _list_of_dependencies = types.list_of(types.dependency, listify=True)
 _list_of_headers = types.list_of(types.string, listify=True)
 _list_of_libraries = types.list_of(_library, listify=True)
@@ -199,11 +243,16 @@ class PathUsage(Usage):
 
         return check
 
-    def _get_submodule_mapping(self, symbols, path_bases, submodule):
+    # Filling in a submodule mapping is fairly expensive, and packages with
+    # many submodules (e.g. Boost) may need it several times per submodule, so
+    # cache the filled mappings.
+    @memoize_method
+    def _get_submodule_mapping(self, path_bases, submodule):
         try:
             mapping = self.submodule_map[submodule]
         except KeyError:
             mapping = self.submodule_map['*']
+        symbols = self._options.expr_symbols.augment(paths=path_bases)
         return mapping.fill(symbols, path_bases, submodule)
 
     @staticmethod
@@ -227,17 +276,18 @@ class PathUsage(Usage):
         return list(filtered.keys())
 
     @classmethod
-    def _include_dirs(cls, headers, include_path, path_vars):
+    def _include_dirs(cls, index, headers, include_path, path_vars):
         headers = listify(headers, scalar_ok=False)
         include_path = (listify(include_path, scalar_ok=False) or
                         _system_include_path())
         return cls._filter_path(
-            lambda p, f: isfile(p.append(f), path_vars),
+            lambda p, f: index.isfile(p.append(f).string(**path_vars)),
             include_path, headers, 'header'
         )
 
     @classmethod
-    def _library_dirs(cls, auto_link, libraries, library_path, path_vars):
+    def _library_dirs(cls, index, auto_link, libraries, library_path,
+                      path_vars):
         library_path = (listify(library_path, scalar_ok=False)
                         or _system_lib_path())
         if auto_link:
@@ -247,7 +297,8 @@ class PathUsage(Usage):
 
         lib_names = _system_lib_names()
         return cls._filter_path(
-            lambda p, f: any(isfile(p.append(i.format(f)), path_vars)
+            lambda p, f: any(index.isfile(p.append(i.format(f))
+                                          .string(**path_vars))
                              for i in lib_names),
             library_path, (i for i in libraries if isinstance(i, str)),
             'library'
@@ -255,27 +306,51 @@ class PathUsage(Usage):
 
     @staticmethod
     def _match_line(ex, line):
-        if isinstance(ex, str):
-            m = re.search(ex, line)
+        if isinstance(ex, tuple):
+            return True, ex[0].sub(ex[1], line)
+        else:
+            m = ex.search(line)
             line = m.group(1) if m else None
             return line is not None, line
-        else:
-            return True, re.sub(ex[0], ex[1], line)
+
+    @classmethod
+    def _scan_version(cls, header, regexes):
+        with open(header) as f:
+            for line in f:
+                for ex in regexes:
+                    found, line = cls._match_line(ex, line)
+                    if not found:
+                        break
+                else:
+                    return line
+        return None
+
+    def _header_version(self, metadata, header, regex):
+        regexes = _compile_version_regex(regex)
+        try:
+            stat = os.stat(header)
+        except OSError:
+            # We can't tell if the header has changed, so just try to read it.
+            return self._scan_version(header, regexes)
+
+        metadata.file_index().add_inputs([header])
+        cache = metadata.probe_cache(filename=_version_cache_filename, env={})
+        return cache.probe(
+            'version', [header, regex],
+            lambda: self._scan_version(header, regexes),
+            stamp=[stat.st_mtime_ns, stat.st_size]
+        )
 
     def _get_version(self, metadata, pkg, include_dirs, path_vars):
         if ismapping(self.explicit_version):
             version = self.explicit_version
             for path in include_dirs:
-                header = path.append(version['file'])
+                header = path.append(version['file']).string(**path_vars)
                 try:
-                    with open(header.string(**path_vars)) as f:
-                        for line in f:
-                            for ex in version['regex']:
-                                found, line = self._match_line(ex, line)
-                                if not found:
-                                    break
-                            else:
-                                return line
+                    result = self._header_version(metadata, header,
+                                                  version['regex'])
+                    if result is not None:
+                        return result
                 except FileNotFoundError:
                     pass
             return None
@@ -288,7 +363,8 @@ class PathUsage(Usage):
         path_values = pkg.path_values(metadata, builder=True)
         try:
             include_dirs = self._include_dirs(
-                self.headers, self.include_path, path_values
+                metadata.file_index(), self.headers, self.include_path,
+                path_values
             )
         except ValueError:  # pragma: no cover
             # XXX: This is a hack to work around the fact that we currently
@@ -318,32 +394,45 @@ class PathUsage(Usage):
         deps_requires = []
         deps_paths = [pkgconfdir]
         for dep_pkg, dep_sub in chain_attr('dependencies'):
-            # XXX: Cache usage so we don't repeatedly process the same package.
-            usage = metadata.get_package(dep_pkg).get_usage(metadata, dep_sub)
+            usage = metadata.get_usage(dep_pkg, dep_sub)
 
             auto_link |= usage.get('auto_link', False)
             deps_requires.extend(usage.get('pcnames', []))
             deps_paths.extend(usage.get('pkg_config_path', []))
 
-        should_write = file_outdated(pcpath, metadata.path)
+        # Find the include and library dirs and the version (synced across
+        # all submodules). These depend on the state of the system (e.g. which
+        # headers are installed), so we need them to tell if the .pc file is
+        # up-to-date.
+        include_dirs = self._include_dirs(
+            metadata.file_index(), chain_attr('headers'),
+            chain_attr('include_path'), path_values
+        )
+        if get_version or version is None:
+            version = self._get_version(metadata, pkg, include_dirs,
+                                        path_values)
+        libraries = list(chain_attr('libraries'))
+        library_dirs = self._library_dirs(
+            metadata.file_index(), self.auto_link, libraries,
+            chain_attr('library_path'), path_values
+        )
 
-        if should_write or get_version:
-            # Get the version so we can sync it across all submodules.
-            include_dirs = self._include_dirs(
-                chain_attr('headers'), chain_attr('include_path'), path_values
-            )
-            if get_version or version is None:
-                version = self._get_version(metadata, pkg, include_dirs,
-                                            path_values)
+        # Only regenerate the .pc file if any of the inputs that affect its
+        # contents have changed since it was last written.
+        inputs_hash = _hash_inputs({
+            'package': pkg.dehydrate(),
+            'mappings': [i.dehydrate() for i in mappings],
+            'pcname': pcname,
+            'version': version,
+            'include_dirs': include_dirs,
+            'library_dirs': library_dirs,
+            'requires': requires + deps_requires,
+            'path_values': path_values,
+            'env': {i: os.environ.get(i) for i in _system_env_vars},
+        })
 
-        if should_write:
+        if pkg_config_outdated(pcpath, inputs_hash):
             # Generate the pkg-config data...
-            libraries = list(chain_attr('libraries'))
-            library_dirs = self._library_dirs(
-                self.auto_link, libraries, chain_attr('library_path'),
-                path_values
-            )
-
             cflags = (
                 [('-I', i) for i in include_dirs] +
                 ShellArguments(chain_attr('compile_flags'))
@@ -355,12 +444,10 @@ class PathUsage(Usage):
             )
 
             # ... and write it.
-            os.makedirs(pkgconfdir, exist_ok=True)
-            with open(pcpath, 'w') as f:
-                write_pkg_config(f, pcname, version=version,
-                                 requires=requires + deps_requires,
-                                 cflags=cflags, libs=libs,
-                                 variables=path_values)
+            update_pkg_config(pcpath, pcname, version=version,
+                              requires=requires + deps_requires,
+                              cflags=cflags, libs=libs, variables=path_values,
+                              inputs_hash=inputs_hash)
 
         result = {'auto_link': auto_link, 'pcname': pcname,
                   'pkg_config_path': uniques(deps_paths)}
@@ -387,11 +474,9 @@ class PathUsage(Usage):
                 version = data['version']
 
             path_bases = pkg.path_bases(builder=True)
-            symbols = self._options.expr_symbols.augment(paths=path_bases)
-
             pcnames = []
             for i in submodules:
-                mapping = self._get_submodule_mapping(symbols, path_bases, i)
+                mapping = self._get_submodule_mapping(path_bases, i)
                 data = self._write_pkg_config(metadata, pkg, i, version,
                                               requires, mappings + [mapping])
                 auto_link |= data['auto_link']
@@ -444,12 +529,9 @@ class SystemUsage(PathUsage):
         pkg_config = get_pkg_config(self._common_options.env)
         try:
             # XXX: Make sure this works when submodules are required.
-            return subprocess_run(
-                pkg_config + [self.pcname, '--modversion'], check=True,
-                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
-                universal_newlines=True,
-                env=self._common_options.env
-            ).stdout.strip()
+            return pkg_config_version(pkg_config, self.pcname,
+                                      env=self._common_options.env,
+                                      stderr=subprocess.DEVNULL)
         except (OSError, subprocess.CalledProcessError):
             return super().version(metadata, pkg)
 
@@ -457,9 +539,8 @@ class SystemUsage(PathUsage):
         if submodules and self.submodule_map:
             pcnames = [] if pkg.submodules['required'] else [self.pcname]
             path_bases = pkg.path_bases(builder=True)
-            symbols = self._options.expr_symbols.augment(paths=path_bases)
             for i in submodules:
-                mapping = self._get_submodule_mapping(symbols, path_bases, i)
+                mapping = self._get_submodule_mapping(path_bases, i)
                 if mapping.pcname:
                     pcnames.append(mapping.pcname)
         else:
@@ -467,12 +548,24 @@ class SystemUsage(PathUsage):
 
         env = self._common_options.env
         pkg_config = get_pkg_config(env)
-        try:
-            subprocess_run(pkg_config + pcnames, check=True,
-                           stdout=subprocess.DEVNULL,
-                           stderr=subprocess.DEVNULL,
-                           env=env)
+        search_path = pkg_config_search_path(
+            pkg_config, env, metadata.probe_cache(
+                filename=_pc_path_cache_filename, env={}
+            )
+        )
+        if search_path is None:
+            # We can't tell when pkg-config's results would change, so don't
+            # cache them.
+            found = pkg_config_exists(pkg_config, pcnames, env=env)
+        else:
+            cache = metadata.probe_cache(
+                env=env, env_vars=_pkg_config_env_vars, dirs=search_path
+            )
+            found = cache.probe(
+                'pkg_config', [pkg_config, pcnames],
+                lambda: pkg_config_exists(pkg_config, pcnames, env=env)
+            )
+        if found:
             return self._usage(pkg, submodules, pcnames=pcnames,
                                pkg_config_path=[])
-        except (OSError, subprocess.CalledProcessError):
-            return super().get_usage(metadata, pkg, submodules)
+        return super().get_usage(metadata, pkg, submodules)
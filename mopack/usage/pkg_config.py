@@ -1,14 +1,14 @@
-import subprocess
 from collections import ChainMap
 
 from . import preferred_path_base, Usage
 from . import submodules as submod
 from .. import types
-from ..environment import get_pkg_config, subprocess_run
+from ..environment import get_pkg_config
 from ..freezedried import DictFreezeDryer, FreezeDried, ListFreezeDryer
 from ..iterutils import listify
 from ..package_defaults import DefaultResolver
 from ..path import Path
+from ..pkg_config import pkg_config_version
 from ..shell import join_paths
 
 
@@ -98,10 +98,7 @@ class PkgConfigUsage(Usage):
         env = ChainMap({'PKG_CONFIG_PATH': join_paths(pkgconfpath)},
                        self._common_options.env)
 
-        return subprocess_run(
-            pkg_config + [self.pcname, '--modversion'], check=True,
-            stdout=subprocess.PIPE, universal_newlines=True, env=env
-        ).stdout.strip()
+        return pkg_config_version(pkg_config, self.pcname, env=env)
 
     def _get_submodule_mapping(self, submodule):
         try:
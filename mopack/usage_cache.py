@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+
+from . import json_tools
+from .path import atomic_write, file_mtime
+from .pkg_config import pkg_config_path
+
+# Environment variables read directly from the environment (rather than from
+# the metadata) when computing usage.
+_env_vars = ('MOPACK_INCLUDE_PATH', 'MOPACK_LIB_PATH', 'MOPACK_LIB_NAMES',
+             'PKG_CONFIG', 'PKG_CONFIG_PATH', 'PKG_CONFIG_LIBDIR',
+             'PKG_CONFIG_DISABLE_UNINSTALLED')
+
+
+def usage_env(env=os.environ):
+    # Get the values of the environment variables that affect usage.
+    return {i: env.get(i) for i in _env_vars}
+
+
+def _hash_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+# A persistent cache of the results of `mopack usage`. The cache as a whole is
+# tied to the contents of the metadata file, and each entry records the inputs
+# (environment variables and directories) that its result depends on, so that
+# entries are invalidated when any of them change. Since the usage of a package
+# defined in the metadata doesn't depend on whether we're in strict mode,
+# entries for these packages are stored with a `strict` of None and serve
+# queries in either mode.
+class UsageCache:
+    cache_filename = 'usage-cache.json'
+    version = 1
+
+    def __init__(self, pkgdir, metadata_path, env=os.environ):
+        self.path = os.path.join(pkgdir, self.cache_filename)
+        self.env = env
+        self.metadata_hash = _hash_file(metadata_path)
+        self._entries = self._load()
+        self._dirty = False
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                state = json_tools.decode(f.read())
+            if ( state['version'] == self.version and
+                 state['metadata_hash'] == self.metadata_hash ):
+                return state['entries']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return {}
+
+    def save(self):
+        if not self._dirty:
+            return
+
+        try:
+            with atomic_write(self.path, 'wb') as f:
+                f.write(json_tools.encode({
+                    'version': self.version,
+                    'metadata_hash': self.metadata_hash,
+                    'entries': self._entries,
+                }))
+            self._dirty = False
+        except OSError:
+            pass
+
+    @staticmethod
+    def _key(name, submodules, strict):
+        return json.dumps([name, submodules, strict])
+
+    def _up_to_date(self, entry):
+        return (
+            all(self.env.get(k) == v for k, v in entry['env'].items()) and
+            all(file_mtime(path) == mtime for path, mtime in entry['dirs'])
+        )
+
+    def get(self, name, submodules, strict):
+        for key in (self._key(name, submodules, strict),
+                    self._key(name, submodules, None)):
+            try:
+                entry = self._entries[key]
+                if self._up_to_date(entry):
+                    return entry['usage']
+            except (KeyError, TypeError, ValueError):
+                pass
+        return None
+
+    def put(self, name, submodules, strict, usage, metadata):
+        # The usage depends on the directories it points to (e.g. if a .pc
+        # file is removed), the default pkg-config search path (for packages
+        # that might be found there), and anything searched or read while
+        # computing it (e.g. include dirs or version headers).
+        dirs = (pkg_config_path(metadata.options.common.env) +
+                usage.get('pkg_config_path', []) +
+                metadata.usage_inputs(name, submodules))
+        self._entries[self._key(name, submodules, strict)] = {
+            'usage': usage,
+            'env': usage_env(self.env),
+            'dirs': [[i, file_mtime(i)] for i in dirs],
+        }
+        self._dirty = True
@@ -167,13 +167,14 @@ setup(
         'dev': ['bfg9000', 'conan', 'coverage', 'flake8 >= 3.6',
                 'flake8-quotes', 'mike >= 0.3.1', 'mkdocs-bootswatch-classic',
                 'verspec', 'shtab'],
+        'fast': ['orjson'],
         'test': ['bfg9000', 'conan', 'coverage', 'flake8 >= 3.6',
                  'flake8-quotes', 'shtab'],
     },
 
     entry_points={
         'console_scripts': [
-            'mopack=mopack.driver:main'
+            'mopack=mopack.main:main'
         ],
         'mopack.sources': [
             'apt=mopack.sources.apt:AptPackage',
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import timeit
+from textwrap import dedent
+
+from mopack.config import Config
+from mopack.metadata import Metadata
+
+# Benchmarks for mopack's internals. These aren't run as part of the test
+# suite; run them directly, e.g. `python -m test.benchmarks.freezedried`.
+
+_package_templates = [
+    dedent("""\
+      {name}:
+        source: tarball
+        url: https://example.com/{name}.tar.gz
+        build:
+          type: bfg9000
+          extra_args: --foo=bar
+        usage: pkg_config
+    """),
+    dedent("""\
+      {name}:
+        source: directory
+        path: {name}
+        build:
+          type: cmake
+          extra_args: [-DFOO=bar, -DBAZ=quux]
+        usage:
+          type: path
+          include_path: include
+          library_path: lib
+          headers: [{name}.hpp]
+          libraries: [{name}]
+          compile_flags: -D{name}
+          link_flags: -Wl,-{name}
+    """),
+    dedent("""\
+      {name}:
+        source: system
+        headers: [{name}.h, {name}/config.h]
+        libraries: [{name}]
+        submodules: ['a', 'b', 'c']
+    """),
+]
+
+
+def make_metadata(pkgdir, count):
+    # Make metadata holding `count` packages of various kinds.
+    cfgdir = tempfile.mkdtemp()
+    try:
+        cfgfile = os.path.join(cfgdir, 'mopack.yml')
+        with open(cfgfile, 'w') as f:
+            f.write('packages:\n')
+            for i in range(count):
+                template = _package_templates[i % len(_package_templates)]
+                f.write('  ' + template.format(name='pkg{}'.format(i))
+                        .replace('\n', '\n  ').rstrip(' '))
+
+        config = Config([cfgfile])
+        config.finalize()
+        metadata = Metadata(pkgdir, config.options, config.files,
+                            config.implicit_files)
+        for pkg in config.packages.values():
+            metadata.add_package(pkg)
+        return metadata
+    finally:
+        shutil.rmtree(cfgdir)
+
+
+def bench(name, fn, number):
+    total = min(timeit.repeat(fn, number=number, repeat=5))
+    print('{:<32} {:8.2f} ms'.format(name, total / number * 1000))
@@ -0,0 +1,90 @@
+import json
+import sys
+import tempfile
+from unittest import mock
+
+from . import bench, make_metadata
+
+from mopack.freezedried import auto_dehydrate, FreezeDried
+from mopack.sources import Package
+
+# Compare dehydrating and rehydrating packages with the per-class codecs
+# against the original generic implementation, which looked up how to handle
+# each field on every call.
+
+
+def generic_dehydrate(self):
+    if self._type_field is None:
+        result = {}
+    else:
+        result = {self._type_field: getattr(self, self._type_field)}
+
+    if hasattr(self, '_version'):
+        result['_version'] = self._version
+
+    for k, v in vars(self).items():
+        if self._skipped_field(k):
+            continue
+        result[k] = auto_dehydrate(v, self._rehydrate_fields.get(k))
+    return result
+
+
+@classmethod
+def generic_rehydrate(cls, config, **kwargs):
+    if cls._type_field is None:
+        this_type = cls
+    else:
+        typename = config.pop(cls._type_field)
+        this_type = cls._get_type(typename)
+
+    if '_version' in config:
+        version = config.pop('_version')
+        if version < this_type._version:
+            config = this_type.upgrade(config, version)
+
+    result = this_type.__new__(this_type)
+    for k, v in config.items():
+        if k in this_type._rehydrate_fields and v is not None:
+            v = this_type._rehydrate_fields[k].rehydrate(v, **kwargs)
+        setattr(result, k, v)
+    return result
+
+
+def generic():
+    return mock.patch.multiple(FreezeDried, dehydrate=generic_dehydrate,
+                               rehydrate=generic_rehydrate)
+
+
+def main(count=300):
+    metadata = make_metadata(tempfile.mkdtemp(), count)
+    packages = list(metadata.packages.values())
+    options = metadata.options
+
+    def dehydrate():
+        return [i.dehydrate() for i in packages]
+
+    def rehydrate(data):
+        return [Package.rehydrate(i, _options=options)
+                for i in json.loads(data)]
+
+    with generic():
+        expected = json.dumps(dehydrate())
+    actual = json.dumps(dehydrate())
+    if actual != expected:
+        raise AssertionError('codec output differs from generic output')
+    with generic():
+        generic_packages = rehydrate(expected)
+    if rehydrate(actual) != generic_packages:
+        raise AssertionError('codec rehydration differs from generic')
+
+    print('{} packages:'.format(count))
+    with generic():
+        bench('dehydrate (generic)', dehydrate, 100)
+    bench('dehydrate (codec)', dehydrate, 100)
+    with generic():
+        bench('rehydrate (generic)', lambda: rehydrate(expected), 100)
+    bench('rehydrate (codec)', lambda: rehydrate(expected), 100)
+
+
+if __name__ == '__main__':
+    main(*(int(i) for i in sys.argv[1:]))
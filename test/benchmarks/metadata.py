@@ -0,0 +1,43 @@
+import sys
+import tempfile
+from unittest import mock
+
+from . import bench, make_metadata
+
+from mopack import json_tools
+from mopack.metadata import Metadata
+
+# Compare saving and loading a large metadata file with each of the JSON
+# backends in `json_tools`. Loading includes rehydrating every package, since
+# that's what decodes the package shards.
+
+
+def backend(orjson):
+    return mock.patch('mopack.json_tools.orjson', orjson)
+
+
+def main(count=300):
+    metadata = make_metadata(tempfile.mkdtemp(), count)
+    metadata.save()
+
+    def load():
+        result = Metadata.load(metadata.pkgdir)
+        return list(result.packages.values())
+
+    with backend(None):
+        expected = load()
+    if load() != expected:
+        raise AssertionError('backends load different packages')
+
+    print('{} packages:'.format(count))
+    for name, orjson in [('json', None), ('orjson', json_tools.orjson)]:
+        if name == 'orjson' and not orjson:
+            print('orjson not installed; skipping')
+            continue
+        with backend(orjson):
+            bench('save ({})'.format(name), metadata.save, 20)
+            bench('load ({})'.format(name), load, 20)
+
+
+if __name__ == '__main__':
+    main(*(int(i) for i in sys.argv[1:]))
@@ -0,0 +1,41 @@
+import gc
+import json
+import sys
+import tempfile
+import tracemalloc
+
+from . import bench, make_metadata
+
+from mopack.sources import Package
+
+# Measure the memory used by, and time taken to rehydrate, the packages in a
+# large metadata file. Most of the objects created here are small values like
+# `Path`s and `ShellArguments`.
+
+
+def main(count=300):
+    metadata = make_metadata(tempfile.mkdtemp(), count)
+    options = metadata.options
+    data = json.dumps([i.dehydrate() for i in metadata.packages.values()])
+
+    def rehydrate():
+        return [Package.rehydrate(i, _options=options)
+                for i in json.loads(data)]
+
+    # Warm up any caches first so they aren't counted below.
+    rehydrate()
+    gc.collect()
+
+    tracemalloc.start()
+    packages = rehydrate()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print('{} packages:'.format(count))
+    print('{:<32} {:8.1f} KiB'.format('memory', size / 1024))
+    bench('rehydrate', rehydrate, 20)
+    return packages
+
+
+if __name__ == '__main__':
+    main(*(int(i) for i in sys.argv[1:]))
@@ -1,5 +1,6 @@
 import json
 import os
+import shutil
 import subprocess
 import tempfile
 import unittest
@@ -11,6 +12,14 @@ from mopack.iterutils import iterate, listify
 from mopack.platforms import platform_name
 from mopack.types import dependency_string
 
+# Resolving writes a lockfile next to the configuration files, so run against
+# a staged copy of the test data to keep the source tree clean.
+_staged_data_dir = os.path.join(test_stage_dir, 'data')
+if os.path.exists(_staged_data_dir):
+    shutil.rmtree(_staged_data_dir)
+shutil.copytree(test_data_dir, _staged_data_dir, symlinks=True)
+test_data_dir = _staged_data_dir
+
 
 # Also supported: 'apt', 'mingw-cross'
 test_features = {'boost', 'qt'}
@@ -47,6 +56,18 @@ def slurp(filename):
         return f.read()
 
 
+def read_metadata(pkgdir='mopack'):
+    # Read the saved metadata, filling in the shards referred to by the index.
+    def shard(name):
+        return json.loads(slurp(os.path.join(pkgdir, 'metadata', name)))
+
+    output = json.loads(slurp(os.path.join(pkgdir, 'mopack.json')))
+    data = output['metadata']
+    data['options'] = shard(data['options'])
+    data['packages'] = [shard(i['shard']) for i in data['packages']]
+    return output
+
+
 def cfg_common_options(*, strict=False, target_platform=platform_name(),
                        env=AlwaysEqual(), deploy_paths={}):
     return {'_version': 1, 'strict': strict,
@@ -54,6 +75,10 @@ def cfg_common_options(*, strict=False, target_platform=platform_name(),
             'deploy_paths': deploy_paths}
 
 
+def cfg_apt_options(update_max_age=None):
+    return {'source': 'apt', '_version': 1, 'update_max_age': update_max_age}
+
+
 def cfg_bfg9000_options(toolchain=None):
     return {'type': 'bfg9000', '_version': 1, 'toolchain': toolchain}
 
@@ -146,13 +171,14 @@ def cfg_apt_pkg(name, config_file, *, remote, repository=None, usage,
 
 
 def cfg_conan_pkg(name, config_file, *, remote, build=False, options={}, usage,
-                  **kwargs):
-    result = _cfg_package('conan', 1, name, config_file, **kwargs)
+                  resolved_version=None, **kwargs):
+    result = _cfg_package('conan', 2, name, config_file, **kwargs)
     result.update({
         'remote': remote,
         'build': build,
         'options': options,
         'usage': usage,
+        'resolved_version': resolved_version,
     })
     return result
 
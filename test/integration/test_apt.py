@@ -1,4 +1,3 @@
-import json
 import os
 from unittest import skipIf
 
@@ -21,9 +20,9 @@ class TestApt(IntegrationTest):
         self.assertPathUsage('zlib', type='system', version=AlwaysEqual(),
                              libraries=['z'])
 
-        output = json.loads(slurp('mopack/mopack.json'))
+        output = read_metadata()
         self.assertEqual(output['metadata'], {
-            'options': cfg_options(),
+            'options': cfg_options(apt={}),
             'packages': [
                 cfg_apt_pkg(
                     'ogg', config,
@@ -34,7 +34,7 @@ class TestBoost(IntegrationTest):
                                         else ['boost_regex']),
                              version=version)
 
-        output = json.loads(slurp('mopack/mopack.json'))
+        output = read_metadata()
         self.assertEqual(output['metadata'], {
             'options': cfg_options(),
             'packages': [
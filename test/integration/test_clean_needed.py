@@ -1,4 +1,3 @@
-import json
 import os
 
 from . import *
@@ -22,7 +21,7 @@ class TestCleanNeeded(IntegrationTest):
         self.assertPkgConfigUsage('greeter')
         self.assertPkgConfigUsage('hello')
 
-        output = json.loads(slurp('mopack/mopack.json'))
+        output = read_metadata()
         self.assertEqual(output['metadata'], {
             'options': cfg_options(bfg9000={}),
             'packages': [
@@ -60,7 +59,7 @@ class TestCleanNeeded(IntegrationTest):
         self.assertPkgConfigUsage('greeter')
         self.assertPkgConfigUsage('hello')
 
-        output = json.loads(slurp('mopack/mopack.json'))
+        output = read_metadata()
         self.assertEqual(output['metadata'], {
             'options': cfg_options(bfg9000={}),
             'packages': [
@@ -1,4 +1,3 @@
-import json
 import os
 
 from . import *
@@ -19,7 +18,7 @@ class TestConan(IntegrationTest):
             self.stage, 'mopack', 'conan'
         )])
 
-        output = json.loads(slurp('mopack/mopack.json'))
+        output = read_metadata()
         self.assertEqual(output['metadata'], {
             'options': cfg_options(
                 conan={'build': ['missing'], 'extra_args': ['-gtxt']}
@@ -28,6 +27,7 @@ class TestConan(IntegrationTest):
                 cfg_conan_pkg(
                     'zlib', config,
                     remote='zlib/1.2.12',
+                    resolved_version='1.2.12',
                     options={'shared': True},
                     usage=cfg_pkg_config_usage(
                         pcname='zlib',
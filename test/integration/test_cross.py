@@ -1,4 +1,3 @@
-import json
 import os
 from unittest import skipIf
 
@@ -30,7 +29,7 @@ class TestCross(IntegrationTest):
         self.assertPkgConfigUsage('greeter')
         self.assertPkgConfigUsage('hello')
 
-        output = json.loads(slurp('mopack/mopack.json'))
+        output = read_metadata()
         self.assertEqual(output['metadata'], {
             'options': cfg_options(bfg9000={'toolchain': toolchain}),
             'packages': [
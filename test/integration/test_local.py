@@ -26,7 +26,7 @@ class TestLocal(IntegrationTest):
         self.assertEqual(output, [os.path.join(config, 'mopack.yml'),
                                   os.path.join(config, 'mopack-local.yml')])
 
-        output = json.loads(slurp('mopack/mopack.json'))
+        output = read_metadata()
         self.assertEqual(output['metadata'], {
             'options': cfg_options(
                 conan={'build': ['missing']}
@@ -35,6 +35,7 @@ class TestLocal(IntegrationTest):
                 cfg_conan_pkg(
                     'zlib', os.path.join(config, 'mopack-local.yml'),
                     remote='zlib/1.2.12',
+                    resolved_version='1.2.12',
                     options={'shared': True},
                     usage=cfg_pkg_config_usage(
                         pcname='zlib',
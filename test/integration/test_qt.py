@@ -27,7 +27,7 @@ class TestQt(IntegrationTest):
 
         self.assertUsage('Qt5', returncode=1)
 
-        output = json.loads(slurp('mopack/mopack.json'))
+        output = read_metadata()
         self.assertEqual(output['metadata'], {
             'options': cfg_options(),
             'packages': [
@@ -33,7 +33,7 @@ class TestDirectory(SDistTest):
         implicit_cfg = os.path.join(test_data_dir, 'hello-bfg', 'mopack.yml')
         self.check_list_files([config], [implicit_cfg])
 
-        output = json.loads(slurp('mopack/mopack.json'))
+        output = read_metadata()
         self.assertEqual(output['metadata'], {
             'options': cfg_options(bfg9000={}),
             'packages': [
@@ -61,7 +61,7 @@ class TestDirectory(SDistTest):
         implicit_cfg = os.path.join(test_data_dir, 'hello-bfg', 'mopack.yml')
         self.check_list_files([config], [implicit_cfg])
 
-        output = json.loads(slurp('mopack/mopack.json'))
+        output = read_metadata()
         self.assertEqual(output['metadata'], {
             'options': cfg_options(bfg9000={}),
             'packages': [
@@ -91,7 +91,7 @@ class TestTarball(SDistTest):
         self.assertPkgConfigUsage('hello')
         self.check_list_files([config])
 
-        output = json.loads(slurp('mopack/mopack.json'))
+        output = read_metadata()
         self.assertEqual(output['metadata'], {
             'options': cfg_options(
                 common={'deploy_paths': {'prefix': self.prefix}},
@@ -132,7 +132,7 @@ class TestTarballPatch(SDistTest):
         self.assertPkgConfigUsage('hello')
         self.check_list_files([config])
 
-        output = json.loads(slurp('mopack/mopack.json'))
+        output = read_metadata()
         self.assertEqual(output['metadata'], {
             'options': cfg_options(
                 common={'deploy_paths': {'prefix': self.prefix}},
@@ -175,7 +175,7 @@ class TestGit(SDistTest):
         self.assertPkgConfigUsage('bencodehpp')
         self.check_list_files([config])
 
-        output = json.loads(slurp('mopack/mopack.json'))
+        output = read_metadata()
         self.assertEqual(output['metadata'], {
             'options': cfg_options(
                 common={'deploy_paths': {'prefix': self.prefix}},
@@ -1,4 +1,3 @@
-import json
 import os
 
 from mopack.path import pushd
@@ -28,7 +27,7 @@ class TestInnerCMake(IntegrationTest):
         self.assertPathUsage('hello', include_path=include_path,
                              library_path=library_path, version='1.0')
 
-        output = json.loads(slurp('mopack/mopack.json'))
+        output = read_metadata()
         self.assertEqual(output['metadata'], {
             'options': cfg_options(
                 common={'deploy_paths': {'prefix': self.prefix}},
@@ -88,7 +87,7 @@ class TestOuterCMake(IntegrationTest):
 
         self.assertPkgConfigUsage('hello')
 
-        output = json.loads(slurp('mopack/mopack.json'))
+        output = read_metadata()
         self.assertEqual(output['metadata'], {
             'options': cfg_options(
                 common={'deploy_paths': {'prefix': self.prefix}},
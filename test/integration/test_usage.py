@@ -70,6 +70,54 @@ class TestUsage(IntegrationTest):
         self.assertUsage('fake', extra_args=['--strict'] + wrongdir_args,
                          returncode=1)
 
+    def test_resolve_batch(self):
+        test_lib_dir = os.path.join(test_data_dir, 'libdir')
+        usage_env = {'MOPACK_LIB_NAMES': 'lib{}.so',
+                     'MOPACK_LIB_PATH': test_lib_dir}
+
+        config = os.path.join(test_data_dir, 'mopack-tarball.yml')
+        self.assertPopen(['mopack', '--debug', 'resolve', config])
+
+        expected_output = {
+            'hello': {
+                'name': 'hello',
+                'type': 'pkg_config',
+                'pcnames': ['hello'],
+                'pkg_config_path': [os.path.join(
+                    self.stage, 'mopack', 'build', 'hello', 'pkgconfig'
+                )],
+            },
+            'fake': {
+                'name': 'fake', 'type': 'system', 'generated': True,
+                'auto_link': False, 'pcnames': ['fake'],
+                'pkg_config_path': [os.path.join(self.stage, 'mopack',
+                                                 'pkgconfig')],
+            },
+        }
+
+        output = self.assertPopen(['mopack', 'usage', '--json', 'hello',
+                                   'fake'], extra_env=usage_env)
+        self.assertEqual(json.loads(output), expected_output)
+
+        output = self.assertPopen(['mopack', 'usage', 'hello', 'fake'],
+                                  extra_env=usage_env)
+        self.assertEqual(yaml.safe_load(output), expected_output)
+
+        output = self.assertPopen(['mopack', 'usage', '--ndjson', 'hello',
+                                   'fake'], extra_env=usage_env)
+        self.assertEqual([json.loads(i) for i in output.splitlines()], [
+            {'hello': expected_output['hello']},
+            {'fake': expected_output['fake']},
+        ])
+
+        output = self.assertPopen(['mopack', 'usage', '--json', '--strict',
+                                   'hello', 'fake'],
+                                  extra_env=usage_env, returncode=1)
+        self.assertEqual(json.loads(output), {
+            'hello': expected_output['hello'],
+            'fake': {'error': '"no definition for package \'fake\'"'},
+        })
+
     def test_resolve_strict(self):
         config = os.path.join(test_data_dir, 'mopack-tarball.yml')
         self.assertPopen(['mopack', 'resolve', '--strict', config])
@@ -0,0 +1 @@
+#define VERSION "1.10"
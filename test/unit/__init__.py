@@ -74,6 +74,9 @@ class MockPackage:
     def guessed_version(self, pkgdir):
         return self._version
 
+    def dehydrate(self):
+        return {'name': self.name, 'version': self._version}
+
 
 def through_json(data, *args, **kwargs):
     return json.loads(json.dumps(data, *args, **kwargs))
@@ -90,7 +93,7 @@ class OptionsTest(TestCase):
         options = Options(deploy_paths)
         if common_options:
             options.common.accumulate(common_options)
-        with mock.patch.object(os, 'environ', return_value={}):
+        with mock.patch.object(os, 'environ', {}):
             options.common.finalize()
 
         for i in pkg_resources.iter_entry_points('mopack.sources'):
@@ -36,7 +36,7 @@ class SDistTestCase(SourceTest):
                 self.pkgdir, 'logs', 'foo.log'
             ), 'a')
 
-        with mock.patch('mopack.usage.path_system.file_outdated',
+        with mock.patch('mopack.usage.path_system.pkg_config_outdated',
                         return_value=False):
             self.assertEqual(pkg.get_usage(self.metadata, submodules), usage)
 
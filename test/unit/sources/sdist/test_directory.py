@@ -94,7 +94,7 @@ class TestDirectory(SDistTestCase):
              mock.patch('os.makedirs'), \
              mock.patch('mopack.usage.path_system.PathUsage._filter_path',
                         lambda *args: []), \
-             mock.patch('mopack.usage.path_system.file_outdated',
+             mock.patch('mopack.usage.path_system.pkg_config_outdated',
                         return_value=True), \
              mock.patch('builtins.open'):
             self.check_resolve(pkg, usage={
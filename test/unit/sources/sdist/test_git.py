@@ -7,6 +7,7 @@ from .... import *
 
 from mopack.builders.bfg9000 import Bfg9000Builder
 from mopack.config import Config
+from mopack.lockfile import Lockfile
 from mopack.sources import Package
 from mopack.sources.apt import AptPackage
 from mopack.sources.sdist import GitPackage
@@ -39,7 +40,9 @@ class TestGit(SDistTestCase):
              mock.patch('subprocess.run') as mrun:
             pkg.fetch(self.metadata, self.config)
             mrun.assert_has_calls([
-                mock.call(i, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                mock.call(i, stdout=subprocess.PIPE,
+                          stderr=(subprocess.PIPE if 'rev-parse' in i else
+                                  subprocess.STDOUT),
                           universal_newlines=True, check=True, env={})
                 for i in git_cmds
             ], any_order=True)
@@ -186,10 +189,9 @@ class TestGit(SDistTestCase):
         with mock.patch('subprocess.run', side_effect=OSError()), \
              mock.patch('mopack.usage.path_system.PathUsage._filter_path',
                         lambda *args: []), \
-             mock.patch('mopack.usage.path_system.file_outdated',
+             mock.patch('mopack.usage.path_system.pkg_config_outdated',
                         return_value=True), \
-             mock.patch('os.makedirs'), \
-             mock.patch('builtins.open'):
+             mock.patch('mopack.usage.path_system.update_pkg_config'):
             self.check_resolve(pkg, usage={
                 'name': 'foo', 'type': 'system', 'generated': True,
                 'auto_link': False, 'pcnames': ['foo'],
@@ -354,6 +356,61 @@ class TestGit(SDistTestCase):
             mrun.assert_not_called()
         self.check_resolve(pkg)
 
+    def make_lockfile(self, update=False):
+        with mock.patch('builtins.open', side_effect=FileNotFoundError()):
+            return Lockfile('/path/to/mopack.lock', update)
+
+    def check_fetch_locked(self, pkg, git_cmds, exists=True):
+        def mock_exists(p):
+            return exists and os.path.basename(p) == 'foo'
+
+        result = subprocess.CompletedProcess([], 0, stdout='abcdefg\n')
+        with mock_open_log(), \
+             mock.patch('os.path.exists', mock_exists), \
+             mock.patch('mopack.sources.sdist.pushd'), \
+             mock.patch('subprocess.run', return_value=result) as mrun:
+            pkg.fetch(self.metadata, self.config)
+            self.assertEqual(mrun.mock_calls, [
+                mock.call(i, stdout=subprocess.PIPE,
+                          stderr=(subprocess.PIPE if 'rev-parse' in i else
+                                  subprocess.STDOUT),
+                          universal_newlines=True, check=True, env={})
+                for i in git_cmds
+            ])
+
+    def test_lockfile(self):
+        srcdir = os.path.join(self.pkgdir, 'src', 'foo')
+        source = {'repository': self.srcssh, 'rev': ['branch', 'master']}
+        pkg = self.make_package('foo', repository=self.srcssh, build='bfg9000')
+        lockfile = self.metadata.lockfile = self.make_lockfile()
+
+        # Record the commit after cloning.
+        self.check_fetch_locked(pkg, [
+            ['git', 'clone', self.srcssh, srcdir, '--branch', 'master'],
+            ['git', 'rev-parse', 'HEAD'],
+        ], exists=False)
+        self.assertEqual(lockfile.get('foo', source), 'abcdefg')
+
+        # Don't pull if we're already at the locked commit.
+        self.check_fetch_locked(pkg, [['git', 'rev-parse', 'HEAD']])
+
+        # Check out the locked commit if we aren't at it.
+        lockfile.put('foo', source, 'hijklmn')
+        self.check_fetch_locked(pkg, [
+            ['git', 'rev-parse', 'HEAD'],
+            ['git', 'reset', '--hard', 'hijklmn'],
+        ])
+        self.assertEqual(lockfile.get('foo', source), 'hijklmn')
+
+        # Pull the latest commit when updating the lockfile.
+        lockfile.update = True
+        self.check_fetch_locked(pkg, [
+            ['git', 'pull'],
+            ['git', 'rev-parse', 'HEAD'],
+        ])
+        lockfile.update = False
+        self.assertEqual(lockfile.get('foo', source), 'abcdefg')
+
     def test_deploy(self):
         deploy_paths = {'prefix': '/usr/local'}
         pkg = self.make_package('foo', repository=self.srcssh, build='bfg9000',
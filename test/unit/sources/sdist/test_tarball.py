@@ -1,3 +1,4 @@
+import hashlib
 import os
 import subprocess
 from unittest import mock
@@ -7,6 +8,7 @@ from .... import *
 
 from mopack.builders.bfg9000 import Bfg9000Builder
 from mopack.config import Config
+from mopack.lockfile import Lockfile
 from mopack.path import Path
 from mopack.sources import Package
 from mopack.sources.apt import AptPackage
@@ -177,10 +179,9 @@ class TestTarball(SDistTestCase):
         with mock.patch('subprocess.run', side_effect=OSError()), \
              mock.patch('mopack.usage.path_system.PathUsage._filter_path',
                         lambda *args: []), \
-             mock.patch('mopack.usage.path_system.file_outdated',
+             mock.patch('mopack.usage.path_system.pkg_config_outdated',
                         return_value=True), \
-             mock.patch('os.makedirs'), \
-             mock.patch('builtins.open'):
+             mock.patch('mopack.usage.path_system.update_pkg_config'):
             self.check_resolve(pkg, usage={
                 'name': 'foo', 'type': 'system', 'generated': True,
                 'auto_link': False, 'pcnames': ['foo'],
@@ -306,6 +307,34 @@ class TestTarball(SDistTestCase):
             mtar.assert_not_called()
         self.check_resolve(pkg)
 
+    def make_lockfile(self, update=False):
+        with mock.patch('builtins.open', side_effect=FileNotFoundError()):
+            return Lockfile('/path/to/mopack.lock', update)
+
+    def test_lockfile(self):
+        with open(self.srcpath, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+
+        pkg = self.make_package('foo', url=self.srcurl, build='bfg9000')
+        self.metadata.lockfile = self.make_lockfile()
+        self.check_fetch(pkg)
+        self.assertEqual(self.metadata.lockfile.get('foo', self.srcurl),
+                         digest)
+
+        self.metadata.lockfile.put('foo', self.srcurl, 'badhash')
+        with mock.patch('mopack.sources.sdist.urlopen', self.mock_urlopen), \
+             mock.patch('tarfile.TarFile.extractall') as mtar, \
+             mock.patch('os.path.exists', return_value=False), \
+             self.assertRaises(ValueError):
+            pkg.fetch(self.metadata, self.config)
+        mtar.assert_not_called()
+
+        self.metadata.lockfile.update = True
+        self.check_fetch(pkg)
+        self.metadata.lockfile.update = False
+        self.assertEqual(self.metadata.lockfile.get('foo', self.srcurl),
+                         digest)
+
     def test_deploy(self):
         deploy_paths = {'prefix': '/usr/local'}
         pkg = self.make_package('foo', url=self.srcurl, build='bfg9000',
@@ -1,53 +1,229 @@
 import os
 import subprocess
-from unittest import mock
+from io import StringIO
+from textwrap import dedent
+from unittest import mock, TestCase
 
 from . import SourceTest, through_json
 from .. import mock_open_log
+from ... import test_stage_dir
 
 from mopack.iterutils import iterate
-from mopack.sources import Package
+from mopack.sources import apt, Package
 from mopack.sources.apt import AptPackage
 from mopack.sources.conan import ConanPackage
 from mopack.types import dependency_string
 
 
+dpkg_status = dedent("""\
+    Package: libfoo-dev
+    Status: install ok installed
+    Architecture: amd64
+    Version: 1.2.3
+    Description: the foo library
+     This is a longer description.
+
+    Package: foo-dev
+    Status: install ok installed
+    Architecture: amd64
+    Version: 2.3.4
+
+    Package: bar-dev
+    Status: deinstall ok config-files
+    Architecture: amd64
+    Version: 3.4.5
+""")
+
+
 def mock_run(args, **kwargs):
     if args[0] == 'dpkg-query':
-        return subprocess.CompletedProcess(args, 0, '1.2.3')
+        return subprocess.CompletedProcess(args, 0, (
+            'libfoo-dev\tamd64\tii \t1.2.3\n' +
+            'bar-dev\tamd64\trc \t3.4.5\n'
+        ))
     raise OSError()
 
 
+class TestInstalledPackages(TestCase):
+    admindir = os.path.join(test_stage_dir, 'dpkg')
+
+    def setUp(self):
+        os.makedirs(self.admindir, exist_ok=True)
+        with open(os.path.join(self.admindir, 'status'), 'w') as f:
+            f.write(dpkg_status)
+        apt._installed_cache.clear()
+
+    def test_status_file(self):
+        env = {'DPKG_ADMINDIR': self.admindir}
+        expected = {'libfoo-dev': '1.2.3', 'libfoo-dev:amd64': '1.2.3',
+                    'foo-dev': '2.3.4', 'foo-dev:amd64': '2.3.4'}
+        with mock.patch('subprocess.run') as mrun:
+            self.assertEqual(apt._installed_packages(env), expected)
+            mrun.assert_not_called()
+
+        # Make sure we only read the database once.
+        with mock.patch('builtins.open') as mopen:
+            self.assertEqual(apt._installed_packages(env), expected)
+            mopen.assert_not_called()
+
+    def test_status_file_changed(self):
+        env = {'DPKG_ADMINDIR': self.admindir}
+        self.assertEqual(apt._installed_packages(env)['foo-dev'], '2.3.4')
+
+        with open(os.path.join(self.admindir, 'status'), 'a') as f:
+            f.write('\nPackage: baz-dev\nStatus: install ok installed\n' +
+                    'Version: 4.5.6\n')
+        self.assertEqual(apt._installed_packages(env)['baz-dev'], '4.5.6')
+
+    def test_dpkg_query(self):
+        env = {'DPKG_ADMINDIR': self.admindir, 'DPKG_QUERY': 'dpkg-query'}
+        expected = {'libfoo-dev': '1.2.3', 'libfoo-dev:amd64': '1.2.3'}
+        with mock.patch('subprocess.run', side_effect=mock_run) as mrun:
+            self.assertEqual(apt._installed_packages(env), expected)
+            self.assertEqual(apt._installed_packages(env), expected)
+            mrun.assert_called_once_with(
+                ['dpkg-query', '-W', '-f${Package}\t${Architecture}\t' +
+                 '${db:Status-Abbrev}\t${Version}\n'],
+                check=True, stdout=subprocess.PIPE, universal_newlines=True,
+                env=env
+            )
+
+    def test_missing_status_file(self):
+        env = {'DPKG_ADMINDIR': os.path.join(self.admindir, 'nonexist')}
+        expected = {'libfoo-dev': '1.2.3', 'libfoo-dev:amd64': '1.2.3'}
+        with mock.patch('subprocess.run', side_effect=mock_run) as mrun:
+            self.assertEqual(apt._installed_packages(env), expected)
+            mrun.assert_called_once()
+
+
+class TestRepositories(TestCase):
+    def test_sources_list(self):
+        sources = dedent("""\
+            # A comment
+            deb http://archive.ubuntu.com/ubuntu/ focal main universe
+
+            deb [arch=amd64] https://example.com/apt stable main # comment
+            deb-src http://archive.ubuntu.com/ubuntu focal main
+        """)
+        self.assertEqual(list(apt._parse_sources_list(StringIO(sources))), [
+            ('deb', 'http://archive.ubuntu.com/ubuntu', 'focal',
+             frozenset(['main', 'universe'])),
+            ('deb', 'https://example.com/apt', 'stable', frozenset(['main'])),
+            ('deb-src', 'http://archive.ubuntu.com/ubuntu', 'focal',
+             frozenset(['main'])),
+        ])
+
+    def test_deb822_sources(self):
+        sources = dedent("""\
+            # A comment
+            Types: deb deb-src
+            URIs: http://archive.ubuntu.com/ubuntu/
+            Suites: focal focal-updates
+            Components: main
+
+            Types: deb
+            URIs: https://example.com/apt
+            Suites: stable
+            Components: main
+            Enabled: no
+        """)
+        self.assertEqual(list(apt._parse_deb822_sources(StringIO(sources))), [
+            ('deb', 'http://archive.ubuntu.com/ubuntu', 'focal',
+             frozenset(['main'])),
+            ('deb', 'http://archive.ubuntu.com/ubuntu', 'focal-updates',
+             frozenset(['main'])),
+            ('deb-src', 'http://archive.ubuntu.com/ubuntu', 'focal',
+             frozenset(['main'])),
+            ('deb-src', 'http://archive.ubuntu.com/ubuntu', 'focal-updates',
+             frozenset(['main'])),
+        ])
+
+    def test_has_repository(self):
+        configured = [
+            ('deb', 'http://archive.ubuntu.com/ubuntu', 'focal',
+             frozenset(['main', 'universe'])),
+            ('deb', 'https://ppa.launchpadcontent.net/foo/stable/ubuntu',
+             'focal', frozenset(['main'])),
+        ]
+
+        self.assertTrue(apt._has_repository(configured, 'ppa:foo/stable'))
+        self.assertFalse(apt._has_repository(configured, 'ppa:foo/unstable'))
+        self.assertFalse(apt._has_repository(configured, 'ppa:bar/stable'))
+
+        self.assertTrue(apt._has_repository(
+            configured, 'deb http://archive.ubuntu.com/ubuntu/ focal main'
+        ))
+        self.assertFalse(apt._has_repository(
+            configured, 'deb http://archive.ubuntu.com/ubuntu focal restricted'
+        ))
+        self.assertFalse(apt._has_repository(
+            configured, 'deb http://archive.ubuntu.com/ubuntu jammy main'
+        ))
+        self.assertFalse(apt._has_repository(
+            configured, 'http://archive.ubuntu.com/ubuntu'
+        ))
+
+
 class TestApt(SourceTest):
     pkg_type = AptPackage
     pkgconfdir = os.path.join(SourceTest.pkgdir, 'pkgconfig')
+    admindir = os.path.join(test_stage_dir, 'apt-dpkg')
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(self.admindir, exist_ok=True)
+        with open(os.path.join(self.admindir, 'status'), 'w') as f:
+            f.write(dpkg_status)
+        apt._installed_cache.clear()
+
+    def check_version(self, pkg, version):
+        with mock.patch('subprocess.run', side_effect=mock_run) as mrun, \
+             mock.patch('mopack.sources.apt._dpkg_admindir', self.admindir):
+            self.assertEqual(pkg.version(self.metadata), version)
+            mrun.assert_called_once_with(
+                ['pkg-config', 'foo', '--modversion'], check=True,
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                universal_newlines=True, env={}
+            )
+
+    def check_resolve_all(self, packages, remotes, *, repositories=None,
+                          update=True, installed={}, configured=[],
+                          lists_age=None):
+        if repositories is None:
+            repositories = [i.repository for i in packages if i.repository]
 
-    def check_resolve_all(self, packages, remotes):
         with mock_open_log() as mopen, \
-             mock.patch('subprocess.run') as mrun:
+             mock.patch('subprocess.run') as mrun, \
+             mock.patch('mopack.sources.apt._installed_packages',
+                        return_value=installed), \
+             mock.patch('mopack.sources.apt._configured_repositories',
+                        return_value=configured), \
+             mock.patch('mopack.sources.apt._lists_age',
+                        return_value=lists_age):
             AptPackage.resolve_all(self.metadata, packages)
 
             mopen.assert_called_with(os.path.join(
                 self.pkgdir, 'logs', 'apt.log'
             ), 'a')
 
-            for i in packages:
-                if i.repository:
-                    mrun.assert_any_call(
-                        ['sudo', 'add-apt-repository', '-y', i.repository],
-                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                        universal_newlines=True, check=True, env={}
-                    )
-            mrun.assert_any_call(
-                ['sudo', 'apt-get', 'update'], stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT, universal_newlines=True, check=True,
-                env={}
-            )
-            mrun.assert_any_call(
-                ['sudo', 'apt-get', 'install', '-y'] + remotes,
+            calls = [mock.call(
+                ['sudo', 'add-apt-repository', '-y', i],
                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
                 universal_newlines=True, check=True, env={}
-            )
+            ) for i in repositories]
+            if remotes and update:
+                calls.append(mock.call(
+                    ['sudo', 'apt-get', 'update'], stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT, universal_newlines=True,
+                    check=True, env={}
+                ))
+            if remotes:
+                calls.append(mock.call(
+                    ['sudo', 'apt-get', 'install', '-y'] + remotes,
+                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                    universal_newlines=True, check=True, env={}
+                ))
+            self.assertEqual(mrun.call_args_list, calls)
 
     def check_usage(self, pkg, *, submodules=None, usage=None):
         if usage is None:
@@ -62,12 +238,12 @@ class TestApt(SourceTest):
                      'pkg_config_path': [self.pkgconfdir]}
 
         with mock.patch('subprocess.run', mock_run), \
+             mock.patch('mopack.sources.apt._dpkg_admindir', self.admindir), \
              mock.patch('mopack.usage.path_system.PathUsage._filter_path',
                         lambda *args: []), \
-             mock.patch('mopack.usage.path_system.file_outdated',
+             mock.patch('mopack.usage.path_system.pkg_config_outdated',
                         return_value=True), \
-             mock.patch('os.makedirs'), \
-             mock.patch('builtins.open'):
+             mock.patch('mopack.usage.path_system.update_pkg_config'):
             self.assertEqual(pkg.get_usage(self.metadata, submodules), usage)
 
     def test_basic(self):
@@ -78,20 +254,7 @@ class TestApt(SourceTest):
         self.assertEqual(pkg.should_deploy, True)
         self.check_resolve_all([pkg], ['libfoo-dev'])
 
-        with mock.patch('subprocess.run', side_effect=mock_run) as mrun:
-            self.assertEqual(pkg.version(self.metadata), '1.2.3')
-            mrun.assert_has_calls([
-                mock.call(
-                    ['pkg-config', 'foo', '--modversion'], check=True,
-                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
-                    universal_newlines=True, env={}
-                ),
-                mock.call(
-                    ['dpkg-query', '-W', '-f${Version}', 'libfoo-dev'],
-                    check=True, stdout=subprocess.PIPE,
-                    universal_newlines=True, env={}
-                ),
-            ])
+        self.check_version(pkg, '1.2.3')
 
         self.check_usage(pkg)
 
@@ -101,20 +264,7 @@ class TestApt(SourceTest):
         self.assertEqual(pkg.repository, None)
         self.check_resolve_all([pkg], ['foo-dev'])
 
-        with mock.patch('subprocess.run', side_effect=mock_run) as mrun:
-            self.assertEqual(pkg.version(self.metadata), '1.2.3')
-            mrun.assert_has_calls([
-                mock.call(
-                    ['pkg-config', 'foo', '--modversion'], check=True,
-                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
-                    universal_newlines=True, env={}
-                ),
-                mock.call(
-                    ['dpkg-query', '-W', '-f${Version}', 'foo-dev'],
-                    check=True, stdout=subprocess.PIPE,
-                    universal_newlines=True, env={}
-                ),
-            ])
+        self.check_version(pkg, '2.3.4')
 
         self.check_usage(pkg)
 
@@ -123,23 +273,21 @@ class TestApt(SourceTest):
         self.assertEqual(pkg.repository, None)
         self.check_resolve_all([pkg], ['foo-dev', 'bar-dev'])
 
-        with mock.patch('subprocess.run', side_effect=mock_run) as mrun:
-            pkg.version(self.metadata)
-            mrun.assert_has_calls([
-                mock.call(
-                    ['pkg-config', 'foo', '--modversion'], check=True,
-                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
-                    universal_newlines=True, env={}
-                ),
-                mock.call(
-                    ['dpkg-query', '-W', '-f${Version}', 'foo-dev'],
-                    check=True, stdout=subprocess.PIPE,
-                    universal_newlines=True, env={}
-                ),
-            ])
+        self.check_version(pkg, '2.3.4')
 
         self.check_usage(pkg)
 
+    def test_not_installed(self):
+        pkg = self.make_package('foo', remote='bar-dev')
+        with mock.patch('subprocess.run', side_effect=mock_run), \
+             mock.patch('mopack.sources.apt._dpkg_admindir', self.admindir):
+            with self.assertRaisesRegex(ValueError,
+                                        "'bar-dev' is not installed"):
+                pkg.guessed_version(self.metadata)
+            with self.assertRaisesRegex(ValueError,
+                                        "'bar-dev' is not installed"):
+                pkg.version(self.metadata)
+
     def test_repository(self):
         pkg = self.make_package('foo', remote='foo-dev',
                                 repository='ppa:foo/stable')
@@ -148,6 +296,37 @@ class TestApt(SourceTest):
         self.check_resolve_all([pkg], ['foo-dev'])
         self.check_usage(pkg)
 
+    def test_installed(self):
+        pkg = self.make_package('foo')
+        self.check_resolve_all([pkg], [], installed={'libfoo-dev': '1.0'})
+
+        pkg = self.make_package('foo', remote=['foo-dev', 'bar-dev'])
+        self.check_resolve_all([pkg], ['bar-dev'],
+                               installed={'foo-dev': '1.0'})
+
+        pkg = self.make_package('foo', remote='foo-dev',
+                                repository='ppa:foo/stable')
+        configured = [('deb', 'http://ppa.launchpad.net/foo/stable/ubuntu',
+                       'focal', frozenset(['main']))]
+        self.check_resolve_all([pkg], [], repositories=[],
+                               installed={'foo-dev': '1.0'},
+                               configured=configured)
+        self.check_resolve_all([pkg], [], installed={'foo-dev': '1.0'})
+        self.check_resolve_all([pkg], ['foo-dev'], repositories=[],
+                               configured=configured)
+
+    def test_update_max_age(self):
+        pkg = self.make_package('foo', this_options={'update_max_age': 3600})
+        self.assertEqual(pkg._this_options.update_max_age, 3600)
+        self.check_resolve_all([pkg], ['libfoo-dev'], update=False,
+                               lists_age=60)
+        self.check_resolve_all([pkg], ['libfoo-dev'], lists_age=7200)
+        self.check_resolve_all([pkg], ['libfoo-dev'], lists_age=None)
+
+        pkg = self.make_package('foo', repository='ppa:foo/stable',
+                                this_options={'update_max_age': 3600})
+        self.check_resolve_all([pkg], ['libfoo-dev'], lists_age=60)
+
     def test_explicit_version(self):
         pkg = self.make_package('foo', usage={
             'type': 'system', 'version': '2.0',
@@ -158,20 +337,14 @@ class TestApt(SourceTest):
         self.assertEqual(pkg.should_deploy, True)
         self.check_resolve_all([pkg], ['libfoo-dev'])
 
-        with mock.patch('subprocess.run', side_effect=mock_run) as mrun:
-            self.assertEqual(pkg.version(self.metadata), '2.0')
-            mrun.assert_called_once_with(
-                ['pkg-config', 'foo', '--modversion'], check=True,
-                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
-                universal_newlines=True, env={}
-            )
+        self.check_version(pkg, '2.0')
 
         self.check_usage(pkg)
 
     def test_multiple(self):
         pkgs = [self.make_package('foo'),
-                self.make_package('bar', remote='bar-dev')]
-        self.check_resolve_all(pkgs, ['libfoo-dev', 'bar-dev'])
+                self.make_package('bar', remote='foo-dev')]
+        self.check_resolve_all(pkgs, ['libfoo-dev', 'foo-dev'])
         for pkg in pkgs:
             self.check_usage(pkg)
 
@@ -78,13 +78,10 @@ class TestConan(SourceTest):
             pkg_config
         """))
 
+        self.assertEqual(pkg.resolved_version, '1.2.3')
         with mock.patch('subprocess.run') as mrun:
-            pkg.version(self.metadata)
-            mrun.assert_called_once_with(
-                ['conan', 'inspect', '--raw=version',
-                 'foo/1.2.3@conan/stable'],
-                check=True, stdout=subprocess.PIPE, universal_newlines=True
-            )
+            self.assertEqual(pkg.version(self.metadata), '1.2.3')
+            mrun.assert_not_called()
 
         self.check_usage(pkg)
 
@@ -215,6 +212,112 @@ class TestConan(SourceTest):
         for pkg in pkgs:
             self.check_usage(pkg)
 
+    def test_up_to_date(self):
+        pkg = self.make_package('foo', remote='foo/1.2.3@conan/stable')
+        with mock_open_log(mock_open_write()) as mopen, \
+             mock.patch('subprocess.run'):
+            ConanPackage.resolve_all(self.metadata, [pkg])
+            install_hash = mopen.return_value.write.call_args[0][0]
+
+        stampfile = os.path.join(self.pkgconfdir, 'mopack-install.hash')
+        mopen.assert_called_with(stampfile, 'w')
+
+        # All outputs are present and the hash matches.
+        with mock_open_log(mock.mock_open(read_data=install_hash)), \
+             mock.patch('os.path.exists', return_value=True), \
+             mock.patch('subprocess.run') as mrun:
+            ConanPackage.resolve_all(self.metadata, [pkg])
+            mrun.assert_not_called()
+        self.assertEqual(pkg.resolved, True)
+
+        # The generated pkg-config file is missing.
+        with mock_open_log(mock.mock_open(read_data=install_hash)), \
+             mock.patch('os.path.exists', return_value=False), \
+             mock.patch('subprocess.run') as mrun:
+            ConanPackage.resolve_all(self.metadata, [pkg])
+            mrun.assert_called_once()
+
+        # The options have changed.
+        pkg = self.make_package('foo', remote='foo/1.2.3@conan/stable',
+                                options={'shared': True})
+        with mock_open_log(mock.mock_open(read_data=install_hash)), \
+             mock.patch('os.path.exists', return_value=True), \
+             mock.patch('subprocess.run') as mrun:
+            ConanPackage.resolve_all(self.metadata, [pkg])
+            mrun.assert_called_once()
+
+        # The build policy has changed.
+        pkg = self.make_package('foo', remote='foo/1.2.3@conan/stable',
+                                this_options={'build': 'foo'})
+        with mock_open_log(mock.mock_open(read_data=install_hash)), \
+             mock.patch('os.path.exists', return_value=True), \
+             mock.patch('subprocess.run') as mrun:
+            ConanPackage.resolve_all(self.metadata, [pkg])
+            mrun.assert_called_once()
+
+    def test_up_to_date_submodules(self):
+        pkg = self.make_package('foo', remote='foo/1.2.3@conan/stable',
+                                submodules={'names': '*', 'required': True})
+        with mock_open_log(mock_open_write()) as mopen, \
+             mock.patch('subprocess.run'):
+            ConanPackage.resolve_all(self.metadata, [pkg])
+            install_hash = mopen.return_value.write.call_args[0][0]
+
+        # There's no `foo.pc` when submodules are required, so only the stamp
+        # file matters.
+        def exists(path):
+            return not path.endswith('foo.pc')
+
+        with mock_open_log(mock.mock_open(read_data=install_hash)), \
+             mock.patch('os.path.exists', exists), \
+             mock.patch('subprocess.run') as mrun:
+            ConanPackage.resolve_all(self.metadata, [pkg])
+            mrun.assert_not_called()
+
+    def test_version(self):
+        pkg = self.make_package('foo', remote='foo/[>=1.0]@conan/stable')
+        self.assertEqual(pkg.resolved_version, None)
+
+        with mock.patch('subprocess.run') as mrun:
+            pkg.version(self.metadata)
+            mrun.assert_called_once_with(
+                ['conan', 'inspect', '--raw=version',
+                 'foo/[>=1.0]@conan/stable'],
+                check=True, stdout=subprocess.PIPE, universal_newlines=True,
+                env={}
+            )
+
+        pcfile = 'Name: foo\nVersion: 1.2.3\nLibs: -lfoo\n'
+        with mock_open_log(mock.mock_open(read_data=pcfile)), \
+             mock.patch('subprocess.run'):
+            ConanPackage.resolve_all(self.metadata, [pkg])
+        self.assertEqual(pkg.resolved_version, '1.2.3')
+
+        with mock.patch('subprocess.run') as mrun:
+            self.assertEqual(pkg.version(self.metadata), '1.2.3')
+            mrun.assert_not_called()
+
+        with mock_open_log(mock.mock_open(read_data='Name: foo\n')), \
+             mock.patch('subprocess.run'):
+            ConanPackage.resolve_all(self.metadata, [pkg])
+        self.assertEqual(pkg.resolved_version, None)
+
+    def test_version_pcname(self):
+        pkg = self.make_package('foo', remote='foo/[>=1.0]@conan/stable',
+                                usage={'type': 'pkg_config', 'pcname': 'bar'})
+
+        def open_file(path, *args, **kwargs):
+            if path.endswith('bar.pc'):
+                return StringIO('Name: bar\nVersion: 1.2.3\n')
+            elif path.endswith('.pc'):
+                raise FileNotFoundError(path)
+            return mock.mock_open()(path, *args, **kwargs)
+
+        with mock_open_log(open_file), \
+             mock.patch('subprocess.run'):
+            ConanPackage.resolve_all(self.metadata, [pkg])
+        self.assertEqual(pkg.resolved_version, '1.2.3')
+
     def test_submodules(self):
         submodules_required = {'names': '*', 'required': True}
         submodules_optional = {'names': '*', 'required': False}
@@ -392,6 +495,10 @@ class TestConan(SourceTest):
         ))
         self.assertNotEqual(pkg, self.make_package('foo', remote=remote))
 
+        pkg2 = self.make_package('foo', remote=remote, options=options)
+        pkg2.resolved_version = '1.2.3'
+        self.assertEqual(pkg, pkg2)
+
     def test_rehydrate(self):
         opts = self.make_options()
         pkg = ConanPackage('foo', remote='foo/1.2.3@conan/stable',
@@ -400,6 +507,11 @@ class TestConan(SourceTest):
         data = through_json(pkg.dehydrate())
         self.assertEqual(pkg, Package.rehydrate(data, _options=opts))
 
+        pkg.resolved_version = '1.2.3'
+        data = through_json(pkg.dehydrate())
+        self.assertEqual(Package.rehydrate(data, _options=opts)
+                         .resolved_version, '1.2.3')
+
     def test_upgrade(self):
         opts = self.make_options()
         data = {'source': 'conan', '_version': 0, 'name': 'foo',
@@ -409,6 +521,7 @@ class TestConan(SourceTest):
                                side_effect=ConanPackage.upgrade) as m:
             pkg = Package.rehydrate(data, _options=opts)
             self.assertIsInstance(pkg, ConanPackage)
+            self.assertEqual(pkg.resolved_version, None)
             m.assert_called_once()
 
 
@@ -72,10 +72,9 @@ class TestMakePackage(SourceTest):
         with mock.patch('subprocess.run', side_effect=OSError()), \
              mock.patch('mopack.usage.path_system.PathUsage._filter_path',
                         lambda *args: []), \
-             mock.patch('mopack.usage.path_system.file_outdated',
+             mock.patch('mopack.usage.path_system.pkg_config_outdated',
                         return_value=True), \
-             mock.patch('os.makedirs'), \
-             mock.patch('builtins.open'):
+             mock.patch('mopack.usage.path_system.update_pkg_config'):
             self.assertEqual(pkg.get_usage(self.metadata, ['sub']), {
                 'name': 'foo[sub]', 'type': 'system', 'generated': True,
                 'auto_link': False, 'pcnames': ['foo[sub]'],
@@ -95,10 +94,9 @@ class TestMakePackage(SourceTest):
         with mock.patch('subprocess.run', side_effect=OSError()), \
              mock.patch('mopack.usage.path_system.PathUsage._filter_path',
                         lambda *args: []), \
-             mock.patch('mopack.usage.path_system.file_outdated',
+             mock.patch('mopack.usage.path_system.pkg_config_outdated',
                         return_value=True), \
-             mock.patch('os.makedirs'), \
-             mock.patch('builtins.open'):
+             mock.patch('mopack.usage.path_system.update_pkg_config'):
             self.assertEqual(pkg.get_usage(self.metadata, ['sub']), {
                 'name': 'foo[sub]', 'type': 'system', 'generated': True,
                 'auto_link': False, 'pcnames': ['foo[sub]'],
@@ -121,10 +119,9 @@ class TestMakePackage(SourceTest):
         with mock.patch('subprocess.run', side_effect=OSError()), \
              mock.patch('mopack.usage.path_system.PathUsage._filter_path',
                         lambda *args: []), \
-             mock.patch('mopack.usage.path_system.file_outdated',
+             mock.patch('mopack.usage.path_system.pkg_config_outdated',
                         return_value=True), \
-             mock.patch('os.makedirs'), \
-             mock.patch('builtins.open'):
+             mock.patch('mopack.usage.path_system.update_pkg_config'):
             self.assertEqual(pkg.get_usage(self.metadata, ['sub']), {
                 'name': 'foo[sub]', 'type': 'system', 'generated': True,
                 'auto_link': False, 'pcnames': ['foo[sub]'],
@@ -133,10 +130,9 @@ class TestMakePackage(SourceTest):
         with mock.patch('subprocess.run', side_effect=OSError()), \
              mock.patch('mopack.usage.path_system.PathUsage._filter_path',
                         lambda *args: []), \
-             mock.patch('mopack.usage.path_system.file_outdated',
+             mock.patch('mopack.usage.path_system.pkg_config_outdated',
                         return_value=True), \
-             mock.patch('os.makedirs'), \
-             mock.patch('builtins.open'):
+             mock.patch('mopack.usage.path_system.update_pkg_config'):
             self.assertEqual(pkg.get_usage(self.metadata, None), {
                 'name': 'foo', 'type': 'system', 'generated': True,
                 'auto_link': False, 'pcnames': ['foo'],
@@ -28,8 +28,8 @@ class TestSystemPackage(SourceTest):
 
     def check_get_usage(self, pkg, submodules, expected=None, *,
                         find_pkg_config=False):
-        def mock_isfile(p, variables={}):
-            p = os.path.normcase(p.string(**variables))
+        def mock_isfile(index, p):
+            p = os.path.normcase(p)
             return p.startswith(os.path.normcase(abspath('/mock')) + os.sep)
 
         if expected is None:
@@ -41,7 +41,7 @@ class TestSystemPackage(SourceTest):
         self.clear_pkgdir()
         side_effect = None if find_pkg_config else OSError()
         with mock.patch('subprocess.run', side_effect=side_effect), \
-             mock.patch('mopack.usage.path_system.file_outdated',
+             mock.patch('mopack.usage.path_system.pkg_config_outdated',
                         return_value=True), \
              mock.patch('mopack.usage.path_system._system_include_path',
                         return_value=[Path('/mock/include')]), \
@@ -49,7 +49,7 @@ class TestSystemPackage(SourceTest):
                         return_value=[Path('/mock/lib')]), \
              mock.patch('mopack.usage.path_system._system_lib_names',
                         return_value=['lib{}.so']), \
-             mock.patch('mopack.usage.path_system.isfile',
+             mock.patch('mopack.path.FileIndex.isfile',
                         mock_isfile):
             self.assertEqual(pkg.get_usage(self.metadata, submodules),
                              expected)
@@ -106,6 +106,35 @@ class TestResolve(CommandsTestCase):
             mlog.assert_called_once_with('no inputs')
             msave.assert_not_called()
 
+    def test_lockfile(self):
+        cfg = self.make_empty_config(['mopack.yml'])
+        metadata = Metadata(self.pkgdir)
+
+        with mock.patch('mopack.commands.fetch',
+                        return_value=metadata) as mfetch, \
+             mock.patch('mopack.commands.Lockfile') as mlockfile, \
+             mock.patch.object(Metadata, 'save'):
+            commands.resolve(cfg, self.pkgdir, update_lock=True)
+            mlockfile.for_config.assert_called_once_with(cfg, True)
+            lockfile = mlockfile.for_config.return_value
+            mfetch.assert_called_once_with(cfg, self.pkgdir, lockfile)
+            lockfile.save.assert_called_once_with(metadata.packages)
+
+    def test_lockfile_failed(self):
+        cfg = self.make_empty_config(['mopack.yml'])
+        metadata = Metadata(self.pkgdir)
+        pkg = mock.Mock(spec=['resolve', 'clean_post', 'needs_dependencies'],
+                        needs_dependencies=False)
+        pkg.resolve.side_effect = ValueError('bad')
+        metadata.packages['foo'] = pkg
+
+        with mock.patch('mopack.commands.fetch', return_value=metadata), \
+             mock.patch('mopack.commands.Lockfile') as mlockfile, \
+             mock.patch.object(Metadata, 'save'), \
+             self.assertRaises(ValueError):
+            commands.resolve(cfg, self.pkgdir)
+        mlockfile.for_config.return_value.save.assert_not_called()
+
     def test_package(self):
         cfg = self.make_empty_config(['mopack.yml'])
 
@@ -198,3 +227,153 @@ class TestResolve(CommandsTestCase):
             mresolve.assert_called_once()
             mclean.assert_called_once()
             msave.assert_called_once()
+
+
+class TestIndexUsage(CommandsTestCase):
+    usage = {'name': 'foo', 'type': 'system', 'pcnames': ['foo'],
+             'pkg_config_path': []}
+
+    def make_metadata(self, submodules=None):
+        cfg = self.make_empty_config(['mopack.yml'])
+        metadata = Metadata(self.pkgdir)
+        metadata.add_package(AptPackage(
+            'foo', submodules=submodules, _options=cfg.options,
+            config_file=os.path.abspath('mopack.yml'),
+        ))
+        metadata.add_package(AptPackage(
+            'bar', _options=cfg.options,
+            config_file=os.path.abspath('mopack.yml'),
+        ))
+        for i in metadata.packages.values():
+            i.resolved = True
+        return metadata
+
+    def index_usage(self, metadata):
+        with mock.patch('mopack.commands.UsageCache') as mcache, \
+             mock.patch.object(AptPackage, 'get_usage',
+                               return_value=self.usage) as musage:
+            commands._index_usage(metadata)
+            mcache.return_value.save.assert_called_once_with()
+            return ([i.args[1:] for i in musage.mock_calls],
+                    [i.args for i in mcache.return_value.put.mock_calls])
+
+    def test_index(self):
+        metadata = self.make_metadata()
+        usages, puts = self.index_usage(metadata)
+        self.assertEqual(usages, [(None,), (None,)])
+        self.assertEqual(puts, [
+            ('foo', None, None, self.usage, metadata),
+            ('bar', None, None, self.usage, metadata),
+        ])
+
+    def test_submodules(self):
+        metadata = self.make_metadata(['sub1', 'sub2'])
+        usages, puts = self.index_usage(metadata)
+        self.assertEqual(usages, [(['sub1'],), (['sub2'],), (None,)])
+
+        metadata = self.make_metadata({'names': ['sub'], 'required': False})
+        usages, puts = self.index_usage(metadata)
+        self.assertEqual(usages, [(None,), (['sub'],), (None,)])
+
+        metadata = self.make_metadata('*')
+        usages, puts = self.index_usage(metadata)
+        self.assertEqual(usages, [(None,)])
+
+    def test_failure(self):
+        metadata = self.make_metadata()
+        with mock.patch('mopack.commands.UsageCache') as mcache, \
+             mock.patch.object(AptPackage, 'get_usage',
+                               side_effect=[ValueError('bad'), self.usage]):
+            commands._index_usage(metadata)
+            mcache.return_value.put.assert_called_once_with(
+                'bar', None, None, self.usage, metadata
+            )
+
+
+class TestUsage(CommandsTestCase):
+    usage = {'name': 'foo', 'type': 'system', 'pcnames': ['foo'],
+             'pkg_config_path': []}
+
+    def test_uncached(self):
+        metadata = Metadata(self.pkgdir)
+        with mock.patch('mopack.commands.UsageCache') as mcache, \
+             mock.patch.object(Metadata, 'try_load',
+                               return_value=metadata) as mload, \
+             mock.patch('mopack.sources.system.SystemPackage.get_usage',
+                        return_value=self.usage):
+            mcache.return_value.get.return_value = None
+            self.assertEqual(commands.usage(self.pkgdir, 'foo'), self.usage)
+            mload.assert_called_once_with(self.pkgdir, False)
+            mcache.return_value.put.assert_called_once_with(
+                'foo', None, False, self.usage, metadata
+            )
+
+    def test_defined(self):
+        metadata = Metadata(self.pkgdir)
+        metadata.add_package(AptPackage(
+            'foo', _options=metadata.options,
+            config_file=os.path.abspath('mopack.yml'),
+        ))
+        metadata.packages['foo'].resolved = True
+        with mock.patch('mopack.commands.UsageCache') as mcache, \
+             mock.patch.object(Metadata, 'try_load', return_value=metadata), \
+             mock.patch.object(AptPackage, 'get_usage',
+                               return_value=self.usage):
+            mcache.return_value.get.return_value = None
+            self.assertEqual(commands.usage(self.pkgdir, 'foo', strict=True),
+                             self.usage)
+            mcache.return_value.put.assert_called_once_with(
+                'foo', None, None, self.usage, metadata
+            )
+
+    def test_cached(self):
+        with mock.patch('mopack.commands.UsageCache') as mcache, \
+             mock.patch.object(Metadata, 'try_load') as mload:
+            mcache.return_value.get.return_value = self.usage
+            self.assertEqual(commands.usage(self.pkgdir, 'foo', ['sub'],
+                                            True), self.usage)
+            mcache.return_value.get.assert_called_once_with('foo', ['sub'],
+                                                            True)
+            mload.assert_not_called()
+            mcache.return_value.put.assert_not_called()
+
+    def test_batch(self):
+        metadata = Metadata(self.pkgdir)
+        error = ValueError('bad')
+        with mock.patch('mopack.commands.UsageCache') as mcache, \
+             mock.patch.object(Metadata, 'try_load',
+                               return_value=metadata) as mload, \
+             mock.patch('mopack.sources.system.SystemPackage.get_usage',
+                        side_effect=[self.usage, error]):
+            mcache.return_value.get.side_effect = [None, {'cached': True},
+                                                   None]
+            self.assertEqual(commands.usage_all(self.pkgdir, [
+                ('foo', None), ('bar', None), ('baz', ['sub']),
+            ]), [self.usage, {'cached': True}, error])
+
+            mload.assert_called_once_with(self.pkgdir, False)
+            mcache.return_value.put.assert_called_once_with(
+                'foo', None, False, self.usage, metadata
+            )
+            mcache.return_value.save.assert_called_once_with()
+
+    def test_iter_usage(self):
+        metadata = Metadata(self.pkgdir)
+        with mock.patch('mopack.commands.UsageCache') as mcache, \
+             mock.patch.object(Metadata, 'try_load',
+                               return_value=metadata) as mload, \
+             mock.patch('mopack.sources.system.SystemPackage.get_usage',
+                        return_value=self.usage):
+            mcache.return_value.get.side_effect = [{'cached': True}, None]
+            results = commands.iter_usage(self.pkgdir, [('foo', None),
+                                                        ('bar', None)])
+
+            # Each result is available before the next one is computed.
+            self.assertEqual(next(results), {'cached': True})
+            mload.assert_not_called()
+            self.assertEqual(next(results), self.usage)
+            mload.assert_called_once_with(self.pkgdir, False)
+
+            mcache.return_value.save.assert_not_called()
+            results.close()
+            mcache.return_value.save.assert_called_once_with()
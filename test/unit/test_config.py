@@ -127,6 +127,7 @@ class TestConfig(TestCase):
         cfg.finalize()
 
         opts = Options.default()
+        opts.add('sources', 'apt')
         self.assertEqual(cfg.options, opts)
 
         pkg = AptPackage('foo', _options=opts, config_file='mopack.yml')
@@ -197,6 +198,7 @@ class TestConfig(TestCase):
         opts.common.target_platform = 'linux'
         opts.common.env = {'FOO': 'foo'}
         opts.common.finalize()
+        opts.add('sources', 'apt')
         self.assertEqual(cfg.options, opts)
 
         pkg = AptPackage('foo', _options=opts, config_file='mopack.yml')
@@ -231,6 +233,7 @@ class TestConfig(TestCase):
         opts.common.target_platform = 'linux'
         opts.common.env = {'FOO': 'foo'}
         opts.common.finalize()
+        opts.add('sources', 'apt')
         self.assertEqual(cfg.options, opts)
 
         pkg1 = AptPackage('foo', _options=opts, config_file='mopack.yml')
@@ -261,6 +264,7 @@ class TestConfig(TestCase):
         cfg.finalize()
 
         opts = Options.default()
+        opts.add('sources', 'apt')
         opts.add('builders', 'bfg9000')
         opts.builders['bfg9000'].toolchain = os.path.abspath('toolchain.bfg')
         self.assertEqual(cfg.options, opts)
@@ -301,6 +305,7 @@ class TestConfig(TestCase):
         cfg.finalize()
 
         opts = Options.default()
+        opts.add('sources', 'apt')
         opts.add('builders', 'bfg9000')
         opts.builders['bfg9000'].toolchain = os.path.abspath('toolchain.bfg')
         self.assertEqual(cfg.options, opts)
@@ -334,6 +339,7 @@ class TestConfig(TestCase):
         cfg.finalize()
 
         opts = Options.default()
+        opts.add('sources', 'apt')
         opts.add('sources', 'conan')
         opts.sources['conan'].extra_args.append('foo')
         self.assertEqual(cfg.options, opts)
@@ -381,6 +387,7 @@ class TestConfig(TestCase):
         cfg.finalize()
 
         opts = Options.default()
+        opts.add('sources', 'apt')
         opts.add('sources', 'conan')
         opts.sources['conan'].extra_args.extend(['-A', '-B', '-C'])
         self.assertEqual(cfg.options, opts)
@@ -540,6 +547,7 @@ class TestChildConfig(TestCase):
         parent.finalize()
 
         opts = Options.default()
+        opts.add('sources', 'apt')
         opts.add('builders', 'bfg9000')
         self.assertEqual(parent.options, opts)
 
@@ -584,6 +592,7 @@ class TestChildConfig(TestCase):
         parent.finalize()
 
         opts = Options.default()
+        opts.add('sources', 'apt')
         opts.add('sources', 'conan')
         opts.sources['conan'].extra_args.extend(['foo', 'bar'])
         self.assertEqual(parent.options, opts)
@@ -112,3 +112,40 @@ class TestFreezeDriedFields(TestCase):
         self.assertEqual(C._skip_fields, {'s1_base', 's2_base', 'skip'})
         self.assertEqual(C._skip_compare_fields, {'sc1_base', 'sc2_base',
                                                   'skip_compare'})
+
+
+class TestFreezeDriedCodec(TestCase):
+    def test_per_class(self):
+        class Value:
+            def __init__(self, value):
+                self.value = value
+
+            def dehydrate(self):
+                return self.value
+
+            @classmethod
+            def rehydrate(cls, config, **kwargs):
+                return cls(config)
+
+        @FreezeDried.fields(skip={'skip'})
+        class Base(FreezeDried):
+            def __init__(self):
+                self.skip = 1
+                self.keep = 2
+                self.value = Value(3)
+
+        @FreezeDried.fields(rehydrate={'value': Value}, skip={'keep'})
+        class C(Base):
+            pass
+
+        self.assertEqual(Base().dehydrate(), {'keep': 2, 'value': 3})
+        self.assertEqual(C().dehydrate(), {'value': 3})
+
+        # Memoization caches should never be saved.
+        c = C()
+        c._memoize_cache_foo = {}
+        self.assertEqual(c.dehydrate(), {'value': 3})
+
+        self.assertEqual(Base.rehydrate({'value': 3}).value, 3)
+        self.assertIsInstance(C.rehydrate({'value': 3}).value, Value)
+        self.assertEqual(C.rehydrate({'value': None}).value, None)
@@ -0,0 +1,45 @@
+from unittest import mock, TestCase
+
+from mopack import json_tools
+from mopack.yaml_tools import MarkedDict, MarkedList
+
+
+class TestJsonTools(TestCase):
+    def check_backends(self, fn):
+        with self.subTest(backend='default'):
+            fn()
+        with self.subTest(backend='json'), \
+             mock.patch('mopack.json_tools.orjson', None):
+            fn()
+
+    def test_round_trip(self):
+        data = {'foo': [1, 'two', None], 'bar': {'baz': True},
+                'unicode': 'ö'}
+
+        def check():
+            self.assertEqual(json_tools.encode(data), (
+                '{"foo":[1,"two",null],"bar":{"baz":true},"unicode":"ö"}'
+            ).encode('utf-8'))
+            self.assertEqual(json_tools.decode(json_tools.encode(data)), data)
+            self.assertEqual(json_tools.decode(json_tools.dumps(data)), data)
+
+        self.check_backends(check)
+
+    def test_marked(self):
+        data = MarkedDict('mark')
+        data['foo'] = MarkedList('mark')
+        data['foo'].extend([1, 2, 3])
+
+        def check():
+            self.assertEqual(json_tools.dumps(data), '{"foo":[1,2,3]}')
+
+        self.check_backends(check)
+
+    def test_invalid(self):
+        def check():
+            with self.assertRaises(TypeError):
+                json_tools.encode(object())
+            with self.assertRaises(ValueError):
+                json_tools.decode('{bad json')
+
+        self.check_backends(check)
@@ -0,0 +1,78 @@
+import json
+import os
+import shutil
+from unittest import mock, TestCase
+
+from .. import test_stage_dir
+
+from mopack.lockfile import Lockfile, LockfileVersionError
+
+
+class TestLockfile(TestCase):
+    stage = os.path.join(test_stage_dir, 'lockfile')
+    path = os.path.join(stage, 'mopack.lock')
+    source = {'repository': 'repo.git', 'rev': ['branch', 'master']}
+
+    def setUp(self):
+        if os.path.exists(self.stage):
+            shutil.rmtree(self.stage)
+        os.makedirs(self.stage)
+
+    def make_saved_lockfile(self):
+        lockfile = Lockfile(self.path)
+        lockfile.put('foo', self.source, 'abcdefg')
+        lockfile.save(['foo'])
+        return lockfile
+
+    def test_for_config(self):
+        config = mock.Mock(files=[os.path.join(self.stage, 'mopack.yml'),
+                                  os.path.join(self.stage, 'other.yml')])
+        self.assertEqual(Lockfile.for_config(config).path, self.path)
+
+    def test_empty(self):
+        lockfile = Lockfile(self.path)
+        self.assertEqual(lockfile.get('foo', self.source), None)
+        lockfile.save([])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_get_put(self):
+        self.make_saved_lockfile()
+        lockfile = Lockfile(self.path)
+        self.assertEqual(lockfile.get('foo', self.source), 'abcdefg')
+        self.assertEqual(lockfile.get('foo', {'repository': 'other.git',
+                                              'rev': ['branch', 'master']}),
+                         None)
+        self.assertEqual(lockfile.get('bar', self.source), None)
+
+    def test_update(self):
+        self.make_saved_lockfile()
+        lockfile = Lockfile(self.path, update=True)
+        self.assertEqual(lockfile.get('foo', self.source), None)
+        lockfile.put('foo', self.source, 'hijklmn')
+        lockfile.save(['foo'])
+        self.assertEqual(Lockfile(self.path).get('foo', self.source),
+                         'hijklmn')
+
+    def test_save(self):
+        self.make_saved_lockfile()
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), {'version': 1, 'packages': {
+                'foo': {'source': self.source, 'revision': 'abcdefg'},
+            }})
+
+        # Removed packages should be dropped from the lockfile.
+        lockfile = Lockfile(self.path)
+        lockfile.put('bar', 'bar.tar.gz', '0123456')
+        lockfile.save(['bar'])
+        lockfile = Lockfile(self.path)
+        self.assertEqual(lockfile.get('foo', self.source), None)
+        self.assertEqual(lockfile.get('bar', 'bar.tar.gz'), '0123456')
+
+        Lockfile(self.path).save([])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_invalid_version(self):
+        with open(self.path, 'w') as f:
+            json.dump({'version': 2, 'packages': {}}, f)
+        with self.assertRaises(LockfileVersionError):
+            Lockfile(self.path)
@@ -2,7 +2,8 @@ import inspect
 import logging
 import warnings
 from io import StringIO
-from subprocess import CalledProcessError, CompletedProcess, SubprocessError
+from subprocess import (CalledProcessError, CompletedProcess, PIPE,
+                        SubprocessError)
 from unittest import mock, TestCase
 
 from mopack import log
@@ -167,6 +168,33 @@ class TestLogFile(TestCase):
                 output = ''.join(i[-2][0] for i in mopen().write.mock_calls)
                 self.assertEqual(output, '$ cmd --arg\nstdout\n')
 
+    def test_check_output(self):
+        comp_proc = CompletedProcess(None, 0, stdout='stdout')
+        with mock.patch('builtins.open', mock.mock_open()) as mopen, \
+             mock.patch('subprocess.run', return_value=comp_proc):
+            with log.LogFile.open('pkgdir', 'package') as logfile:
+                self.assertEqual(logfile.check_output(['cmd', '--arg'],
+                                                      env=None), 'stdout')
+                output = ''.join(i[-2][0] for i in mopen().write.mock_calls)
+                self.assertEqual(output, '$ cmd --arg\nstdout\n')
+
+    def test_check_output_stderr(self):
+        comp_proc = CompletedProcess(None, 0, stdout='stdout\n',
+                                     stderr='stderr\n')
+        with mock.patch('builtins.open', mock.mock_open()) as mopen, \
+             mock.patch('subprocess.run', return_value=comp_proc) as mrun:
+            with log.LogFile.open('pkgdir', 'package') as logfile:
+                self.assertEqual(logfile.check_output(
+                    ['cmd', '--arg'], env=None, stderr=PIPE
+                ), 'stdout\n')
+                output = ''.join(i[-2][0] for i in mopen().write.mock_calls)
+                self.assertEqual(output, '$ cmd --arg\nstdout\nstderr\n\n')
+            mrun.assert_called_once_with(
+                ['cmd', '--arg'], stdout=PIPE,
+                stderr=PIPE, universal_newlines=True, check=True,
+                env=None
+            )
+
     def test_check_call_proc_error_no_output(self):
         err = CalledProcessError(1, None, '')
         msg = "Command 'cmd --arg' returned non-zero exit status 1"
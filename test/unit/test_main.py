@@ -0,0 +1,103 @@
+import os
+import shutil
+import subprocess
+import sys
+from io import StringIO
+from unittest import mock, TestCase
+
+from .. import test_stage_dir
+
+from mopack import json_tools
+from mopack.main import fast_usage
+from mopack.metadata import Metadata
+from mopack.usage_cache import UsageCache
+
+
+class TestFastUsage(TestCase):
+    builddir = os.path.join(test_stage_dir, 'fast_usage')
+    pkgdir = os.path.join(builddir, 'mopack')
+    usage = {'name': 'foo', 'type': 'system', 'pcnames': ['foo'],
+             'pkg_config_path': []}
+    sub_usage = {'name': 'foo[sub]', 'type': 'system',
+                 'pcnames': ['foo', 'foo_sub'], 'pkg_config_path': []}
+
+    def setUp(self):
+        if os.path.exists(self.builddir):
+            shutil.rmtree(self.builddir)
+        os.makedirs(self.pkgdir)
+
+        metadata = Metadata(self.pkgdir)
+        metadata.options.common.env = {}
+        metadata.save()
+
+        cache = UsageCache(self.pkgdir, metadata.path)
+        cache.put('foo', None, None, self.usage, metadata)
+        cache.put('foo', ['sub'], None, self.sub_usage, metadata)
+        cache.save()
+
+        self.mock_env = mock.patch.dict(os.environ, {})
+        self.mock_env.start()
+        os.environ.pop('MOPACK_NESTED_INVOCATION', None)
+
+    def tearDown(self):
+        self.mock_env.stop()
+
+    def fast_usage(self, *args):
+        with mock.patch('sys.stdout', StringIO()) as out:
+            result = fast_usage(['usage', '--directory', self.builddir] +
+                                list(args))
+        return result, out.getvalue()
+
+    def test_single(self):
+        self.assertEqual(self.fast_usage('--json', 'foo'),
+                         (True, json_tools.dumps(self.usage) + '\n'))
+        self.assertEqual(self.fast_usage('--json', '--strict', 'foo[sub]'),
+                         (True, json_tools.dumps(self.sub_usage) + '\n'))
+
+    def test_batch(self):
+        self.assertEqual(self.fast_usage('--json', 'foo', 'foo[sub]'), (
+            True,
+            json_tools.dumps({'foo': self.usage,
+                              'foo[sub]': self.sub_usage}) + '\n'
+        ))
+        self.assertEqual(self.fast_usage('--ndjson', 'foo', 'foo[sub]'), (
+            True,
+            json_tools.dumps({'foo': self.usage}) + '\n' +
+            json_tools.dumps({'foo[sub]': self.sub_usage}) + '\n'
+        ))
+
+    def test_nested(self):
+        os.environ['MOPACK_NESTED_INVOCATION'] = self.builddir
+        with mock.patch('sys.stdout', StringIO()) as out:
+            self.assertEqual(fast_usage(['usage', '--json', 'foo']), True)
+        self.assertEqual(out.getvalue(), json_tools.dumps(self.usage) + '\n')
+
+    def test_uncached(self):
+        self.assertEqual(self.fast_usage('--json', 'bar'), (False, ''))
+        self.assertEqual(self.fast_usage('--json', 'foo', 'bar'), (False, ''))
+        self.assertEqual(self.fast_usage('--json', 'foo[other]'),
+                         (False, ''))
+        self.assertEqual(self.fast_usage('--json', 'foo[sub'), (False, ''))
+
+    def test_unsupported(self):
+        self.assertEqual(self.fast_usage('foo'), (False, ''))
+        self.assertEqual(self.fast_usage('--json', '--stdin', 'foo'),
+                         (False, ''))
+        self.assertEqual(self.fast_usage('--json'), (False, ''))
+        self.assertEqual(self.fast_usage('--json', '--ndjson', 'foo'),
+                         (False, ''))
+        self.assertEqual(fast_usage(['--verbose', 'usage', '--json', 'foo']),
+                         False)
+        self.assertEqual(fast_usage(['list-files']), False)
+        self.assertEqual(fast_usage([]), False)
+
+    def test_minimal_imports(self):
+        script = ('import sys, mopack.main; print(",".join(sorted(' +
+                  'sys.modules)))')
+        modules = subprocess.run(
+            [sys.executable, '-c', script], stdout=subprocess.PIPE,
+            universal_newlines=True, check=True
+        ).stdout.strip().split(',')
+        for i in ('yaml', 'pyparsing', 'pkg_resources', 'mopack.config',
+                  'mopack.sources', 'mopack.builders'):
+            self.assertNotIn(i, modules)
@@ -1,9 +1,14 @@
 import json
+import os
+import shutil
 from unittest import mock
 
-from . import OptionsTest, Stream
+from . import OptionsTest
+from .. import test_stage_dir
 
 from mopack.metadata import Metadata, MetadataVersionError
+from mopack.path import atomic_write
+from mopack.sources import Package
 from mopack.sources.apt import AptPackage
 from mopack.sources.system import SystemPackage
 
@@ -11,6 +16,11 @@ from mopack.sources.system import SystemPackage
 class TestMetadata(OptionsTest):
     pkgdir = '/path/to/builddir/mopack'
     config_file = '/path/to/mopack.yml'
+    stage = os.path.join(test_stage_dir, 'metadata')
+
+    def setUp(self):
+        if os.path.exists(self.stage):
+            shutil.rmtree(self.stage)
 
     def test_get_package(self):
         metadata = Metadata(self.pkgdir)
@@ -41,22 +51,178 @@ class TestMetadata(OptionsTest):
         with self.assertRaises(KeyError):
             metadata.get_package('foo')
 
+    def test_get_usage(self):
+        metadata = Metadata(self.pkgdir)
+        pkg = AptPackage('foo', _options=metadata.options,
+                         config_file=self.config_file)
+        pkg.resolved = True
+        metadata.add_package(pkg)
+
+        usage = {'name': 'foo', 'type': 'system'}
+        with mock.patch.object(AptPackage, 'get_usage',
+                               return_value=usage) as musage:
+            self.assertIs(metadata.get_usage('foo'), usage)
+            self.assertIs(metadata.get_usage('foo'), usage)
+            musage.assert_called_once_with(metadata, None)
+
+            self.assertIs(metadata.get_usage('foo', ['sub']), usage)
+            self.assertEqual(musage.call_count, 2)
+
+            metadata.reset_caches()
+            self.assertIs(metadata.get_usage('foo'), usage)
+            self.assertEqual(musage.call_count, 3)
+
+    def test_get_usage_cycle(self):
+        metadata = Metadata(self.pkgdir)
+        pkg = AptPackage('foo', _options=metadata.options,
+                         config_file=self.config_file)
+        pkg.resolved = True
+        metadata.add_package(pkg)
+
+        def get_usage(metadata, submodules):
+            return metadata.get_usage('foo', submodules)
+
+        with mock.patch.object(AptPackage, 'get_usage',
+                               side_effect=get_usage):
+            with self.assertRaisesRegex(ValueError, 'dependency cycle'):
+                metadata.get_usage('foo', ['sub'])
+
+        # Failures shouldn't be remembered.
+        with mock.patch.object(AptPackage, 'get_usage',
+                               return_value={'name': 'foo'}):
+            self.assertEqual(metadata.get_usage('foo', ['sub']),
+                             {'name': 'foo'})
+
+    def make_saved_metadata(self):
+        metadata = Metadata(self.stage)
+        pkg = AptPackage('foo', _options=metadata.options,
+                         config_file=self.config_file)
+        pkg.resolved = True
+        metadata.add_package(pkg)
+        metadata.save()
+        return metadata, pkg
+
+    def shards(self):
+        return set(os.listdir(os.path.join(self.stage, 'metadata')))
+
     def test_save(self):
-        out = Stream('')
-        with mock.patch('os.makedirs'), \
-             mock.patch('builtins.open', return_value=out):
-            metadata = Metadata(self.pkgdir)
-            pkg = AptPackage('foo', _options=metadata.options,
-                             config_file=self.config_file)
-            pkg.resolved = True
-            metadata.add_package(pkg)
-            metadata.save()
+        metadata, pkg = self.make_saved_metadata()
+        with open(metadata.path) as f:
+            index = json.load(f)
+        self.assertEqual(index['version'], Metadata.version)
+        self.assertEqual([i['name'] for i in index['metadata']['packages']],
+                         ['foo'])
+        self.assertEqual(self.shards(), {
+            index['metadata']['options'],
+            index['metadata']['packages'][0]['shard'],
+        })
 
         # Test round-tripping a package.
-        with mock.patch('builtins.open',
-                        mock.mock_open(read_data=out.getvalue())):
-            metadata_copy = Metadata.load(self.config_file)
+        metadata_copy = Metadata.load(self.stage)
+        self.assertEqual(metadata_copy.get_package('foo'), pkg)
+
+    def test_save_unchanged(self):
+        metadata, pkg = self.make_saved_metadata()
+        shards = self.shards()
+        with mock.patch('mopack.metadata.atomic_write',
+                        wraps=atomic_write) as mwrite:
+            metadata.save()
+            self.assertEqual(mwrite.call_count, 1)
+        self.assertEqual(self.shards(), shards)
+
+        bar = AptPackage('bar', _options=metadata.options,
+                         config_file=self.config_file)
+        metadata.add_package(bar)
+        with mock.patch('mopack.metadata.atomic_write',
+                        wraps=atomic_write) as mwrite:
+            metadata.save()
+            self.assertEqual(mwrite.call_count, 2)
+        self.assertEqual(len(self.shards()), 3)
+        self.assertTrue(shards < self.shards())
+
+        # Stale shards should be removed, but only once the index no longer
+        # refers to them, since readers may still be using the old index.
+        del metadata.packages['bar']
+        metadata.save()
+        self.assertEqual(len(self.shards()), 3)
+        metadata.save()
+        self.assertEqual(self.shards(), shards)
+
+    def test_save_old_generation(self):
+        metadata, pkg = self.make_saved_metadata()
+        metadata_copy = Metadata.load(self.stage)
+
+        pkg.resolved = False
+        metadata.save()
+        self.assertEqual(metadata_copy.get_package('foo').resolved, True)
+
+    def test_save_interrupted(self):
+        metadata, pkg = self.make_saved_metadata()
+        with open(metadata.path) as f:
+            index = f.read()
+
+        pkg.resolved = False
+        with mock.patch('os.replace', side_effect=KeyboardInterrupt), \
+             self.assertRaises(KeyboardInterrupt):
+            metadata.save()
+        with open(metadata.path) as f:
+            self.assertEqual(f.read(), index)
+        self.assertEqual(Metadata.load(self.stage).get_package('foo'), pkg)
+
+    def test_load_lazy(self):
+        metadata, pkg = self.make_saved_metadata()
+        bar = AptPackage('bar', _options=metadata.options,
+                         config_file=self.config_file)
+        metadata.add_package(bar)
+        metadata.save()
+
+        with mock.patch('mopack.metadata.Package.rehydrate',
+                        wraps=Package.rehydrate) as mrehydrate:
+            metadata_copy = Metadata.load(self.stage)
+            self.assertEqual(list(metadata_copy.packages), ['foo', 'bar'])
+            self.assertIn('bar', metadata_copy.packages)
+            self.assertEqual(len(metadata_copy.packages), 2)
+            self.assertEqual(mrehydrate.call_count, 0)
+
             self.assertEqual(metadata_copy.get_package('foo'), pkg)
+            self.assertEqual(metadata_copy.get_package('foo'), pkg)
+            self.assertEqual(mrehydrate.call_count, 1)
+
+            self.assertEqual(list(metadata_copy.packages.values()),
+                             [pkg, bar])
+            self.assertEqual(mrehydrate.call_count, 2)
+
+    def test_save_lazy(self):
+        metadata, pkg = self.make_saved_metadata()
+        shards = self.shards()
+
+        metadata_copy = Metadata.load(self.stage)
+        with mock.patch('mopack.metadata.Package.rehydrate') as mrehydrate, \
+             mock.patch('mopack.metadata.atomic_write',
+                        wraps=atomic_write) as mwrite:
+            metadata_copy.save()
+            mrehydrate.assert_not_called()
+            self.assertEqual(mwrite.call_count, 1)
+        self.assertEqual(self.shards(), shards)
+        self.assertEqual(Metadata.load(self.stage).get_package('foo'), pkg)
+
+    def test_load_version_1(self):
+        metadata = Metadata(self.stage)
+        pkg = AptPackage('foo', _options=metadata.options,
+                         config_file=self.config_file)
+        pkg.resolved = True
+        os.makedirs(self.stage)
+        with open(metadata.path, 'w') as f:
+            json.dump({
+                'version': 1,
+                'config_files': {'explicit': [], 'implicit': []},
+                'metadata': {
+                    'options': metadata.options.dehydrate(),
+                    'packages': [pkg.dehydrate()],
+                },
+            }, f)
+
+        self.assertEqual(Metadata.load(self.stage).get_package('foo'), pkg)
 
     def test_load_invalid_version(self):
         data = {
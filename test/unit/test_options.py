@@ -86,9 +86,23 @@ class TestCommonOptions(TestCase):
             {**opts.expr_symbols, 'foo': 'bar'}
         )
 
+    def test_saved_env(self):
+        opts = CommonOptions()
+        opts(env={'FOO': 'foo'})
+        with mock.patch('os.environ', {'PATH': '/bin', 'ENV': 'env'}):
+            opts.finalize()
+        data = opts.dehydrate()
+        self.assertEqual(data['env'], {'FOO': 'foo', 'PATH': '/bin'})
+
+        # Unsaved variables should come from the current environment.
+        with mock.patch('os.environ', {'PATH': '/usr/bin', 'ENV': 'new'}):
+            env = CommonOptions.rehydrate(through_json(data)).env
+        self.assertEqual(env, {'FOO': 'foo', 'PATH': '/bin', 'ENV': 'new'})
+
     def test_rehydrate(self):
         opts = CommonOptions()
         opts(target_platform='linux', env={'VAR': 'value'})
+        opts.finalize()
         data = through_json(opts.dehydrate())
         self.assertEqual(opts, CommonOptions.rehydrate(data))
 
@@ -1,3 +1,4 @@
+import copy
 import ntpath
 import os
 from unittest import mock, TestCase
@@ -54,6 +55,65 @@ class TestFileOutdated(TestCase):
             self.assertFalse(file_outdated('foo', 'bar', False))
 
 
+class TestFileIndex(TestCase):
+    def mock_scandir(self, entries):
+        def scandir(path):
+            if path not in entries:
+                raise FileNotFoundError()
+            result = []
+            for name, is_file in entries[path]:
+                entry = mock.MagicMock()
+                entry.name = name
+                entry.is_file.return_value = is_file
+                result.append(entry)
+            it = mock.MagicMock()
+            it.__enter__.return_value = iter(result)
+            return it
+
+        return mock.patch('os.scandir', side_effect=scandir)
+
+    def test_isfile(self):
+        index = FileIndex()
+        entries = {
+            os.path.normcase('/inc'): [('foo.h', True), ('bar', False)],
+            os.path.normcase('/inc/bar'): [('bar.h', True)],
+        }
+        with self.mock_scandir(entries) as mscandir:
+            self.assertTrue(index.isfile('/inc/foo.h'))
+            self.assertFalse(index.isfile('/inc/bar'))
+            self.assertFalse(index.isfile('/inc/baz.h'))
+            self.assertTrue(index.isfile('/inc/bar/bar.h'))
+            self.assertFalse(index.isfile('/lib/libfoo.so'))
+            self.assertFalse(index.isfile('/lib/libbar.so'))
+
+            self.assertEqual(mscandir.mock_calls, [
+                mock.call(os.path.normcase('/inc')),
+                mock.call(os.path.normcase('/inc/bar')),
+                mock.call(os.path.normcase('/lib')),
+            ])
+
+    def test_relative(self):
+        index = FileIndex()
+        with self.mock_scandir({os.curdir: [('foo.h', True)]}):
+            self.assertTrue(index.isfile('foo.h'))
+            self.assertFalse(index.isfile('bar.h'))
+
+    def test_record(self):
+        index = FileIndex()
+        nc = os.path.normcase
+        with self.mock_scandir({nc('/inc'): [('foo.h', True)]}):
+            self.assertTrue(index.isfile('/inc/foo.h'))
+            with index.record() as outer:
+                with index.record() as inner:
+                    self.assertTrue(index.isfile('/inc/foo.h'))
+                    self.assertFalse(index.isfile('/lib/libfoo.so'))
+                index.add_inputs(['/inc/foo.h'])
+            self.assertFalse(index.isfile('/inc/bar.h'))
+
+        self.assertEqual(inner, {nc('/inc'), nc('/lib')})
+        self.assertEqual(outer, {nc('/inc'), nc('/lib'), '/inc/foo.h'})
+
+
 class TestPath(TestCase):
     def test_construct(self):
         p = Path('foo', Path.Base.cfgdir)
@@ -181,6 +241,22 @@ class TestPath(TestCase):
              Path('foo', Path.Base.srcdir)}
         self.assertEqual(len(d), 3)
 
+    def test_interned(self):
+        p = Path('foo', Path.Base.srcdir)
+        self.assertIs(Path('./foo', 'srcdir'), p)
+        self.assertIs(Path.rehydrate(p.dehydrate()), p)
+        self.assertIs(copy.deepcopy(p), p)
+        self.assertIsNot(Path('foo', Path.Base.builddir), p)
+
+    def test_immutable(self):
+        p = Path('foo', Path.Base.srcdir)
+        with self.assertRaises(AttributeError):
+            p.path = 'bar'
+        with self.assertRaises(AttributeError):
+            del p.base
+        with self.assertRaises(AttributeError):
+            p.other = 'value'
+
     def test_string(self):
         p = Path('foo', Path.Base.srcdir)
         self.assertEqual(p.string(srcdir=('${srcdir}')),
@@ -1,11 +1,38 @@
+import os
+import shutil
+import subprocess
 from io import StringIO
-from unittest import TestCase
+from textwrap import dedent
+from unittest import mock, TestCase
+
+from .. import test_stage_dir
 
 from mopack.path import Path
-from mopack.pkg_config import write_pkg_config
+from mopack.pkg_config import (_builtin_pkg_config_path, compare_versions,
+                               parse_requires, pkg_config_exists,
+                               pkg_config_outdated, pkg_config_path,
+                               pkg_config_search_path, pkg_config_version,
+                               PkgConfigError, PkgConfigFile,
+                               PkgConfigResolver, update_pkg_config,
+                               write_pkg_config)
+from mopack.probe_cache import ProbeCache
 from mopack.shell import ShellArguments
 
 
+def write_pc(path, name, version, requires=''):
+    with open(os.path.join(path, name + '.pc'), 'w') as f:
+        f.write(dedent("""\
+            prefix=/usr
+            libdir=${{prefix}}/lib
+
+            Name: {name}
+            Description: {name} library
+            Version: {version}
+            Requires: {requires}
+            Libs: -L${{libdir}} -l{name}
+        """).format(name=name, version=version, requires=requires))
+
+
 class TestWritePkgConfig(TestCase):
     def test_default(self):
         out = StringIO()
@@ -65,9 +92,376 @@ class TestWritePkgConfig(TestCase):
             'Libs: -L[\'"]\\${builddir}[\'"] -lbar\n$'
         )
 
+    def test_inputs_hash(self):
+        out = StringIO()
+        write_pkg_config(out, 'mypackage', inputs_hash='abcd')
+        self.assertEqual(
+            out.getvalue(),
+            '# Do not edit this file! It was automatically generated by ' +
+            'mopack.\n' +
+            '# Inputs: abcd\n\n' +
+            'Name: mypackage\n' +
+            'Description: mopack-generated package\n' +
+            'Version: \n'
+        )
+
     def test_invalid(self):
         out = StringIO()
         with self.assertRaises(TypeError):
             write_pkg_config(out, 'mypackage', variables={'srcdir': 1})
         with self.assertRaises(TypeError):
             write_pkg_config(out, 'mypackage', cflags=1)
+
+
+class TestPkgConfigOutdated(TestCase):
+    path = os.path.join(test_stage_dir, 'pkg_config_outdated', 'foo.pc')
+
+    def setUp(self):
+        dirname = os.path.dirname(self.path)
+        if os.path.exists(dirname):
+            shutil.rmtree(dirname)
+        os.makedirs(dirname)
+
+    def write(self, **kwargs):
+        with open(self.path, 'w') as f:
+            write_pkg_config(f, 'foo', **kwargs)
+
+    def test_up_to_date(self):
+        self.write(inputs_hash='abcd')
+        self.assertFalse(pkg_config_outdated(self.path, 'abcd'))
+
+    def test_changed(self):
+        self.write(inputs_hash='abcd')
+        self.assertTrue(pkg_config_outdated(self.path, 'efgh'))
+
+    def test_no_hash(self):
+        self.write()
+        self.assertTrue(pkg_config_outdated(self.path, 'abcd'))
+
+    def test_nonexist(self):
+        self.assertTrue(pkg_config_outdated(self.path, 'abcd'))
+
+
+class TestUpdatePkgConfig(TestCase):
+    path = os.path.join(test_stage_dir, 'update_pkg_config', 'foo.pc')
+
+    def setUp(self):
+        dirname = os.path.dirname(self.path)
+        if os.path.exists(dirname):
+            shutil.rmtree(dirname)
+
+    def set_mtime(self):
+        os.utime(self.path, ns=(0, 0))
+
+    def read(self):
+        with open(self.path) as f:
+            return f.read()
+
+    def test_new(self):
+        self.assertTrue(update_pkg_config(self.path, 'foo', version='1.0'))
+        self.assertRegex(self.read(), 'Version: 1.0\n$')
+
+    def test_unchanged(self):
+        update_pkg_config(self.path, 'foo', version='1.0', inputs_hash='abcd')
+        self.set_mtime()
+        self.assertFalse(update_pkg_config(self.path, 'foo', version='1.0',
+                                           inputs_hash='abcd'))
+        self.assertEqual(os.stat(self.path).st_mtime_ns, 0)
+
+    def test_inputs_changed(self):
+        update_pkg_config(self.path, 'foo', version='1.0', inputs_hash='abcd')
+        self.set_mtime()
+        self.assertFalse(update_pkg_config(self.path, 'foo', version='1.0',
+                                           inputs_hash='efgh'))
+        self.assertIn('# Inputs: efgh\n', self.read())
+        self.assertEqual(os.stat(self.path).st_mtime_ns, 0)
+
+    def test_changed(self):
+        update_pkg_config(self.path, 'foo', version='1.0', inputs_hash='abcd')
+        self.set_mtime()
+        self.assertTrue(update_pkg_config(self.path, 'foo', version='2.0',
+                                          inputs_hash='efgh'))
+        self.assertRegex(self.read(), 'Version: 2.0\n$')
+        self.assertNotEqual(os.stat(self.path).st_mtime_ns, 0)
+
+
+class TestPkgConfigPath(TestCase):
+    def test_default(self):
+        with mock.patch('mopack.pkg_config.default_pkg_config_path',
+                        return_value=['/usr/lib/pkgconfig']):
+            self.assertEqual(pkg_config_path({}), ['/usr/lib/pkgconfig'])
+            self.assertEqual(
+                pkg_config_path({'PKG_CONFIG_PATH': os.pathsep.join([
+                    '/foo', '/bar'
+                ])}),
+                ['/foo', '/bar', '/usr/lib/pkgconfig']
+            )
+
+    def test_libdir(self):
+        with mock.patch('mopack.pkg_config.default_pkg_config_path',
+                        return_value=['/usr/lib/pkgconfig']):
+            self.assertEqual(pkg_config_path({'PKG_CONFIG_LIBDIR': '/lib'}),
+                             ['/lib'])
+            self.assertEqual(pkg_config_path({'PKG_CONFIG_LIBDIR': ''}), [])
+            self.assertEqual(pkg_config_path({'PKG_CONFIG_PATH': '/foo',
+                                              'PKG_CONFIG_LIBDIR': '/lib'}),
+                             ['/foo', '/lib'])
+
+
+class TestPkgConfigSearchPath(TestCase):
+    def setUp(self):
+        _builtin_pkg_config_path._reset()
+
+    def tearDown(self):
+        _builtin_pkg_config_path._reset()
+
+    def test_builtin(self):
+        stdout = os.pathsep.join(['/usr/lib/pkgconfig',
+                                  '/usr/share/pkgconfig'])
+        with mock.patch('mopack.pkg_config.default_pkg_config_path',
+                        return_value=['/usr/lib/pkgconfig']), \
+             mock.patch('subprocess.run', return_value=mock.Mock(
+                 stdout=stdout + '\n'
+             )) as mrun:
+            self.assertEqual(
+                pkg_config_search_path(['pkg-config'],
+                                       {'PKG_CONFIG_PATH': '/foo'}),
+                ['/foo', '/usr/lib/pkgconfig', '/usr/share/pkgconfig']
+            )
+            mrun.assert_called_once_with(
+                ['pkg-config', '--variable', 'pc_path', 'pkg-config'],
+                check=True, stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL, universal_newlines=True,
+                env={'PKG_CONFIG_PATH': '/foo'}
+            )
+
+    def test_cached(self):
+        pkgdir = os.path.join(test_stage_dir, 'pkg_config_search_path')
+        if os.path.exists(pkgdir):
+            shutil.rmtree(pkgdir)
+        os.makedirs(pkgdir)
+        exe = os.path.join(pkgdir, 'pkg-config')
+        open(exe, 'w').close()
+
+        def search_path():
+            _builtin_pkg_config_path._reset()
+            cache = ProbeCache(pkgdir, env={})
+            return pkg_config_search_path([exe], {}, cache)
+
+        with mock.patch('mopack.pkg_config.default_pkg_config_path',
+                        return_value=[]), \
+             mock.patch('subprocess.run', return_value=mock.Mock(
+                 stdout='/usr/lib/pkgconfig\n'
+             )) as mrun:
+            self.assertEqual(search_path(), ['/usr/lib/pkgconfig'])
+            self.assertEqual(search_path(), ['/usr/lib/pkgconfig'])
+            self.assertEqual(mrun.call_count, 1)
+
+            stat = os.stat(exe)
+            os.utime(exe, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self.assertEqual(search_path(), ['/usr/lib/pkgconfig'])
+            self.assertEqual(mrun.call_count, 2)
+
+    def test_libdir(self):
+        with mock.patch('subprocess.run') as mrun:
+            self.assertEqual(
+                pkg_config_search_path(['pkg-config'],
+                                       {'PKG_CONFIG_PATH': '/foo',
+                                        'PKG_CONFIG_LIBDIR': '/lib'}),
+                ['/foo', '/lib']
+            )
+            mrun.assert_not_called()
+
+    def test_unknown(self):
+        with mock.patch('subprocess.run', side_effect=OSError()):
+            self.assertEqual(pkg_config_search_path(['pkg-config'], {}), None)
+
+
+class TestCompareVersions(TestCase):
+    def test_equal(self):
+        self.assertEqual(compare_versions('1.2.3', '1.2.3'), 0)
+        self.assertEqual(compare_versions('1.2.3', '1-2-3'), 0)
+        self.assertEqual(compare_versions('1.02', '1.2'), 0)
+
+    def test_numeric(self):
+        self.assertEqual(compare_versions('1.2.3', '1.2.4'), -1)
+        self.assertEqual(compare_versions('1.10', '1.9'), 1)
+        self.assertEqual(compare_versions('1.2', '1.2.1'), -1)
+        self.assertEqual(compare_versions('2', '1.9.9'), 1)
+
+    def test_alpha(self):
+        self.assertEqual(compare_versions('1.2a', '1.2b'), -1)
+        self.assertEqual(compare_versions('1.2.1', '1.2.a'), 1)
+        self.assertEqual(compare_versions('1.2.a', '1.2.1'), -1)
+
+
+class TestParseRequires(TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_requires(''), [])
+        self.assertEqual(parse_requires('foo bar'), [
+            ('foo', None, None), ('bar', None, None),
+        ])
+        self.assertEqual(parse_requires('foo >= 1.0, bar,baz<2 quux != 3'), [
+            ('foo', '>=', '1.0'), ('bar', None, None), ('baz', '<', '2'),
+            ('quux', '!=', '3'),
+        ])
+
+
+class TestPkgConfigFile(TestCase):
+    def parse(self, data, name='foo', path='/path/to/foo.pc'):
+        return PkgConfigFile.parse(name, path, StringIO(dedent(data)))
+
+    def test_basic(self):
+        pc = self.parse("""\
+            # A comment
+            prefix=/usr
+            includedir=${prefix}/include
+
+            Name: foo
+            Version: 1.0 # trailing comment
+            Cflags: -I${includedir} -DCOST=$$5
+            Libs: -L${pcfiledir}/lib \\
+              -lfoo
+        """)
+        self.assertEqual(pc.version, '1.0')
+        self.assertEqual(pc.variables, {
+            'pcfiledir': '/path/to', 'prefix': '/usr',
+            'includedir': '/usr/include',
+        })
+        self.assertEqual(pc.fields, {
+            'Name': 'foo', 'Version': '1.0',
+            'Cflags': '-I/usr/include -DCOST=$5',
+            'Libs': '-L/path/to/lib   -lfoo',
+        })
+        self.assertEqual(pc.requires, [])
+
+    def test_requires(self):
+        pc = self.parse("""\
+            Version: 1.0
+            Requires: bar >= 1.0, baz
+            Requires.private: quux
+        """)
+        self.assertEqual(pc.requires, [
+            ('bar', '>=', '1.0'), ('baz', None, None), ('quux', None, None),
+        ])
+
+    def test_invalid(self):
+        with self.assertRaises(PkgConfigError):
+            self.parse('Name: foo\n')
+        with self.assertRaises(PkgConfigError):
+            self.parse('Version: ${undefined}\n')
+        with self.assertRaises(PkgConfigError):
+            self.parse('Version: 1.0\ngarbage\n')
+
+
+class TestPkgConfigResolver(TestCase):
+    pkgconfdir = os.path.join(test_stage_dir, 'pkg_config_resolver')
+
+    def setUp(self):
+        if os.path.exists(self.pkgconfdir):
+            shutil.rmtree(self.pkgconfdir)
+        os.makedirs(self.pkgconfdir)
+
+        write_pc(self.pkgconfdir, 'foo', '1.2', 'bar >= 2.0')
+        write_pc(self.pkgconfdir, 'bar', '2.1')
+        write_pc(self.pkgconfdir, 'baz', '1.0', 'bar < 2.0')
+        write_pc(self.pkgconfdir, 'quux', '1.0', 'missing')
+
+    def test_from_env(self):
+        with mock.patch('mopack.pkg_config.default_pkg_config_path',
+                        return_value=[]):
+            resolver = PkgConfigResolver.from_env({
+                'PKG_CONFIG_PATH': self.pkgconfdir
+            })
+        self.assertEqual(resolver.search_path, [self.pkgconfdir])
+        self.assertEqual(resolver.uninstalled, True)
+
+        with mock.patch('mopack.pkg_config.default_pkg_config_path',
+                        return_value=[]):
+            resolver = PkgConfigResolver.from_env({
+                'PKG_CONFIG_DISABLE_UNINSTALLED': '1'
+            })
+        self.assertEqual(resolver.search_path, [])
+        self.assertEqual(resolver.uninstalled, False)
+
+    def test_find(self):
+        resolver = PkgConfigResolver(['/nonexist', self.pkgconfdir])
+        self.assertEqual(resolver.find('foo'),
+                         os.path.join(self.pkgconfdir, 'foo.pc'))
+        self.assertEqual(resolver.find('missing'), None)
+
+        write_pc(self.pkgconfdir, 'foo-uninstalled', '1.3')
+        resolver = PkgConfigResolver([self.pkgconfdir])
+        self.assertEqual(resolver.find('foo'), os.path.join(
+            self.pkgconfdir, 'foo-uninstalled.pc'
+        ))
+
+        resolver = PkgConfigResolver([self.pkgconfdir], uninstalled=False)
+        self.assertEqual(resolver.find('foo'),
+                         os.path.join(self.pkgconfdir, 'foo.pc'))
+
+    def test_exists(self):
+        resolver = PkgConfigResolver([self.pkgconfdir])
+        self.assertEqual(resolver.exists('foo'), True)
+        self.assertEqual(resolver.exists(['foo', 'bar']), True)
+        self.assertEqual(resolver.exists('baz'), False)
+        self.assertEqual(resolver.exists('quux'), False)
+        self.assertEqual(resolver.exists('missing'), False)
+        self.assertEqual(resolver.exists(['foo', 'missing']), False)
+
+    def test_modversion(self):
+        resolver = PkgConfigResolver([self.pkgconfdir])
+        self.assertEqual(resolver.modversion('foo'), '1.2')
+        self.assertEqual(resolver.modversion('bar'), '2.1')
+        with self.assertRaises(PkgConfigError):
+            resolver.modversion('baz')
+        with self.assertRaises(PkgConfigError):
+            resolver.modversion('missing')
+
+    def test_pkg_config_exists(self):
+        env = {'PKG_CONFIG_LIBDIR': self.pkgconfdir}
+        with mock.patch('subprocess.run') as mrun:
+            self.assertEqual(pkg_config_exists(['pkg-config'], 'foo',
+                                               env=env), True)
+            mrun.assert_not_called()
+
+        with mock.patch('subprocess.run') as mrun:
+            self.assertEqual(pkg_config_exists(['pkg-config'], 'missing',
+                                               env=env), True)
+            mrun.assert_called_once_with(
+                ['pkg-config', 'missing'], check=True,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env
+            )
+
+        with mock.patch('subprocess.run', side_effect=OSError()):
+            self.assertEqual(pkg_config_exists(['pkg-config'], 'missing',
+                                               env=env), False)
+
+        with mock.patch('subprocess.run') as mrun:
+            self.assertEqual(pkg_config_exists(['cross-pkg-config'], 'foo',
+                                               env=env), True)
+            mrun.assert_called_once_with(
+                ['cross-pkg-config', 'foo'], check=True,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env
+            )
+
+    def test_pkg_config_version(self):
+        env = {'PKG_CONFIG_LIBDIR': self.pkgconfdir}
+        with mock.patch('subprocess.run') as mrun:
+            self.assertEqual(pkg_config_version(['pkg-config'], 'foo',
+                                                env=env), '1.2')
+            mrun.assert_not_called()
+
+        with mock.patch('subprocess.run') as mrun:
+            pkg_config_version(['pkg-config'], 'missing', env=env)
+            mrun.assert_called_once_with(
+                ['pkg-config', 'missing', '--modversion'], check=True,
+                stdout=subprocess.PIPE, universal_newlines=True, env=env
+            )
+
+        with mock.patch('subprocess.run') as mrun:
+            pkg_config_version(['pkgconf', '--static'], 'foo', env=env)
+            mrun.assert_called_once_with(
+                ['pkgconf', '--static', 'foo', '--modversion'], check=True,
+                stdout=subprocess.PIPE, universal_newlines=True, env=env
+            )
@@ -0,0 +1,88 @@
+import os
+import shutil
+from unittest import mock, TestCase
+
+from .. import test_stage_dir
+
+from mopack.probe_cache import ProbeCache
+
+
+class TestProbeCache(TestCase):
+    pkgdir = os.path.join(test_stage_dir, 'probe_cache')
+    searchdir = os.path.join(pkgdir, 'search')
+
+    def setUp(self):
+        if os.path.exists(self.pkgdir):
+            shutil.rmtree(self.pkgdir)
+        os.makedirs(self.searchdir)
+
+    def make_cache(self, env={}):
+        return ProbeCache(self.pkgdir, env=env, env_vars=['VAR'],
+                          dirs=[self.searchdir])
+
+    def test_probe(self):
+        fn = mock.MagicMock(return_value=True)
+        cache = self.make_cache()
+        self.assertEqual(cache.probe('kind', ['foo'], fn), True)
+        self.assertEqual(cache.probe('kind', ['foo'], fn), True)
+        fn.assert_called_once_with()
+
+        fn = mock.MagicMock(return_value=False)
+        self.assertEqual(cache.probe('kind', ['bar'], fn), False)
+        self.assertEqual(cache.probe('other', ['foo'], fn), False)
+        self.assertEqual(fn.call_count, 2)
+
+    def test_persist(self):
+        self.make_cache().probe('kind', ['foo'], lambda: True)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.pkgdir, 'probe-cache.json')
+        ))
+
+        fn = mock.MagicMock(return_value=False)
+        self.assertEqual(self.make_cache().probe('kind', ['foo'], fn), True)
+        fn.assert_not_called()
+
+    def test_entry_stamp(self):
+        fn = mock.MagicMock(return_value=True)
+        cache = self.make_cache()
+        self.assertEqual(cache.probe('kind', ['foo'], fn, stamp=[1]), True)
+        self.assertEqual(cache.probe('kind', ['foo'], fn, stamp=[1]), True)
+        fn.assert_called_once_with()
+
+        # Changing an entry's stamp should replace the entry, not add to it.
+        fn = mock.MagicMock(return_value=False)
+        cache = self.make_cache()
+        self.assertEqual(cache.probe('kind', ['foo'], fn, stamp=[2]), False)
+        self.assertEqual(cache.probe('kind', ['foo'], fn, stamp=[2]), False)
+        fn.assert_called_once_with()
+        self.assertEqual(len(cache._entries), 1)
+
+    def test_env_changed(self):
+        self.make_cache().probe('kind', ['foo'], lambda: True)
+
+        fn = mock.MagicMock(return_value=False)
+        cache = self.make_cache({'VAR': 'value'})
+        self.assertEqual(cache.probe('kind', ['foo'], fn), False)
+        fn.assert_called_once_with()
+
+    def test_dir_changed(self):
+        self.make_cache().probe('kind', ['foo'], lambda: True)
+
+        stat = os.stat(self.searchdir)
+        os.utime(self.searchdir, ns=(stat.st_atime_ns,
+                                     stat.st_mtime_ns + 1000000000))
+        fn = mock.MagicMock(return_value=False)
+        self.assertEqual(self.make_cache().probe('kind', ['foo'], fn), False)
+        fn.assert_called_once_with()
+
+    def test_corrupt(self):
+        with open(os.path.join(self.pkgdir, 'probe-cache.json'), 'w') as f:
+            f.write('{bad json')
+
+        fn = mock.MagicMock(return_value=True)
+        self.assertEqual(self.make_cache().probe('kind', ['foo'], fn), True)
+        fn.assert_called_once_with()
+
+    def test_no_pkgdir(self):
+        cache = ProbeCache(os.path.join(self.pkgdir, 'nonexist'), env={})
+        self.assertEqual(cache.probe('kind', ['foo'], lambda: True), True)
@@ -0,0 +1,139 @@
+import os
+import shutil
+import threading
+from unittest import mock, TestCase
+
+from .. import test_stage_dir
+
+from mopack import server
+from mopack.metadata import Metadata
+from mopack.sources.system import SystemPackage
+
+
+class TestServer(TestCase):
+    pkgdir = os.path.join(test_stage_dir, 'server')
+    usage = {'name': 'foo', 'type': 'system', 'pcnames': ['foo'],
+             'pkg_config_path': []}
+
+    def setUp(self):
+        if os.path.exists(self.pkgdir):
+            shutil.rmtree(self.pkgdir)
+        os.makedirs(self.pkgdir)
+        self.save_metadata(['mopack.yml'])
+
+        self.server = server.Server(self.pkgdir)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.01})
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+
+    def save_metadata(self, files):
+        metadata = Metadata(self.pkgdir, files=files)
+        metadata.save()
+
+        # Make sure the server sees that the metadata has changed, even if the
+        # filesystem's timestamps are coarse.
+        path = metadata.path
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns +
+                           1000000000 * len(files)))
+
+    def connect(self):
+        client = server.connect(self.pkgdir)
+        self.assertIsInstance(client, server.Client)
+        return client
+
+    def test_list_files(self):
+        with self.connect() as client:
+            self.assertEqual(client.list_files(), ['mopack.yml'])
+            self.assertEqual(client.list_files(True), ['mopack.yml'])
+
+    def test_reload(self):
+        with self.connect() as client:
+            self.assertEqual(client.list_files(), ['mopack.yml'])
+            self.save_metadata(['mopack.yml', 'mopack-2.yml'])
+            self.assertEqual(client.list_files(),
+                             ['mopack.yml', 'mopack-2.yml'])
+
+    def test_list_packages(self):
+        with self.connect() as client:
+            self.assertEqual(client.list_packages(), [])
+
+        os.remove(os.path.join(self.pkgdir, 'mopack.json'))
+        with self.connect() as client:
+            with self.assertRaises(server.ServerError):
+                client.list_packages()
+
+    def test_usage(self):
+        with mock.patch.object(SystemPackage, 'get_usage',
+                               return_value=self.usage), \
+             self.connect() as client:
+            self.assertEqual(client.usage('foo'), self.usage)
+            with self.assertRaises(server.ServerError):
+                client.usage('foo', strict=True)
+
+    def test_usage_all(self):
+        with mock.patch.object(SystemPackage, 'get_usage',
+                               side_effect=[self.usage, ValueError('bad')]), \
+             self.connect() as client:
+            result = client.usage_all([('foo', None), ('bar', None)])
+            self.assertEqual(result[0], self.usage)
+            self.assertIsInstance(result[1], server.ServerError)
+            self.assertEqual(str(result[1]), 'bad')
+
+    def test_concurrent_clients(self):
+        with self.connect() as client1, self.connect() as client2:
+            client2._sock.settimeout(5)
+            self.assertEqual(client1.list_files(), ['mopack.yml'])
+            self.assertEqual(client2.list_files(), ['mopack.yml'])
+
+    def test_usage_env_mismatch(self):
+        with mock.patch.object(SystemPackage, 'get_usage',
+                               return_value=self.usage) as mget, \
+             mock.patch('mopack.server.usage_env',
+                        side_effect=[{'MOPACK_INCLUDE_PATH': 'a'},
+                                     {'MOPACK_INCLUDE_PATH': 'b'}]), \
+             mock.patch('mopack.commands.usage_all',
+                        return_value=['local']) as musage, \
+             self.connect() as client:
+            self.assertEqual(client.usage_all([('foo', None)]), ['local'])
+            musage.assert_called_once_with(self.pkgdir, [('foo', None)],
+                                           False)
+            mget.assert_not_called()
+
+    def test_running(self):
+        self.assertTrue(self.server.running())
+        os.remove(server.socket_path(self.pkgdir))
+        self.assertFalse(self.server.running())
+
+
+class TestConnect(TestCase):
+    pkgdir = os.path.join(test_stage_dir, 'server_connect')
+
+    def setUp(self):
+        if os.path.exists(self.pkgdir):
+            shutil.rmtree(self.pkgdir)
+        os.makedirs(self.pkgdir)
+
+    def test_no_server(self):
+        self.assertIs(server.connect(self.pkgdir), None)
+
+    def test_stale_socket(self):
+        with open(server.socket_path(self.pkgdir), 'w'):
+            pass
+        self.assertIs(server.connect(self.pkgdir), None)
+
+    def test_path_too_long(self):
+        pkgdir = os.path.join(self.pkgdir, 'x' * 120)
+        os.makedirs(pkgdir)
+        with open(server.socket_path(pkgdir), 'w'):
+            pass
+        self.assertIs(server.connect(pkgdir), None)
+
+        os.remove(server.socket_path(pkgdir))
+        with self.assertRaisesRegex(RuntimeError, 'unable to listen'):
+            server.serve(pkgdir)
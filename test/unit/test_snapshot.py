@@ -0,0 +1,113 @@
+import os
+import shutil
+import tarfile
+from unittest import mock
+
+from . import OptionsTest
+from .. import test_stage_dir
+
+from mopack.metadata import Metadata
+from mopack.path import Path
+from mopack.snapshot import (export_snapshot, import_snapshot,
+                             manifest_filename, SnapshotError)
+from mopack.sources.system import SystemPackage
+
+
+class TestSnapshot(OptionsTest):
+    stage = os.path.join(test_stage_dir, 'snapshot')
+    snapshot = os.path.join(stage, 'snapshot.tar.gz')
+
+    def setUp(self):
+        if os.path.exists(self.stage):
+            shutil.rmtree(self.stage)
+        os.makedirs(self.stage)
+
+    def workspace(self, name):
+        root = os.path.join(self.stage, name)
+        return root, os.path.join(root, 'build', 'mopack')
+
+    def make_resolved(self):
+        root, pkgdir = self.workspace('old')
+        config_file = os.path.join(root, 'mopack.yml')
+        metadata = Metadata(pkgdir, self.make_options(), [config_file])
+        pkg = SystemPackage('foo', include_path=os.path.join(root, 'include'),
+                            _options=metadata.options, config_file=config_file)
+        pkg.resolved = True
+        metadata.add_package(pkg)
+
+        os.makedirs(os.path.join(pkgdir, 'pkgconfig'))
+        metadata.save()
+        with open(os.path.join(pkgdir, 'pkgconfig', 'foo.pc'), 'w') as f:
+            f.write("Cflags: -I'{}'\n".format(os.path.join(root, 'include')))
+        with open(os.path.join(pkgdir, 'usage-cache.json'), 'w') as f:
+            f.write('{}')
+        return root, pkgdir
+
+    def test_export(self):
+        root, pkgdir = self.make_resolved()
+        export_snapshot(pkgdir, self.snapshot)
+
+        with tarfile.open(self.snapshot) as tar:
+            names = tar.getnames()
+            self.assertIn(manifest_filename, names)
+            self.assertIn('mopack.json', names)
+            self.assertNotIn('usage-cache.json', names)
+            for i in names:
+                if tar.getmember(i).isfile():
+                    data = tar.extractfile(i).read().decode('utf-8')
+                    self.assertNotIn(root, data)
+
+    def test_round_trip(self):
+        old_root, old_pkgdir = self.make_resolved()
+        export_snapshot(old_pkgdir, self.snapshot)
+        root, pkgdir = self.workspace('new')
+        metadata = import_snapshot(pkgdir, self.snapshot)
+
+        self.assertFalse(os.path.exists(os.path.join(
+            pkgdir, manifest_filename
+        )))
+        self.assertEqual(metadata.files, [os.path.join(root, 'mopack.yml')])
+
+        metadata = Metadata.load(pkgdir)
+        pkg = metadata.get_package('foo')
+        self.assertEqual(pkg.config_file, os.path.join(root, 'mopack.yml'))
+        self.assertEqual(pkg.usage.include_path,
+                         [Path(os.path.join(root, 'include'))])
+        with open(os.path.join(pkgdir, 'pkgconfig', 'foo.pc')) as f:
+            self.assertEqual(f.read(), "Cflags: -I'{}'\n".format(
+                os.path.join(root, 'include')
+            ))
+
+        # The metadata shards should be renamed to match their new contents.
+        with mock.patch('mopack.metadata.atomic_write') as mwrite:
+            metadata.save()
+            self.assertEqual(mwrite.call_count, 1)
+
+    def test_explicit_root(self):
+        old_root, old_pkgdir = self.make_resolved()
+        export_snapshot(old_pkgdir, self.snapshot,
+                        root=os.path.dirname(old_pkgdir))
+        root, pkgdir = self.workspace('new')
+        metadata = import_snapshot(pkgdir, self.snapshot)
+        self.assertEqual(metadata.files,
+                         [os.path.join(old_root, 'mopack.yml')])
+
+    def test_invalid_root(self):
+        root, pkgdir = self.make_resolved()
+        with self.assertRaises(SnapshotError):
+            export_snapshot(pkgdir, self.snapshot, root=os.path.sep)
+        with self.assertRaises(SnapshotError):
+            export_snapshot(pkgdir, self.snapshot,
+                            root=os.path.join(root, 'other'))
+
+    def test_unresolved(self):
+        root, pkgdir = self.workspace('old')
+        with self.assertRaises(SnapshotError):
+            export_snapshot(pkgdir, self.snapshot)
+
+    def test_not_snapshot(self):
+        with tarfile.open(self.snapshot, 'w:gz'):
+            pass
+        root, pkgdir = self.workspace('new')
+        with self.assertRaises(SnapshotError):
+            import_snapshot(pkgdir, self.snapshot)
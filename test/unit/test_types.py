@@ -443,6 +443,20 @@ class TestBoolean(TypeTestCase):
             boolean('field', None)
 
 
+class TestInteger(TypeTestCase):
+    def test_valid(self):
+        self.assertEqual(integer('field', 0), 0)
+        self.assertEqual(integer('field', 42), 42)
+
+    def test_invalid(self):
+        with self.assertFieldError(('field',)):
+            integer('field', '1')
+        with self.assertFieldError(('field',)):
+            integer('field', True)
+        with self.assertFieldError(('field',)):
+            integer('field', None)
+
+
 class TestPathFragment(TypeTestCase):
     def test_valid(self):
         self.assertEqual(path_fragment('field', 'path'), 'path')
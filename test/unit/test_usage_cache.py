@@ -0,0 +1,121 @@
+import os
+import shutil
+from unittest import mock, TestCase
+
+from .. import test_stage_dir
+
+from mopack.metadata import Metadata
+from mopack.usage_cache import UsageCache
+
+
+class TestUsageCache(TestCase):
+    pkgdir = os.path.join(test_stage_dir, 'usage_cache')
+    pkgconfdir = os.path.join(pkgdir, 'pkgconfig')
+    metadata_path = os.path.join(pkgdir, 'mopack.json')
+
+    def setUp(self):
+        if os.path.exists(self.pkgdir):
+            shutil.rmtree(self.pkgdir)
+        os.makedirs(self.pkgconfdir)
+        self.write_metadata('{}')
+
+        self.metadata = Metadata(self.pkgdir)
+        self.metadata.options.common.env = {}
+        self.usage = {'name': 'foo', 'type': 'pkg_config', 'pcnames': ['foo'],
+                      'pkg_config_path': [self.pkgconfdir]}
+
+        self.mock_pc_path = mock.patch('mopack.usage_cache.pkg_config_path',
+                                       return_value=[])
+        self.mock_pc_path.start()
+
+    def tearDown(self):
+        self.mock_pc_path.stop()
+
+    def write_metadata(self, data):
+        with open(self.metadata_path, 'w') as f:
+            f.write(data)
+
+    def make_cache(self, env={}):
+        return UsageCache(self.pkgdir, self.metadata_path, env)
+
+    def save_usage(self):
+        cache = self.make_cache()
+        cache.put('foo', None, False, self.usage, self.metadata)
+        cache.save()
+
+    def test_get_put(self):
+        cache = self.make_cache()
+        self.assertEqual(cache.get('foo', None, False), None)
+        cache.put('foo', None, False, self.usage, self.metadata)
+        self.assertEqual(cache.get('foo', None, False), self.usage)
+
+        self.assertEqual(cache.get('foo', ['sub'], False), None)
+        self.assertEqual(cache.get('foo', None, True), None)
+        self.assertEqual(cache.get('bar', None, False), None)
+
+    def test_any_strictness(self):
+        cache = self.make_cache()
+        cache.put('foo', None, None, self.usage, self.metadata)
+        self.assertEqual(cache.get('foo', None, False), self.usage)
+        self.assertEqual(cache.get('foo', None, True), self.usage)
+
+    def test_unsaved(self):
+        cache = self.make_cache()
+        cache.put('foo', None, False, self.usage, self.metadata)
+        self.assertEqual(self.make_cache().get('foo', None, False), None)
+
+    def test_persist(self):
+        self.save_usage()
+        self.assertEqual(self.make_cache().get('foo', None, False),
+                         self.usage)
+
+    def test_metadata_changed(self):
+        self.save_usage()
+        self.write_metadata('{"changed": true}')
+        self.assertEqual(self.make_cache().get('foo', None, False), None)
+
+    def test_env_changed(self):
+        self.save_usage()
+        cache = self.make_cache({'MOPACK_INCLUDE_PATH': '/include'})
+        self.assertEqual(cache.get('foo', None, False), None)
+
+        cache = self.make_cache({'UNRELATED': 'value'})
+        self.assertEqual(cache.get('foo', None, False), self.usage)
+
+    def test_dir_changed(self):
+        self.save_usage()
+        shutil.rmtree(self.pkgconfdir)
+        self.assertEqual(self.make_cache().get('foo', None, False), None)
+
+    def test_input_changed(self):
+        incdir = os.path.join(self.pkgdir, 'include')
+        header = os.path.join(incdir, 'foo.hpp')
+        os.makedirs(incdir)
+        with open(header, 'w') as f:
+            f.write('#define FOO_VERSION 1\n')
+
+        with mock.patch.object(self.metadata, 'usage_inputs',
+                               return_value=[incdir, header]):
+            self.save_usage()
+        self.assertEqual(self.make_cache().get('foo', None, False),
+                         self.usage)
+
+        st = os.stat(header)
+        with open(header, 'w') as f:
+            f.write('#define FOO_VERSION 2\n')
+        os.utime(header, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertEqual(self.make_cache().get('foo', None, False), None)
+
+    def test_no_metadata(self):
+        os.remove(self.metadata_path)
+        self.save_usage()
+        self.assertEqual(self.make_cache().get('foo', None, False),
+                         self.usage)
+
+        self.write_metadata('{}')
+        self.assertEqual(self.make_cache().get('foo', None, False), None)
+
+    def test_corrupt(self):
+        with open(os.path.join(self.pkgdir, 'usage-cache.json'), 'w') as f:
+            f.write('{bad json')
+        self.assertEqual(self.make_cache().get('foo', None, False), None)
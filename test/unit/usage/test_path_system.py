@@ -1,3 +1,4 @@
+import json
 import os
 import shutil
 import sys
@@ -42,8 +43,8 @@ def boost_getdir(name, default, options):
     return [abspath(p)] if p is not None else []
 
 
-def mock_isfile(p, variables={}):
-    p = os.path.normcase(p.string(**variables))
+def mock_isfile(index, p):
+    p = os.path.normcase(p)
     return p.startswith(os.path.normcase(abspath('/mock')) + os.sep)
 
 
@@ -93,7 +94,7 @@ class TestPath(UsageTest):
         with mock.patch('subprocess.run', side_effect=OSError()), \
              mock.patch('mopack.usage.path_system._system_include_path',
                         return_value=[Path('/mock/include')]), \
-             mock.patch('mopack.usage.path_system.isfile', mock_isfile), \
+             mock.patch('mopack.path.FileIndex.isfile', mock_isfile), \
              mock.patch('builtins.open', **open_args):
             self.assertEqual(usage.version(self.metadata, pkg), expected)
 
@@ -109,10 +110,11 @@ class TestPath(UsageTest):
             pkg = MockPackage(name)
         if metadata is None:
             metadata = self.metadata
+        metadata.reset_caches()
 
         self.clear_pkgdir()
 
-        with mock.patch('mopack.usage.path_system.file_outdated',
+        with mock.patch('mopack.usage.path_system.pkg_config_outdated',
                         return_value=write_pkg_config), \
              mock.patch('mopack.usage.path_system._system_include_path',
                         return_value=[Path('/mock/include')]), \
@@ -120,7 +122,7 @@ class TestPath(UsageTest):
                         return_value=[Path('/mock/lib')]), \
              mock.patch('mopack.usage.path_system._system_lib_names',
                         return_value=['lib{}.so']), \
-             mock.patch('mopack.usage.path_system.isfile',
+             mock.patch('mopack.path.FileIndex.isfile',
                         mock_isfile):
             self.assertEqual(usage.get_usage(metadata, pkg, submodules),
                              expected)
@@ -155,6 +157,35 @@ class TestPath(UsageTest):
             os.path.join(self.pkgconfdir, 'foo.pc')
         ))
 
+    def test_pkg_config_inputs(self):
+        def inputs_hash(usage, pkg, lib_path):
+            self.metadata.reset_caches()
+            with mock.patch('mopack.usage.path_system.pkg_config_outdated',
+                            return_value=False) as mcheck, \
+                 mock.patch('mopack.usage.path_system._system_include_path',
+                            return_value=[Path('/mock/include')]), \
+                 mock.patch('mopack.usage.path_system._system_lib_path',
+                            return_value=[Path(lib_path)]), \
+                 mock.patch('mopack.usage.path_system._system_lib_names',
+                            return_value=['lib{}.so']), \
+                 mock.patch('mopack.path.FileIndex.isfile', mock_isfile):
+                usage.get_usage(self.metadata, pkg, None)
+            return mcheck.call_args[0][1]
+
+        usage = self.make_usage('foo')
+        old = inputs_hash(usage, MockPackage(), '/mock/lib')
+        self.assertEqual(inputs_hash(usage, MockPackage(), '/mock/lib'), old)
+
+        # The .pc file should be regenerated when the results of searching the
+        # system change...
+        self.assertNotEqual(inputs_hash(usage, MockPackage(), '/mock/lib64'),
+                            old)
+
+        # ... or when the package's version does.
+        self.assertNotEqual(
+            inputs_hash(usage, MockPackage(version='2.0'), '/mock/lib'), old
+        )
+
     def test_auto_link(self):
         pkg = MockPackage(srcdir=self.srcdir, builddir=self.builddir)
         usage = self.make_usage('foo', auto_link=True)
@@ -230,6 +261,39 @@ class TestPath(UsageTest):
         self.check_version(usage, '1.0', header=uscore_header)
         self.check_version(usage, None, header=bad_header)
 
+    def test_version_regex_cached(self):
+        incdir = os.path.join(self.pkgdir, 'include')
+        header = os.path.join(incdir, 'foo.hpp')
+        os.makedirs(incdir)
+        with open(header, 'w') as f:
+            f.write('#define VERSION "1.0"\n')
+
+        usage = self.make_usage('foo', headers=['foo.hpp'],
+                                include_path=[incdir], version={
+                                    'type': 'regex',
+                                    'file': 'foo.hpp',
+                                    'regex': [r'#define VERSION "([\d\.]+)"']
+                                })
+
+        def version():
+            with mock.patch('mopack.usage.path_system.PathUsage.'
+                            '_scan_version',
+                            wraps=PathUsage._scan_version) as mscan:
+                result = usage.version(Metadata(self.pkgdir), MockPackage())
+                return result, mscan.call_count
+
+        self.assertEqual(version(), ('1.0', 1))
+        self.assertEqual(version(), ('1.0', 0))
+
+        with open(header, 'w') as f:
+            f.write('#define VERSION "1.10"\n')
+        self.assertEqual(version(), ('1.10', 1))
+        self.assertEqual(version(), ('1.10', 0))
+
+        # Only the latest version of the header should be cached.
+        with open(os.path.join(self.pkgdir, 'version-cache.json')) as f:
+            self.assertEqual(len(json.load(f)['entries']), 1)
+
     def test_invalid_version(self):
         with self.assertRaises(FieldValueError):
             self.make_usage('foo', version={'type': 'goofy'})
@@ -596,6 +660,26 @@ class TestPath(UsageTest):
             'libs': [],
         })
 
+    def test_submodule_map_cached(self):
+        submodules_required = {'names': '*', 'required': True}
+
+        pkg = MockPackage('foo', submodules=submodules_required,
+                          _options=self.make_options())
+        usage = self.make_usage(pkg, submodule_map={
+            '*': {'libraries': '$submodule'},
+        })
+
+        with mock.patch.object(type(usage).SubmoduleMapping, 'fill',
+                               wraps=usage.submodule_map['*'].fill) as mfill:
+            for i in range(2):
+                self.check_get_usage(usage, 'foo', ['sub'], pkg=pkg)
+                self.check_get_usage(usage, 'foo', ['sub2'], pkg=pkg)
+            self.assertEqual(mfill.call_count, 2)
+
+        self.check_pkg_config('foo', ['sub2'], {
+            'libs': ['-L' + abspath('/mock/lib'), '-lsub2'],
+        })
+
     def test_boost(self):
         header = dedent("""\
             #define BOOST_LIB_VERSION "1_23"
@@ -851,10 +935,14 @@ class TestSystem(TestPath):
     def setUp(self):
         self.mock_run = mock.patch('subprocess.run', side_effect=OSError())
         self.mock_run.start()
+        self.mock_pc_path = mock.patch('mopack.pkg_config.pkg_config_path',
+                                       return_value=[])
+        self.mock_pc_path.start()
         super().setUp()
 
     def tearDown(self):
         super().tearDown()
+        self.mock_pc_path.stop()
         self.mock_run.stop()
 
     def check_usage(self, usage, *, name='foo', pcname=None, **kwargs):
@@ -863,10 +951,16 @@ class TestSystem(TestPath):
             pcname = name
         self.assertEqual(usage.pcname, pcname)
 
-    def check_get_usage(self, *args, find_pkg_config=False, **kwargs):
+    def check_get_usage(self, *args, find_pkg_config=False, metadata=None,
+                        **kwargs):
+        # Use a fresh metadata object so that previous probe results aren't
+        # reused.
+        if metadata is None:
+            metadata = Metadata(self.pkgdir)
+
         side_effect = None if find_pkg_config else OSError()
         with mock.patch('subprocess.run', side_effect=side_effect):
-            super().check_get_usage(*args, **kwargs)
+            super().check_get_usage(*args, metadata=metadata, **kwargs)
 
     def test_pkg_config(self):
         usage = self.make_usage('foo')
@@ -876,6 +970,54 @@ class TestSystem(TestPath):
             'pkg_config_path': [],
         }, find_pkg_config=True)
 
+    @mock.patch('mopack.usage.path_system.pkg_config_search_path',
+                return_value=[])
+    def test_pkg_config_cached(self, msearch):
+        usage = self.make_usage('foo')
+        pkg = MockPackage('foo')
+        expected = {'name': 'foo', 'type': 'system', 'pcnames': ['foo'],
+                    'pkg_config_path': []}
+        os.makedirs(self.pkgdir)
+
+        with mock.patch('subprocess.run') as mrun:
+            self.assertEqual(usage.get_usage(self.metadata, pkg, None),
+                             expected)
+            mrun.assert_called_once()
+        self.assertTrue(os.path.exists(
+            os.path.join(self.pkgdir, 'probe-cache.json')
+        ))
+
+        with mock.patch('subprocess.run') as mrun:
+            self.assertEqual(usage.get_usage(self.metadata, pkg, None),
+                             expected)
+            mrun.assert_not_called()
+
+        env = {'PKG_CONFIG_PATH': '/mock/pkgconfig'}
+        usage = self.make_usage('foo', common_options={'env': env})
+        with mock.patch('subprocess.run') as mrun:
+            self.assertEqual(usage.get_usage(self.metadata, pkg, None),
+                             expected)
+            mrun.assert_called_once()
+
+    @mock.patch('mopack.usage.path_system.pkg_config_search_path',
+                return_value=None)
+    def test_pkg_config_uncached(self, msearch):
+        usage = self.make_usage('foo')
+        pkg = MockPackage('foo')
+        expected = {'name': 'foo', 'type': 'system', 'pcnames': ['foo'],
+                    'pkg_config_path': []}
+        os.makedirs(self.pkgdir)
+
+        # If we don't know where pkg-config looks, we can't cache its results.
+        for i in range(2):
+            with mock.patch('subprocess.run') as mrun:
+                self.assertEqual(usage.get_usage(self.metadata, pkg, None),
+                                 expected)
+                mrun.assert_called_once()
+        self.assertFalse(os.path.exists(
+            os.path.join(self.pkgdir, 'probe-cache.json')
+        ))
+
     def test_pcname(self):
         usage = self.make_usage('foo', pcname='foopc')
         self.check_usage(usage, pcname='foopc')